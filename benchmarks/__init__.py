@@ -0,0 +1,30 @@
+"""
+Micro-benchmarks for mwcomposerfromhell.
+
+Each module can be run directly, e.g. ``python -m benchmarks.nested_tags``.
+"""
+
+import time
+from typing import Callable, Iterable, Sequence
+
+
+def best_of(func: Callable[[], object], repeat: int = 5) -> float:
+    """Run a function multiple times and return the fastest time (in seconds)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_table(headers: Sequence[str], rows: Iterable[Sequence[object]]) -> None:
+    """Print a simple right-aligned table of results."""
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [
+        max([len(header)] + [len(row[it]) for row in rows])
+        for it, header in enumerate(headers)
+    ]
+    print("  ".join(header.rjust(width) for header, width in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
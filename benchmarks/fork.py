@@ -0,0 +1,115 @@
+"""
+Measure the memory shared between pre-forked workers rendering articles.
+
+A resolver with many templates is loaded before forking the workers, each
+worker then renders an article using some of the templates and runs the garbage
+collector. The unique memory of each worker is the memory which was copied
+from the parent (or allocated by the worker), the shared memory is still shared
+with the parent. Freezing the resolver should keep most of it shared.
+
+This requires Linux (it reads ``/proc/self/smaps_rollup``).
+"""
+
+import gc
+import json
+import os
+from typing import Dict, List
+
+import mwparserfromhell
+
+from benchmarks import print_table
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+
+TEMPLATES = 20_000
+WORKERS = 4
+
+
+def memory() -> Dict[str, int]:
+    """The unique and shared memory of the current process (in kB)."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "unique": fields["Private_Clean"] + fields["Private_Dirty"],
+        "shared": fields["Shared_Clean"] + fields["Shared_Dirty"],
+    }
+
+
+def work(resolver: ArticleResolver) -> None:
+    """Render an article using 1% of the templates."""
+    wikicode = mwparserfromhell.parse(
+        "\n".join(f"* {{{{Template {it}|{it}}}}}" for it in range(0, TEMPLATES, 100))
+    )
+    WikicodeToHtmlComposer(resolver=resolver).compose(wikicode)
+    gc.collect()
+
+
+def run(freeze: bool) -> List[Dict[str, int]]:
+    """Load a resolver, fork the workers and measure their memory."""
+    resolver = ArticleResolver()
+    resolver.add_namespace(
+        "Template",
+        Namespace(
+            {
+                f"Template {it}": mwparserfromhell.parse(
+                    f"'''{{{{{{1}}}}}}''' is a [[link|template]] {it}."
+                )
+                for it in range(TEMPLATES)
+            }
+        ),
+    )
+    if freeze:
+        resolver.freeze()
+
+    pipes = []
+    for _ in range(WORKERS):
+        read_fd, write_fd = os.pipe()
+        if os.fork() == 0:
+            os.close(read_fd)
+            work(resolver)
+            os.write(write_fd, json.dumps(memory()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append(read_fd)
+
+    results = []
+    for read_fd in pipes:
+        with os.fdopen(read_fd) as f:
+            results.append(json.loads(f.read()))
+        os.wait()
+    return results
+
+
+def main() -> None:
+    rows = []
+    for freeze in (False, True):
+        # Each mode runs in a separate process, since gc.freeze() affects the
+        # whole process.
+        read_fd, write_fd = os.pipe()
+        if os.fork() == 0:
+            os.close(read_fd)
+            os.write(write_fd, json.dumps(run(freeze)).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            results = json.loads(f.read())
+        os.wait()
+
+        for worker, result in enumerate(results):
+            rows.append(
+                (
+                    "frozen" if freeze else "default",
+                    worker,
+                    f"{result['unique'] / 1024:.1f}",
+                    f"{result['shared'] / 1024:.1f}",
+                )
+            )
+
+    print_table(("mode", "worker", "unique MB", "shared MB"), rows)
+
+
+if __name__ == "__main__":
+    main()
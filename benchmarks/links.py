@@ -0,0 +1,62 @@
+"""
+Measure rendering articles with many links when red links are enabled.
+
+The articles are stored in a (simulated) remote store, where each request
+has a fixed latency. Whether the linked articles exist should be checked with
+a single request, regardless of the number of links.
+"""
+
+import time
+
+import mwparserfromhell
+
+from benchmarks import best_of, print_table
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+
+LINKS = (100, 800, 5000)
+# The latency of each request to the store (in seconds).
+LATENCY = 0.001
+
+
+class RemoteNamespace(Namespace):
+    """A namespace where each request has a fixed latency."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = 0
+
+    def __getitem__(self, key):
+        self.requests += 1
+        time.sleep(LATENCY)
+        return super().__getitem__(key)
+
+    def exists_many(self, keys):
+        self.requests += 1
+        time.sleep(LATENCY)
+        return {key for key in keys if key in self._articles}
+
+
+def main() -> None:
+    rows = []
+    for links in LINKS:
+        # Half of the linked articles exist.
+        namespace = RemoteNamespace(
+            {f"Page {it}": mwparserfromhell.parse("") for it in range(0, links, 2)}
+        )
+        resolver = ArticleResolver()
+        resolver.add_namespace("", namespace)
+        composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+
+        wikicode = mwparserfromhell.parse(
+            "\n".join(f"* A link to [[Page {it}]]." for it in range(links))
+        )
+        seconds = best_of(lambda: composer.compose(wikicode), repeat=3)
+        namespace.requests = 0
+        composer.compose(wikicode)
+        rows.append((links, f"{seconds * 1000:.1f}", namespace.requests))
+
+    print_table(("links", "ms", "requests"), rows)
+
+
+if __name__ == "__main__":
+    main()
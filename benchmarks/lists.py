@@ -0,0 +1,61 @@
+"""
+Measure rendering long lists, such as glossaries and outlines.
+
+An outline is a (mostly) unordered list which is nested several levels deep,
+a glossary is a definition list with terms and (possibly nested) definitions.
+The time per item should not depend on how deeply the items are nested.
+"""
+
+import mwparserfromhell
+
+from benchmarks import best_of, print_table
+from mwcomposerfromhell import compose
+
+STYLES = ("outline", "glossary")
+DEPTHS = (1, 5, 10)
+ITEMS = (1_000, 10_000)
+
+
+def outline(items: int, depth: int) -> str:
+    """Generate an outline with items nested up to the given depth."""
+    lines = []
+    for it in range(items):
+        level = it % depth + 1
+        # Mix in some ordered lists.
+        prefix = "*" * (level - 1) + ("#" if it % 7 == 6 else "*")
+        lines.append(f"{prefix} Item {it} with ''formatting''")
+    return "\n".join(lines)
+
+
+def glossary(items: int, depth: int) -> str:
+    """Generate a glossary with definitions nested up to the given depth."""
+    lines = []
+    for it in range(items // 2):
+        lines.append(f"; Term {it}")
+        lines.append(":" * (it % depth + 1) + f" Definition of [[term {it}]]")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    rows = []
+    for style in STYLES:
+        generate = outline if style == "outline" else glossary
+        for depth in DEPTHS:
+            for items in ITEMS:
+                wikicode = mwparserfromhell.parse(generate(items, depth))
+                seconds = best_of(lambda: compose(wikicode))
+                rows.append(
+                    (
+                        style,
+                        depth,
+                        items,
+                        f"{seconds * 1000:.1f}",
+                        f"{seconds * 1_000_000 / items:.1f}",
+                    )
+                )
+
+    print_table(("style", "depth", "items", "ms", "us / item"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Measure how render time scales with the depth of nested tags.
+
+Each level of nesting adds the same amount of output, so the time per kilobyte
+of output should stay (roughly) constant as the depth increases. This is
+measured for both the recursive and the iterative engine.
+"""
+
+import sys
+
+from mwparserfromhell import nodes, parse
+from mwparserfromhell.wikicode import Wikicode
+
+from benchmarks import best_of, print_table
+from mwcomposerfromhell import compose, WikicodeToHtmlComposer
+
+DEPTHS = (100, 200, 400, 800, 1600)
+
+
+def nested_tags(depth: int) -> Wikicode:
+    """Generate a tree of ``depth`` nested tags, each containing some text."""
+    tree = parse("The innermost text.")
+    for it in range(depth):
+        tree = Wikicode(
+            [
+                nodes.Text(f"Level {it} has ''some'' text in it. "),
+                nodes.Tag(parse("span"), contents=tree),
+            ]
+        )
+    return Wikicode([nodes.Tag(parse("div"), contents=tree)])
+
+
+def main() -> None:
+    # Rendering nested tags is recursive (unless rendering iteratively).
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * max(DEPTHS)))
+
+    rows = []
+    for depth in DEPTHS:
+        wikicode = nested_tags(depth)
+        size = len(compose(wikicode))
+        seconds = best_of(lambda: compose(wikicode))
+        composer = WikicodeToHtmlComposer(iterative=True)
+        iterative_seconds = best_of(lambda: composer.compose(wikicode))
+        rows.append(
+            (
+                depth,
+                size,
+                f"{seconds * 1000:.2f}",
+                f"{seconds * 1_000_000 / (size / 1024):.1f}",
+                f"{iterative_seconds * 1000:.2f}",
+            )
+        )
+
+    print_table(("depth", "bytes", "ms", "us / KB", "iterative ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
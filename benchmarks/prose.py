@@ -0,0 +1,64 @@
+"""
+Measure rendering long articles which are mostly plain prose.
+
+Most of the time is spent handling text: finding paragraphs and preformatted
+text. Paragraphs are separated by blank lines, with an occasional block of
+preformatted text. Each paragraph is either a single line of plain text,
+multiple lines of plain text or a single line of formatted text.
+"""
+
+import mwparserfromhell
+
+from benchmarks import best_of, print_table
+from mwcomposerfromhell import compose
+
+SENTENCE = "The quick brown fox jumps over the lazy dog & the cat. "
+FORMATTED = "Some ''italic'' and '''bold''' text. "
+
+STYLES = ("plain", "lines", "formatted")
+PARAGRAPHS = (10, 100, 1000)
+
+
+def prose(paragraphs: int, style: str) -> str:
+    """Generate an article with the given number of paragraphs."""
+    lines = []
+    for it in range(paragraphs):
+        if style == "plain":
+            lines.append(SENTENCE * 5)
+        elif style == "lines":
+            lines.extend([SENTENCE] * 5)
+        else:
+            lines.append(SENTENCE * 3 + FORMATTED * 2)
+        lines.append("")
+
+        # Add some preformatted text every once in a while.
+        if it % 10 == 9:
+            lines.append(" Some preformatted")
+            lines.append("  text.")
+            lines.append("")
+
+    return "\n".join(lines)
+
+
+def main() -> None:
+    rows = []
+    for style in STYLES:
+        for paragraphs in PARAGRAPHS:
+            wikicode = mwparserfromhell.parse(prose(paragraphs, style))
+            size = len(str(wikicode))
+            seconds = best_of(lambda: compose(wikicode))
+            rows.append(
+                (
+                    style,
+                    paragraphs,
+                    size,
+                    f"{seconds * 1000:.2f}",
+                    f"{seconds * 1_000_000 / (size / 1024):.1f}",
+                )
+            )
+
+    print_table(("style", "paragraphs", "bytes", "ms", "us / KB"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measure how rendering scales with the number of rows in a table.
+
+The time per row should stay (roughly) constant as the number of rows increases.
+The peak memory used while streaming the output (to the null device) should
+stay flat, unlike when rendering the output to a string.
+
+Parsing very large tables is slow, so the tables are built by repeating the
+rows of a smaller table.
+"""
+
+import os
+import tracemalloc
+from typing import Callable
+
+import mwparserfromhell
+from mwparserfromhell.wikicode import Wikicode
+
+from benchmarks import best_of, print_table
+from mwcomposerfromhell import WikicodeToHtmlComposer
+
+ROWS = (1_000, 10_000, 100_000)
+# The number of rows to parse.
+PARSED_ROWS = 1_000
+
+
+def table(rows: int) -> Wikicode:
+    """Generate a table with the given number of rows."""
+    wikicode = mwparserfromhell.parse(
+        '{| class="wikitable"\n! Number !! Formatted !! Link\n'
+        + "".join(
+            f"|-\n| {it} || ''{it}'' || [[Page {it}]]\n" for it in range(PARSED_ROWS)
+        )
+        + "|}\n"
+    )
+
+    # Repeat the rows (but not the header) of the parsed table.
+    tag = wikicode.filter_tags(recursive=False)[0]
+    header = [
+        node
+        for node in tag.contents.nodes
+        if getattr(node, "wiki_markup", None) != "|-"
+    ]
+    parsed_rows = [
+        node
+        for node in tag.contents.nodes
+        if getattr(node, "wiki_markup", None) == "|-"
+    ]
+    tag.contents = Wikicode(header + parsed_rows * (rows // PARSED_ROWS))
+    return wikicode
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """The peak memory allocated while running a function (in bytes)."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    composer = WikicodeToHtmlComposer()
+
+    rows = []
+    for row_count in ROWS:
+        wikicode = table(row_count)
+        seconds = best_of(lambda: composer.compose(wikicode), repeat=3)
+        compose_memory = peak_memory(lambda: composer.compose(wikicode))
+        with open(os.devnull, "w") as sink:
+            stream_memory = peak_memory(lambda: composer.compose_to(wikicode, sink))
+        rows.append(
+            (
+                row_count,
+                f"{seconds * 1000:.0f}",
+                f"{seconds * 1_000_000 / row_count:.1f}",
+                compose_memory // 1024,
+                stream_memory // 1024,
+            )
+        )
+
+    print_table(("rows", "ms", "us / row", "compose peak KB", "stream peak KB"), rows)
+
+
+if __name__ == "__main__":
+    main()
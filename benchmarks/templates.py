@@ -0,0 +1,91 @@
+"""
+Measure the cost of transcluding templates:
+
+* The overhead of each transclusion, using a trivial template.
+* Transcluding a larger template many times with different parameters, with and
+  without compiling templates.
+"""
+
+import mwparserfromhell
+
+from benchmarks import best_of, print_table
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+
+INFOBOX = """{| class="infobox"
+|-
+! colspan="2" | {{{name}}}
+|-
+! Capital
+| [[{{{capital}}}]]
+|-
+! Population
+| {{{population}}}
+|-
+! Languages
+|
+* ''English''
+* '''Other''' languages, see [[List of languages]].
+|-
+! Notes
+| This is a '''lot''' of static text which is the same for every call of
+the template, including some [[Wikilink|links]] and <span>formatting</span>.
+|}
+"""
+
+CALLS = (10, 100, 1000)
+
+
+def get_composer(compile_templates: bool) -> WikicodeToHtmlComposer:
+    resolver = ArticleResolver(compile_templates=compile_templates)
+    resolver.add_namespace(
+        "Template", Namespace({"Infobox": mwparserfromhell.parse(INFOBOX)})
+    )
+    return WikicodeToHtmlComposer(resolver=resolver)
+
+
+def transclusion_overhead() -> None:
+    """Transclude a trivial template many times."""
+    resolver = ArticleResolver()
+    resolver.add_namespace("Template", Namespace({"X": mwparserfromhell.parse("x")}))
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+
+    rows = []
+    for calls in CALLS:
+        wikicode = mwparserfromhell.parse("{{x}}" * calls)
+        seconds = best_of(lambda: composer.compose(wikicode))
+        rows.append((calls, f"{seconds * 1_000_000 / calls:.2f}"))
+
+    print_table(("calls", "us / call"), rows)
+
+
+def compiled_templates() -> None:
+    """Transclude a larger template with different parameters."""
+    rows = []
+    for calls in CALLS:
+        wikicode = mwparserfromhell.parse(
+            "\n".join(
+                f"{{{{Infobox|name=Country {it}|capital=City {it}|population={it}}}}}"
+                for it in range(calls)
+            )
+        )
+
+        row = [calls]
+        for compile_templates in (False, True):
+            composer = get_composer(compile_templates)
+            # Warm up any plans.
+            composer.compose(wikicode)
+            seconds = best_of(lambda: composer.compose(wikicode))
+            row.append(f"{seconds * 1_000_000 / calls:.1f}")
+        rows.append(row)
+
+    print_table(("calls", "us / call", "us / call (compiled)"), rows)
+
+
+def main() -> None:
+    transclusion_overhead()
+    print()
+    compiled_templates()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,41 @@
+from typing import Iterator, TextIO
+
 from mwparserfromhell.wikicode import Wikicode
 
+from mwcomposerfromhell.archive import ArchiveNamespace, build_archive  # noqa: F401
+from mwcomposerfromhell.bloom import BloomFilter  # noqa: F401
+from mwcomposerfromhell.cache import ParseCache, TemplateCache  # noqa: F401
 from mwcomposerfromhell.composer import (  # noqa: F401
     HtmlComposingError,
     WikicodeToHtmlComposer,
 )
-from mwcomposerfromhell.namespace import ArticleResolver, Namespace  # noqa: F401
+from mwcomposerfromhell.dependencies import DependencyIndex  # noqa: F401
+from mwcomposerfromhell.lazy import (  # noqa: F401
+    CompressedNamespace,
+    DirectoryNamespace,
+    LazyNamespace,
+)
+from mwcomposerfromhell.namespace import (  # noqa: F401
+    ArticleResolver,
+    Namespace,
+    OverlayNamespace,
+)
+from mwcomposerfromhell.pool import ComposerPool  # noqa: F401
 
 
 def compose(wikicode: Wikicode) -> str:
     """One-shot to convert an object from parsed Wikicode to HTML."""
     composer = WikicodeToHtmlComposer()
     return composer.compose(wikicode)
+
+
+def compose_iter(wikicode: Wikicode) -> Iterator[str]:
+    """One-shot to convert an object from parsed Wikicode to chunks of HTML."""
+    composer = WikicodeToHtmlComposer()
+    return composer.compose_iter(wikicode)
+
+
+def compose_to(wikicode: Wikicode, sink: TextIO) -> None:
+    """One-shot to convert an object from parsed Wikicode to HTML, writing it to a file-like object."""
+    composer = WikicodeToHtmlComposer()
+    composer.compose_to(wikicode, sink)
@@ -1,35 +1,100 @@
 import argparse
 import sys
+from typing import List, Optional
 
 import mwparserfromhell
 
 import mwcomposerfromhell
+from mwcomposerfromhell.build import build
+from mwcomposerfromhell.cache import ParseCache
 
 
-def convert_file(filename: str, wrap: bool) -> None:
+def convert_file(filename: str, wrap: bool, parse_cache: Optional[str] = None) -> None:
     with open(filename) as f:
         text = f.read()
 
-    wikicode = mwparserfromhell.parse(text)
+    if parse_cache:
+        wikicode = ParseCache(parse_cache).parse(text)
+    else:
+        wikicode = mwparserfromhell.parse(text)
 
     if wrap:
         print("<html>\n<head></head>\n<body>\n")
-    print(mwcomposerfromhell.compose(wikicode))
+    # Stream the HTML out as it is generated.
+    mwcomposerfromhell.compose_to(wikicode, sys.stdout)
+    print()
     if wrap:
         print("</body>\n</html>\n")
 
 
+def build_directory(
+    src: str, out: str, base_url: str, parse_cache: Optional[str], full: bool
+) -> None:
+    result = build(
+        src, out, base_url, ParseCache(parse_cache) if parse_cache else None, full
+    )
+    print(
+        f"{result.pages} pages: {result.rendered} rendered, "
+        f"{result.written} written, {result.removed} removed.",
+        file=sys.stderr,
+    )
+    for full_title, error in result.failed:
+        print(f"Failed to render {full_title}: {error}", file=sys.stderr)
+
+
+def main_build(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m mwcomposerfromhell build",
+        description="Render a directory of wikicode to a directory of HTML, "
+        "only rendering the pages which changed since the last build.",
+    )
+    parser.add_argument(
+        "--base-url", default="/wiki/", help="The URL that articles sit in."
+    )
+    parser.add_argument(
+        "--parse-cache",
+        metavar="DIRECTORY",
+        help="Store parsed wikicode in (and load it from) a directory.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Render every page (unchanged files are still not written).",
+    )
+    parser.add_argument(
+        "src", help="The directory containing a directory for each namespace."
+    )
+    parser.add_argument("out", help="The directory to write the HTML to.")
+
+    # Parse the command line arguments.
+    args = parser.parse_args(argv)
+
+    build_directory(args.src, args.out, args.base_url, args.parse_cache, args.full)
+
+
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Convert wikicode to HTML.")
+    if sys.argv[1:2] == ["build"]:
+        main_build(sys.argv[2:])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(
+        description="Convert wikicode to HTML.",
+        epilog="To render a directory of wikicode see: %(prog)s build --help",
+    )
     parser.add_argument(
         "-w",
         "--wrap",
         action="store_true",
         help="Wrap the output in <html> and <body> tags.",
     )
+    parser.add_argument(
+        "--parse-cache",
+        metavar="DIRECTORY",
+        help="Store parsed wikicode in (and load it from) a directory.",
+    )
     parser.add_argument("file", help="The file containing wikicode to convert.")
 
     # Parse the command line arguments.
     args = parser.parse_args(sys.argv[1:])
 
-    convert_file(args.file, args.wrap)
+    convert_file(args.file, args.wrap, args.parse_cache)
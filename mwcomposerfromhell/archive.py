@@ -0,0 +1,220 @@
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import xml.etree.ElementTree as ElementTree
+
+from mwcomposerfromhell.cache import ParseCache
+from mwcomposerfromhell.lazy import LazyNamespace
+from mwcomposerfromhell.namespace import _normalize_namespace, _normalize_title
+
+# Identifies an archive (and the version of the format).
+_MAGIC = b"MWCFARC1"
+# The number of articles and the offset of the index.
+_HEADER = struct.Struct("<QQ")
+# Each entry of the index: the offset and length of the title, the offset and
+# length of the text.
+_ENTRY = struct.Struct("<QIQI")
+
+
+class ArchiveNamespace(LazyNamespace):
+    """
+    A read-only Namespace backed by an archive file, see :func:`build_archive`.
+
+    The archive is memory-mapped: opening it is fast and the articles are not
+    read into memory until they are used, the pages of the file are shared
+    between processes which open the same archive.
+
+    :param path: The path of the archive.
+    :param cache_size: The maximum number of parsed articles to keep.
+    :param parse_cache: An optional cache of parsed articles stored on disk.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache_size: int = 1024,
+        parse_cache: Optional[ParseCache] = None,
+    ):
+        super().__init__(cache_size, parse_cache)
+        self._open(path)
+        # Articles cannot be added to the archive.
+        self.frozen = True
+
+    def _open(self, path: str) -> None:
+        self._path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(_MAGIC)] != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an archive")
+        count, index_offset = _HEADER.unpack_from(self._mmap, len(_MAGIC))
+        # The number of articles and the offset of the index.
+        self._count = count  # type: int
+        self._index_offset = index_offset  # type: int
+        if self._index_offset + self._count * _ENTRY.size > len(self._mmap):
+            self._mmap.close()
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The archive is opened again when un-pickled.
+        state = self.__dict__.copy()
+        del state["_mmap"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._open(self._path)
+
+    def close(self) -> None:
+        """Close the archive."""
+        self._mmap.close()
+
+    def _entry(self, index: int) -> Tuple[bytes, int, int]:
+        """The title, the offset and the length of the text of an entry."""
+        title_offset, title_length, text_offset, text_length = _ENTRY.unpack_from(
+            self._mmap, self._index_offset + index * _ENTRY.size
+        )
+        return (
+            self._mmap[title_offset : title_offset + title_length],
+            text_offset,
+            text_length,
+        )
+
+    def _find(self, key: str) -> Optional[Tuple[int, int]]:
+        """Find the offset and length of the text of an article (by binary search)."""
+        target = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            title, text_offset, text_length = self._entry(middle)
+            if title < target:
+                low = middle + 1
+            elif title > target:
+                high = middle
+            else:
+                return text_offset, text_length
+        return None
+
+    def titles(self) -> Iterator[str]:
+        """The (normalized) names of the articles in the archive."""
+        for index in range(self._count):
+            yield self._entry(index)[0].decode("utf-8")
+
+    def text(self, key: str) -> str:
+        """
+        The source of an article.
+
+        :raises KeyError: If the article does not exist.
+        """
+        return self._load(_normalize_title(key))
+
+    def _load(self, key: str) -> str:
+        found = self._find(key)
+        if found is None:
+            raise KeyError(key)
+        offset, length = found
+        return self._mmap[offset : offset + length].decode("utf-8")
+
+    def _exists(self, key: str) -> bool:
+        return self._find(key) is not None
+
+
+def build_archive(path: str, articles: Iterable[Tuple[str, str]]) -> int:
+    """
+    Write an archive of articles, which can be opened with ``ArchiveNamespace``.
+
+    The text of the articles is written as it is read, only the titles are kept
+    in memory. If an article is given multiple times, the last one is used.
+
+    :param path: The path of the archive, it is replaced once it is complete.
+    :param articles: Tuples of the name and the source of each article.
+    :return: The number of articles in the archive.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # The header is written once the index is known.
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(0, 0))
+
+            # The offset and length of the text of each article, by title.
+            texts = {}  # type: Dict[bytes, Tuple[int, int]]
+            offset = f.tell()
+            for name, text in articles:
+                data = text.encode("utf-8")
+                f.write(data)
+                texts[_normalize_title(name).encode("utf-8")] = (offset, len(data))
+                offset += len(data)
+
+            # The index is sorted by title, so that it can be searched.
+            entries = []  # type: List[bytes]
+            for title in sorted(texts):
+                f.write(title)
+                entries.append(_ENTRY.pack(offset, len(title), *texts[title]))
+                offset += len(title)
+            f.write(b"".join(entries))
+
+            f.seek(len(_MAGIC))
+            f.write(_HEADER.pack(len(entries), offset))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return len(entries)
+
+
+def iter_directory(root: str, extension: str = ".wiki") -> Iterator[Tuple[str, str]]:
+    """
+    Read the articles from a directory, see ``DirectoryNamespace``.
+
+    :return: Tuples of the name and the source of each article.
+    """
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(extension):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root)[: -len(extension)]
+            with open(path, encoding="utf-8") as f:
+                yield name.replace(os.sep, "/").replace("_", " "), f.read()
+
+
+def iter_dump(path: str, namespace: str = "") -> Iterator[Tuple[str, str]]:
+    """
+    Read the articles in a namespace from a MediaWiki XML dump.
+
+    :param path: The path of the dump.
+    :param namespace: The name of the namespace, e.g. ``Template``.
+    :return: Tuples of the name (without the namespace) and the source of the
+        latest revision of each article.
+    """
+    namespace = _normalize_namespace(namespace)
+    # The names of the namespaces, by key.
+    namespaces = {}  # type: Dict[str, str]
+    page = {}  # type: Dict[str, str]
+
+    for _, element in ElementTree.iterparse(path):
+        # Ignore the XML namespace of the tags.
+        tag = element.tag.rpartition("}")[2]
+        if tag == "namespace":
+            namespaces[element.get("key", "")] = element.text or ""
+        elif tag in ("ns", "text", "title"):
+            page[tag] = element.text or ""
+        elif tag == "page":
+            page_namespace = namespaces.get(page.get("ns", "0"), "")
+            if _normalize_namespace(page_namespace) == namespace:
+                title = page.get("title", "")
+                if namespace:
+                    title = title.split(":", 1)[-1]
+                yield title, page.get("text", "")
+            page = {}
+            # Free the memory used by the page.
+            element.clear()
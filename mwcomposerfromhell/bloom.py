@@ -0,0 +1,137 @@
+import hashlib
+import math
+import struct
+from typing import Iterable, Tuple
+
+# Identifies a file containing a Bloom filter (and the version of the format).
+_MAGIC = b"MWCFBLM1"
+# The number of bits, the number of hashes and the number of titles.
+_HEADER = struct.Struct("<QIQ")
+
+
+class BloomFilter:
+    """
+    A compact, probabilistic set of titles, e.g. to check whether an article
+    exists without keeping all of the titles in memory.
+
+    A title which was added is always found, but a title which was not added
+    might be found as well (with a probability of about ``error_rate``). With
+    the default error rate, this uses ~1.2 bytes per title.
+
+    The titles should be the full canonical titles of articles, e.g.
+    ``Template:Foo bar``, see ``CanonicalTitle.full_title``.
+
+    :param capacity: The number of titles which will be added.
+    :param error_rate: The probability of finding a title which was not added
+        (once ``capacity`` titles were added).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        capacity = max(capacity, 1)
+        self._num_bits = max(
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8
+        )
+        self._num_hashes = max(round(self._num_bits / capacity * math.log(2)), 1)
+        self._bits = bytearray((self._num_bits + 7) // 8)
+        # The number of titles which were added.
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def size(self) -> int:
+        """The size of the filter (in bytes)."""
+        return len(self._bits)
+
+    def _hashes(self, title: str) -> Tuple[int, int]:
+        """
+        Hash a title, the bits which represent it are generated from the two
+        hashes (see "Less Hashing, Same Performance: Building a Better Bloom
+        Filter").
+        """
+        digest = hashlib.blake2b(title.encode("utf-8"), digest_size=16).digest()
+        return (
+            int.from_bytes(digest[:8], "little"),
+            int.from_bytes(digest[8:], "little") | 1,
+        )
+
+    def add(self, title: str) -> None:
+        """Add a title."""
+        index, step = self._hashes(title)
+        num_bits = self._num_bits
+        bits = self._bits
+        for _ in range(self._num_hashes):
+            index %= num_bits
+            bits[index >> 3] |= 1 << (index & 7)
+            index += step
+        self._count += 1
+
+    def __contains__(self, title: object) -> bool:
+        if not isinstance(title, str):
+            return False
+
+        index, step = self._hashes(title)
+        num_bits = self._num_bits
+        bits = self._bits
+        for _ in range(self._num_hashes):
+            index %= num_bits
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+            index += step
+        return True
+
+    @classmethod
+    def from_titles(
+        cls, titles: Iterable[str], capacity: int, error_rate: float = 0.01
+    ) -> "BloomFilter":
+        """Create a filter containing the given titles."""
+        bloom_filter = cls(capacity, error_rate)
+        for title in titles:
+            bloom_filter.add(title)
+        return bloom_filter
+
+    @classmethod
+    def from_file(cls, path: str, error_rate: float = 0.01) -> "BloomFilter":
+        """
+        Create a filter from a file containing a title on each line.
+
+        Blank lines are ignored.
+        """
+        with open(path, encoding="utf-8") as f:
+            capacity = sum(1 for line in f if line.strip())
+
+        with open(path, encoding="utf-8") as f:
+            titles = (line.strip() for line in f)
+            return cls.from_titles(
+                (title for title in titles if title), capacity, error_rate
+            )
+
+    def save(self, path: str) -> None:
+        """Write the filter to a file, see :meth:`load`."""
+        with open(path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(self._num_bits, self._num_hashes, self._count))
+            f.write(self._bits)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        """Read a filter which was written by :meth:`save`."""
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} does not contain a Bloom filter")
+            num_bits, num_hashes, count = _HEADER.unpack(f.read(_HEADER.size))
+            bits = bytearray(f.read())
+
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError(f"{path} is truncated")
+
+        bloom_filter = cls.__new__(cls)
+        bloom_filter._num_bits = num_bits
+        bloom_filter._num_hashes = num_hashes
+        bloom_filter._bits = bits
+        bloom_filter._count = count
+        return bloom_filter
@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import mwparserfromhell
+from mwparserfromhell import nodes
+from mwparserfromhell.wikicode import Wikicode
+
+from mwcomposerfromhell.cache import ParseCache
+from mwcomposerfromhell.composer import WikicodeToHtmlComposer
+from mwcomposerfromhell.lazy import DirectoryNamespace
+from mwcomposerfromhell.namespace import (
+    _normalize_title,
+    ArticleResolver,
+    CanonicalTitle,
+)
+
+# The name of the manifest, which is stored in the output directory.
+MANIFEST_NAME = ".mwcomposerfromhell-manifest.json"
+# The version of the format of the manifest.
+_MANIFEST_VERSION = 2
+# The directory containing the articles of the main namespace.
+MAIN_NAMESPACE = "Main"
+# The extension of the files containing wikicode.
+_EXTENSION = ".wiki"
+
+
+class BuildResult(NamedTuple):
+    """The outcome of a build."""
+
+    # The number of pages.
+    pages: int
+    # The number of pages which were rendered.
+    rendered: int
+    # The number of files which were written (the other rendered pages were
+    # unchanged).
+    written: int
+    # The number of files which were removed (as their page was removed).
+    removed: int
+    # The pages which could not be rendered and the error, they are rendered
+    # again by the next build.
+    failed: Tuple[Tuple[str, str], ...] = ()
+
+
+def _hash(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _fingerprint(wikicode: Wikicode) -> str:
+    """
+    A hash of the parts of an article which are used when it is transcluded.
+
+    The contents of comments and ``<noinclude>`` sections (at the top-level)
+    are ignored, so that changing them does not cause the articles transcluding
+    it to be rendered again. They are replaced by a marker, since whether they
+    exist affects the whitespace around them.
+    """
+    parts = []  # type: List[str]
+    for node in wikicode.nodes:
+        if isinstance(node, nodes.Comment):
+            parts.append("<!---->")
+        elif (
+            isinstance(node, nodes.Tag) and str(node.tag).strip().lower() == "noinclude"
+        ):
+            parts.append("<noinclude/>")
+        else:
+            parts.append(str(node))
+    return _hash("".join(parts))
+
+
+def _parse_file(path: str, parse_cache: Optional[ParseCache]) -> Wikicode:
+    """Parse the article in a file."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if parse_cache is not None:
+        return parse_cache.parse(text)
+    return mwparserfromhell.parse(text)
+
+
+def _full_titles(titles: Iterable[CanonicalTitle]) -> Set[str]:
+    return {title.full_title for title in titles if not title.interwiki}
+
+
+def _iter_files(src: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Find the files containing articles.
+
+    :return: Tuples of the namespace, the name of the article and the path of
+        the file (relative to the directory of the namespace).
+    """
+    for namespace in sorted(os.listdir(src)):
+        root = os.path.join(src, namespace)
+        if not os.path.isdir(root):
+            continue
+        if namespace == MAIN_NAMESPACE:
+            namespace = ""
+
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if not filename.endswith(_EXTENSION):
+                    continue
+                path = os.path.relpath(os.path.join(directory, filename), root)
+                name = path[: -len(_EXTENSION)].replace(os.sep, "/")
+                yield namespace, name.replace("_", " "), path
+
+
+def _load_manifest(path: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Load the manifest of the previous build, if it used the same configuration."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)  # type: Dict[str, Any]
+    except (OSError, ValueError):
+        return {"articles": {}, "pages": {}}
+
+    if manifest.get("version") != _MANIFEST_VERSION or manifest.get("config") != config:
+        # Everything must be rendered again, but unchanged files need not be
+        # written again.
+        return {
+            "articles": {},
+            "pages": {
+                title: {"output": page["output"], "hash": page["hash"]}
+                for title, page in manifest.get("pages", {}).items()
+            },
+        }
+    return manifest
+
+
+def _write(path: str, data: str) -> None:
+    """Write a file (replacing it once it is complete)."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def build(
+    src: str,
+    out: str,
+    base_url: str = "/wiki/",
+    parse_cache: Optional[ParseCache] = None,
+    full: bool = False,
+) -> BuildResult:
+    """
+    Render a directory of articles to a directory of HTML files.
+
+    The source directory contains a directory for each namespace (e.g.
+    ``Template``), the articles of the main namespace are in a directory named
+    ``Main``. The files are named as for ``DirectoryNamespace``. Each article
+    of the main namespace is rendered to an HTML file in the output directory.
+
+    A manifest of the articles (and what each page depends on) is kept in the
+    output directory, so that subsequent builds only render the pages which
+    changed or which depend on articles that changed. Changes to templates
+    which do not affect what is transcluded (e.g. to comments or
+    ``<noinclude>`` sections) are ignored. Files are only written if their
+    contents changed. Pages which cannot be rendered are skipped (and
+    reported).
+
+    :param src: The directory containing the articles.
+    :param out: The directory to write the HTML to.
+    :param base_url: The URL that articles sit in.
+    :param parse_cache: An optional cache of parsed articles stored on disk.
+    :param full: Whether to render every page (the files are still only written
+        if they changed).
+    """
+    config = {"base_url": base_url, "mwparserfromhell": mwparserfromhell.__version__}
+    manifest_path = os.path.join(out, MANIFEST_NAME)
+    previous = _load_manifest(manifest_path, config)
+    previous_articles = previous["articles"]  # type: Dict[str, Dict[str, Any]]
+    previous_pages = previous["pages"]  # type: Dict[str, Dict[str, Any]]
+
+    resolver = ArticleResolver(base_url=base_url)
+    for namespace in sorted(os.listdir(src)):
+        root = os.path.join(src, namespace)
+        if os.path.isdir(root):
+            resolver.add_namespace(
+                "" if namespace == MAIN_NAMESPACE else namespace,
+                DirectoryNamespace(root, _EXTENSION, parse_cache=parse_cache),
+            )
+
+    # Find the articles, the files are only read if they might have changed.
+    articles = {}  # type: Dict[str, Dict[str, Any]]
+    # The path of the file of each article.
+    files = {}  # type: Dict[str, str]
+    # The output path of each page.
+    pages = {}  # type: Dict[str, str]
+    for namespace, name, path in _iter_files(src):
+        # The title is not canonicalized by the resolver, as the name might
+        # contain a colon.
+        full_title = CanonicalTitle(namespace, _normalize_title(name), "").full_title
+        file_path = os.path.join(src, namespace or MAIN_NAMESPACE, path)
+        files[full_title] = file_path
+        stat = os.stat(file_path)
+        entry = previous_articles.get(full_title)
+        if (
+            entry is None
+            or entry["mtime_ns"] != stat.st_mtime_ns
+            or entry["size"] != stat.st_size
+        ):
+            with open(file_path, "rb") as f:
+                source_hash = hashlib.sha256(f.read()).hexdigest()
+            fingerprint = None
+            if entry is not None and entry["hash"] == source_hash:
+                fingerprint = entry["fingerprint"]
+            entry = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": source_hash,
+                "fingerprint": fingerprint,
+            }
+        articles[full_title] = entry
+        if not namespace:
+            pages[full_title] = path[: -len(_EXTENSION)] + ".html"
+
+    def get_fingerprint(full_title: str) -> Optional[str]:
+        """The fingerprint of an article, or None if it cannot be read."""
+        try:
+            return _fingerprint(_parse_file(files[full_title], parse_cache))
+        except (OSError, ValueError):
+            return None
+
+    # The articles which were added or removed.
+    existence_changed = articles.keys() ^ previous_articles.keys()
+    # The articles whose transcluded content changed.
+    transclusion_changed = set(existence_changed)
+    # The articles whose source changed.
+    modified = set()  # type: Set[str]
+    for full_title, entry in articles.items():
+        previous_entry = previous_articles.get(full_title)
+        if previous_entry is None or previous_entry["hash"] == entry["hash"]:
+            continue
+        modified.add(full_title)
+
+        # If the article is transcluded, its dependents only need to be
+        # rendered if the content they transclude changed (early cutoff).
+        if previous_entry["fingerprint"] is not None:
+            entry["fingerprint"] = get_fingerprint(full_title)
+            if entry["fingerprint"] == previous_entry["fingerprint"]:
+                continue
+        transclusion_changed.add(full_title)
+
+    # Render the pages which changed or whose dependencies changed.
+    composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+    manifest_pages = {}  # type: Dict[str, Dict[str, Any]]
+    rendered = written = 0
+    failed = []  # type: List[Tuple[str, str]]
+    for full_title, output in sorted(pages.items()):
+        page = previous_pages.get(full_title)
+        if (
+            full
+            or page is None
+            or "transcluded" not in page
+            or full_title in modified
+            or not transclusion_changed.isdisjoint(page["transcluded"])
+            or not existence_changed.isdisjoint(page["checked"])
+        ):
+            try:
+                html = composer.compose(_parse_file(files[full_title], parse_cache))
+            except Exception as e:
+                # Other pages are still rendered, this one is rendered again
+                # by the next build.
+                failed.append((full_title, f"{type(e).__name__}: {e}"))
+                continue
+            rendered += 1
+            html_hash = _hash(html)
+            output_path = os.path.join(out, output)
+            if (
+                page is None
+                or page["hash"] != html_hash
+                or not os.path.exists(output_path)
+            ):
+                _write(output_path, html)
+                written += 1
+
+            dependencies = composer.dependencies
+            page = {
+                "output": output,
+                "hash": html_hash,
+                "transcluded": sorted(_full_titles(dependencies.transcluded)),
+                "checked": sorted(_full_titles(dependencies.checked)),
+            }
+        manifest_pages[full_title] = page
+
+    # Remove the output of pages which were removed.
+    removed = 0
+    for full_title, page in previous_pages.items():
+        if full_title not in pages:
+            try:
+                os.unlink(os.path.join(out, page["output"]))
+            except FileNotFoundError:
+                pass
+            removed += 1
+
+    # Record what is transcluded by articles which are transcluded.
+    for page in manifest_pages.values():
+        for full_title in page["transcluded"]:
+            entry = articles.get(full_title)
+            if entry is not None and entry["fingerprint"] is None:
+                entry["fingerprint"] = get_fingerprint(full_title)
+
+    os.makedirs(out, exist_ok=True)
+    _write(
+        manifest_path,
+        json.dumps(
+            {
+                "version": _MANIFEST_VERSION,
+                "config": config,
+                "articles": articles,
+                "pages": manifest_pages,
+            },
+            sort_keys=True,
+        ),
+    )
+
+    return BuildResult(len(pages), rendered, written, removed, tuple(failed))
@@ -0,0 +1,351 @@
+import collections
+import hashlib
+import heapq
+import os
+import pickle
+import tempfile
+import threading
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+import mwparserfromhell
+from mwparserfromhell.wikicode import Wikicode
+
+from mwcomposerfromhell.dependencies import Dependencies
+
+if TYPE_CHECKING:
+    # typing.OrderedDict was added in Python 3.7.2.
+    from typing import OrderedDict
+
+# The version of the format of the files in a ParseCache.
+_PARSE_CACHE_VERSION = 1
+
+
+class TemplateExpansion(NamedTuple):
+    """The result of expanding a template."""
+
+    # The rendered HTML.
+    html: str
+    # The names of any templates transcluded while rendering (including the
+    # template itself), used to detect template loops.
+    transcluded: FrozenSet[str]
+    # The articles the expansion depended on (including the template itself).
+    dependencies: Optional[Dependencies] = None
+
+
+class _Entry:
+    __slots__ = ("value", "size", "cost", "priority")
+
+    def __init__(self, value: TemplateExpansion, size: int, cost: float):
+        self.value = value
+        self.size = size
+        self.cost = cost
+        self.priority = 0.0
+
+
+class TemplateCache:
+    """
+    A bounded cache of expanded templates which can be shared between renders.
+
+    When full, the entries which are the cheapest to re-render relative to their
+    size are evicted first. Entries which are used again have their priority
+    refreshed, so frequently used entries are kept longer. (This is the
+    GreedyDual-Size algorithm.)
+
+    It is safe to use from multiple threads.
+
+    :param max_size: The maximum total size of the cached HTML (in characters).
+    """
+
+    def __init__(self, max_size: int = 32 * 1024 * 1024):
+        self.max_size = max_size
+
+        # The current total size of the cached HTML.
+        self.size = 0
+        # Statistics.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = {}  # type: Dict[Hashable, _Entry]
+        # A heap of (priority, counter, key). Entries whose priority has since
+        # changed are skipped when popped.
+        self._heap = []  # type: List[Tuple[float, int, Hashable]]
+        self._counter = 0
+        # The priority of the most recently evicted entry, new priorities are
+        # relative to it so that entries which are not used age out.
+        self._clock = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The lock cannot be pickled, a new one is created when un-pickled.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _prioritize(self, key: Hashable, entry: _Entry) -> None:
+        entry.priority = self._clock + entry.cost / entry.size
+        self._counter += 1
+        heapq.heappush(self._heap, (entry.priority, self._counter, key))
+
+        # Avoid the heap growing unbounded with out-of-date items.
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (entry.priority, it, key)
+                for it, (key, entry) in enumerate(self._entries.items())
+            ]
+            heapq.heapify(self._heap)
+
+    def _evict(self) -> None:
+        """Remove the entry with the lowest priority."""
+        while self._heap:
+            priority, _, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            # Skip items which are out-of-date.
+            if entry is None or entry.priority != priority:
+                continue
+
+            self._clock = priority
+            del self._entries[key]
+            self.size -= entry.size
+            self.evictions += 1
+            return
+
+    def get(self, key: Hashable) -> Optional[TemplateExpansion]:
+        """Get a cached template expansion, if it exists."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._prioritize(key, entry)
+            return entry.value
+
+    def put(self, key: Hashable, value: TemplateExpansion, cost: float) -> None:
+        """
+        Cache a template expansion.
+
+        :param key: The key to store the expansion under.
+        :param value: The expansion.
+        :param cost: How expensive the expansion was to render (in seconds).
+        """
+        size = max(len(value.html), 1)
+        # Don't let a single entry flush the entire cache.
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            self._discard(key)
+            while self._entries and self.size + size > self.max_size:
+                self._evict()
+
+            entry = _Entry(value, size, cost)
+            self._entries[key] = entry
+            self.size += size
+            self._prioritize(key, entry)
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def discard(self, key: Hashable) -> None:
+        """Remove an entry, if it exists."""
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        """Remove all entries, e.g. after the articles have changed."""
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+            self.size = 0
+            self._clock = 0.0
+
+
+class LRUCache:
+    """
+    A bounded cache which evicts the least recently used entries first.
+
+    By default each entry has a size of 1, i.e. the size of the cache is the
+    number of entries. It is safe to use from multiple threads.
+
+    :param max_size: The maximum size of the entries, if this is 0 nothing is
+        cached.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        # The total size of the entries.
+        self.size = 0
+
+        # Statistics.
+        self.hits = 0
+        self.misses = 0
+
+        # The entries, from least to most recently used.
+        self._entries = collections.OrderedDict()  # type: OrderedDict[Hashable, Any]
+        # The size of each entry which does not have a size of 1.
+        self._sizes = {}  # type: Dict[Hashable, int]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The lock cannot be pickled, a new one is created when un-pickled.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups which found an entry."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable) -> Any:
+        """Get a cached value, or None if it does not exist."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, size: int = 1) -> None:
+        """Cache a value, evicting the least recently used entries if full."""
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._sizes.pop(key, 1)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if size != 1:
+                self._sizes[key] = size
+            self.size += size
+
+            while self.size > self.max_size:
+                old_key, _ = self._entries.popitem(last=False)
+                self.size -= self._sizes.pop(old_key, 1)
+
+    def discard(self, key: Hashable) -> None:
+        """Remove an entry, if it exists."""
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+                self.size -= self._sizes.pop(key, 1)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.size = 0
+
+
+class ParseCache:
+    """
+    A cache of parsed wikicode which is stored on disk, e.g. to avoid parsing
+    the same articles each time a process starts.
+
+    The parsed wikicode is keyed by a hash of the source and the version of
+    mwparserfromhell, so changed articles (or a different version of
+    mwparserfromhell) are parsed again. Entries are never removed, the
+    directory can be deleted at any time to clear the cache.
+
+    The files are pickled, the directory must only be writable by trusted
+    users.
+
+    :param directory: The directory to store the parsed wikicode in, it is
+        created if it does not exist.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+        # Statistics.
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, text: str) -> str:
+        """The path of the file for the given source."""
+        digest = hashlib.sha256()
+        digest.update(
+            f"{_PARSE_CACHE_VERSION}:{mwparserfromhell.__version__}:".encode("utf-8")
+        )
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        key = digest.hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".pickle")
+
+    def parse(self, text: str) -> Wikicode:
+        """Parse wikicode, using the stored result if it was parsed before."""
+        path = self._path(text)
+        try:
+            with open(path, "rb") as f:
+                wikicode = pickle.load(f)
+        except Exception:
+            # The file does not exist or is corrupt (e.g. it was truncated), in
+            # which case it gets replaced.
+            pass
+        else:
+            if isinstance(wikicode, Wikicode):
+                self.hits += 1
+                return wikicode
+
+        self.misses += 1
+        wikicode = mwparserfromhell.parse(text)
+        self._store(path, wikicode)
+        return wikicode
+
+    def _store(self, path: str, wikicode: Wikicode) -> None:
+        """Write parsed wikicode to a file, errors are ignored."""
+        try:
+            data = pickle.dumps(wikicode, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError):
+            # Very deeply nested wikicode cannot be pickled.
+            return
+
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file first so that other processes never
+            # see a partially written file.
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError:
+            pass
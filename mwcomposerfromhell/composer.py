@@ -1,20 +1,41 @@
+import collections
+import functools
 import html
 import re
-from typing import Generator, Iterator, List, Optional, Set, Tuple
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
 
 from mwparserfromhell import nodes, wikicode
 from mwparserfromhell.nodes import extras
 from mwparserfromhell.string_mixin import StringMixIn
 
+from mwcomposerfromhell.cache import TemplateExpansion
+from mwcomposerfromhell.dependencies import Dependencies
+from mwcomposerfromhell.links import LinkHolders
 from mwcomposerfromhell.namespace import (
     ArticleNotFound,
     ArticleResolver,
     CanonicalTitle,
+    Context,
     MagicWordNotFound,
     ParentContext,
     ParserFunctionNotFound,
 )
-from mwcomposerfromhell.nodes import Wikilink
+from mwcomposerfromhell.plan import MAX_RECORDED_STATES, RenderPlan
+from mwcomposerfromhell.stack import LIST_TAGS, TagStack  # noqa: F401
 
 # The markup for different lists mapped to the list tag and list item tag.
 MARKUP_TO_LIST = {
@@ -70,22 +91,46 @@ _NO_P_TAGS = {
     "object",
 }
 
-# Tags that represent a list or list items.
-LIST_TAGS = {"ul", "ol", "li", "dl", "dt", "dd"}
+# The HTML to open and close tags which are commonly opened and closed.
+_OPEN_TAGS = {tag: f"<{tag}>" for tag in LIST_TAGS}
+_CLOSE_TAGS = {tag: f"</{tag}>" for tag in LIST_TAGS | _NO_P_TAGS | {"p"}}
 
 # Table markup.
 TABLE_ROWS = {"!-", "|-"}
 TABLE_CELLS = {"!", "|"}
+# Markup which has padding after the tag.
+PADDED_MARKUP = {"{|"} | TABLE_ROWS
+# Tags which are escaped instead of rendered.
+INVALID_TAGS = {"a"}
 
 # One or more line-breaks, including any spaces at the start of lines.
-LINE_BREAK_PATTERN = re.compile(r"(\n(?: *\n)*)")
+LINE_BREAK_PATTERN = re.compile(r"\n(?: *\n)*")
+# The end of a line (matching the line boundaries of str.splitlines()).
+LINE_END_PATTERN = re.compile(r"\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# A line (other than the first) starting with a space, which might be
+# preformatted text. The second pattern is faster, but only valid if there are
+# no other line boundaries than new-lines.
+SPACE_LINE_PATTERN = re.compile(r"[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029] ")
+NEW_LINE_SPACE_PATTERN = re.compile(r"\n ")
+# Line boundaries other than new-lines.
+OTHER_LINE_BOUNDARIES = "\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
 # Patterns used to strip comments.
 LINE_BREAK_SPACES_PATTERN = re.compile(r"\n *")
 SPACES_LINE_BREAK_PATTERN = re.compile(r" *\n")
+SPACES_PATTERN = re.compile(r" *")
 # Link trails are any words followed by a space or new-line.
 LINK_TRAIL_PATTERN = re.compile(r"^([a-zA-Z]+)\b")
 
 
+def _is_empty(code: Optional[wikicode.Wikicode]) -> bool:
+    """
+    Whether Wikicode is missing or has no nodes.
+
+    Note that this avoids ``bool(code)``, which converts the entire tree to a string.
+    """
+    return code is None or not code.nodes
+
+
 class UnknownNode(Exception):
     pass
 
@@ -98,36 +143,340 @@ class HtmlComposingError(Exception):
     pass
 
 
+class MaxDepthExceeded(HtmlComposingError):
+    """The nodes are nested more deeply than the maximum depth."""
+
+
+class _Frame:
+    """The state of rendering an article, saved while rendering a template."""
+
+    __slots__ = ("context", "stack", "volatile", "transcluded", "dependencies")
+
+    def __init__(
+        self,
+        context: ParentContext,
+        stack: TagStack,
+        volatile: bool,
+        transcluded: Set[str],
+        dependencies: Dependencies,
+    ):
+        self.context = context
+        self.stack = stack
+        self.volatile = volatile
+        self.transcluded = transcluded
+        self.dependencies = dependencies
+
+
+def _line_end(text: str, pos: int) -> int:
+    """Find the end of the line starting at pos (including the line break)."""
+    match = LINE_END_PATTERN.search(text, pos)
+    return match.end() if match else len(text)
+
+
+def _skip_spaces(value: str, start: int) -> int:
+    """Find the end of the spaces at start of a string."""
+    match = SPACES_PATTERN.match(value, start)
+    return match.end() if match else start
+
+
+class _TextRun:
+    """
+    Adjacent text nodes (after removing comment nodes) being combined.
+
+    The text is kept as a list of fragments which is only joined once all of
+    the text nodes are found.
+
+    :param node: The first text node.
+    :param value: The value of the first text node (after removing any link
+        trail from it).
+    """
+
+    __slots__ = ("node", "modified", "parts", "rest", "offset")
+
+    def __init__(self, node: nodes.Text, value: str):
+        self.node = node
+        # Whether the value is different from the value of the (first) node.
+        self.modified = value is not node.value
+        # Fragments of text which come before the first line break.
+        self.parts = []  # type: List[str]
+        # Fragments of text which have not yet been searched for a line break,
+        # starting at offset into the first one.
+        self.rest = collections.deque([value])
+        self.offset = 0
+
+    def _strip_line_break(self) -> None:
+        """Remove the first line break (and any spaces after it)."""
+        rest = self.rest
+        while rest:
+            value = rest[0]
+            pos = value.find("\n", self.offset)
+            if pos == -1:
+                self.parts.append(value[self.offset :])
+                rest.popleft()
+                self.offset = 0
+                continue
+
+            self.parts.append(value[self.offset : pos])
+            # The spaces might continue into the following fragments.
+            end = _skip_spaces(value, pos + 1)
+            while end == len(value):
+                rest.popleft()
+                if not rest:
+                    end = 0
+                    break
+                value = rest[0]
+                end = _skip_spaces(value, 0)
+            self.offset = end
+            return
+
+    def append(self, node: nodes.Text) -> None:
+        """Combine another text node with the text."""
+        # A removed comment strips any spaces on the line it was on, plus a
+        # single newline. In order to get all whitespace, look at both text
+        # nodes.
+        self._strip_line_break()
+        self.rest.append(SPACES_LINE_BREAK_PATTERN.sub("\n", node.value, count=1))
+        self.modified = True
+
+    def to_node(self) -> nodes.Text:
+        """Get the combined text as a single node."""
+        if not self.modified:
+            return self.node
+
+        rest = self.rest
+        if rest:
+            rest[0] = rest[0][self.offset :]
+        return nodes.Text(value="".join(self.parts) + "".join(rest))
+
+
+def _combined_text(
+    node: nodes.Text, value: str, text: Optional[_TextRun]
+) -> nodes.Text:
+    """
+    Get the text node for adjacent text nodes.
+
+    :param node: The first text node.
+    :param value: The value of the first text node (after removing any link
+        trail from it).
+    :param text: The combined text, if there were multiple text nodes.
+    """
+    if text is not None:
+        return text.to_node()
+    if value is node.value:
+        return node
+    return nodes.Text(value=value)
+
+
+# Adjacent table cells have a blank line between them. Rendering this is the
+# same as rendering a text node containing a new-line, but is done directly
+# (unless a custom handler is used for text).
+_CELL_SEPARATOR = nodes.Text(value="\n")
+
+
+# The output of the visitor: fragments of HTML which get joined once at the end.
+OutputBuffer = List[str]
+
+# A request to visit a node: the node, the output buffer, in_root and
+# ignore_whitespace.
+VisitRequest = Tuple[StringMixIn, OutputBuffer, bool, bool]
+
+# A node handler is called with the visitor, the node to handle, the output
+# buffer, and whether the node is in the root and whether to ignore whitespace.
+# The visit_* methods of a visitor are node handlers.
+#
+# Handlers which need to visit other nodes can either call visit() directly or
+# be generators which yield a request for each node to visit, the generator is
+# resumed after the node was visited. (The latter avoids recursion when
+# rendering iteratively.)
+NodeHandler = Callable[[Any, Any, OutputBuffer, bool, bool], Optional["Visits"]]
+Visits = Generator[VisitRequest, None, None]
+
+# The default maximum depth of nested nodes when rendering iteratively.
+DEFAULT_MAX_DEPTH = 10000
+
+# The number of fragments of HTML to buffer before yielding a chunk when
+# streaming a large node.
+STREAM_BUFFER_LENGTH = 4096
+
+
+@functools.lru_cache(maxsize=256)
+def _normalize_tag_name(name: str) -> str:
+    """Escape and lower-case the name of a tag."""
+    return html.escape(name, quote=False).lower()
+
+
 class WikiNodeVisitor:
+    """
+    Dispatch nodes to handlers based on their type.
+
+    By default a node of type ``Foo`` is handled by the ``visit_Foo`` method (or
+    the method of the closest base class of the node which has one). Additional
+    handlers can be registered with :meth:`register_handler`.
+
+    By default, nodes are visited recursively, which is limited by the maximum
+    recursion depth of Python. Alternately, nodes can be visited iteratively
+    (using an explicit stack), which is only limited by ``max_depth``.
+
+    :param iterative: Whether to visit nodes iteratively.
+    :param max_depth: The maximum depth of nested nodes when visiting nodes
+        iteratively.
+    """
+
+    # A map of node type to the visit_* method which handles it. This is filled
+    # in as node types are found and is separate for each subclass.
+    _dispatch_table = {}  # type: Dict[type, NodeHandler]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._dispatch_table = {}
+
+    def __init__(
+        self, iterative: bool = False, max_depth: int = DEFAULT_MAX_DEPTH
+    ) -> None:
+        self._iterative = iterative
+        self._max_depth = max_depth
+
+        # Handlers which were explicitly registered on this instance.
+        self._registered_handlers = {}  # type: Dict[type, NodeHandler]
+        # The handler for each node type. This is shared with the class until
+        # a handler gets registered.
+        self._handlers = self._dispatch_table
+
+    def register_handler(self, node_type: type, handler: NodeHandler) -> None:
+        """
+        Register a handler for a type of node (and any sub-classes of it).
+
+        This takes precedence over the ``visit_*`` methods and can be used to
+        handle additional node types or to override how a node type is handled.
+
+        :param node_type: The type of node to handle.
+        :param handler: A callable which takes the visitor, the node, the output
+            buffer, ``in_root`` and ``ignore_whitespace``.
+        """
+        self._registered_handlers[node_type] = handler
+        # Any previously found handlers might now be incorrect.
+        self._handlers = dict(self._registered_handlers)
+
+    def _find_handler(self, node_type: type) -> NodeHandler:
+        """Find (and remember) the handler for a type of node."""
+        for klass in node_type.__mro__[:-1]:
+            handler = self._registered_handlers.get(klass) or getattr(
+                type(self), "visit_" + klass.__name__, None
+            )
+
+            if handler is not None:
+                self._handlers[node_type] = handler
+                return handler
+
+        raise UnknownNode(f"Unknown node type: {node_type.__name__}")
+
     def visit(
         self,
         node: StringMixIn,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> None:
         """
-        Calculate the method to call to handle this node, passing along inputs to it.
+        Find the handler for this node, passing along inputs to it.
 
         :param node: The node to handle.
+        :param out: The buffer to append the result of handling this node to.
         :param in_root: Whether this node is a direct descendant of the root Wikicode object.
         :param ignore_whitespace: Whether to skip special whitespace handling.
-        :return: The result of handling this node (recursively).
         """
-        method_name = "visit_" + node.__class__.__name__
+        try:
+            handler = self._handlers[type(node)]
+        except KeyError:
+            handler = self._find_handler(type(node))
+
+        visits = handler(self, node, out, in_root, ignore_whitespace)
+        if visits is None:
+            return
+
+        if self._iterative:
+            self._visit_iteratively(visits)
+            return
 
         try:
-            method = getattr(self, method_name)
-        except AttributeError:
-            raise UnknownNode(f"Unknown node type: {node.__class__.__name__}")
+            for request in visits:
+                self.visit(*request)
+        except BaseException:
+            # Ensure the handler cleans up.
+            visits.close()
+            raise
+
+    def _visit_iteratively(self, visits: Visits) -> None:
+        """Handle the nodes requested by a handler, using a stack instead of recursion."""
+        for _ in self._iter_visits(visits):
+            pass
 
-        return method(node, in_root, ignore_whitespace)  # type: ignore[no-any-return]
+    def _iter_visits(self, visits: Visits) -> Iterator[None]:
+        """
+        Handle the nodes requested by a handler, using a stack instead of
+        recursion.
+
+        This yields after each node was handled, allowing the caller to act on
+        the progress, e.g. flushing the output.
+        """
+        # The handlers currently in progress.
+        stack = [visits]
+
+        try:
+            while stack:
+                request = next(stack[-1], None)
+                # The handler is finished.
+                if request is None:
+                    stack.pop()
+                    yield
+                    continue
+
+                node, out, in_root, ignore_whitespace = request
+                try:
+                    handler = self._handlers[type(node)]
+                except KeyError:
+                    handler = self._find_handler(type(node))
+
+                child_visits = handler(self, node, out, in_root, ignore_whitespace)
+                if child_visits is not None:
+                    if len(stack) >= self._max_depth:
+                        child_visits.close()
+                        raise MaxDepthExceeded(
+                            f"Nodes are nested more than {self._max_depth} deep"
+                        )
+                    stack.append(child_visits)
+
+        except BaseException:
+            # Ensure any handlers in progress clean up, innermost first.
+            for in_progress in reversed(stack):
+                in_progress.close()
+            raise
+
+    def render(
+        self,
+        node: StringMixIn,
+        in_root: bool = False,
+        ignore_whitespace: bool = False,
+    ) -> str:
+        """
+        Handle a node into a new buffer and return the result as a string.
+
+        This is useful when the result needs to be modified before being output
+        (or is not output at all), e.g. names of tags or templates.
+        """
+        out = []  # type: OutputBuffer
+        self.visit(node, out, in_root, ignore_whitespace)
+        return "".join(out)
 
 
 class WikicodeToHtmlComposer(WikiNodeVisitor):
     """
     Format HTML from parsed Wikicode.
 
-    Note that this is not currently re-usable.
+    A composer can be re-used for multiple renders (but not concurrently), the
+    state of each render is reset at the start of it. See
+    :class:`mwcomposerfromhell.pool.ComposerPool` for sharing composers between
+    threads.
 
     See https://en.wikipedia.org/wiki/Help:Wikitext for a full definition.
     """
@@ -139,21 +488,21 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         expand_templates: bool = True,
         context: Optional[ParentContext] = None,
         open_templates: Optional[Set[str]] = None,
+        dedupe_templates: bool = False,
+        iterative: bool = False,
+        max_depth: int = DEFAULT_MAX_DEPTH,
     ):
+        super().__init__(iterative, max_depth)
+
+        # The configuration, this is kept between renders.
+
         # Whether to render links to unknown articles as red links or normal links.
         self._red_links = red_links
         # Whether to expand transcluded templates.
         self._expand_templates = expand_templates
-
-        self._pending_lists = []  # type: List[str]
-
-        # Track the currently open tags.
-        self._stack = []  # type: List[str]
-
-        # Track current templates to avoid a loop.
-        self._open_templates = open_templates or set()
-
-        self._context = context or {}
+        # Whether to re-use expanded templates which are called multiple times
+        # (with the same parameters) in a render.
+        self._dedupe_templates = dedupe_templates
 
         # A place to lookup templates.
         if resolver is None:
@@ -162,80 +511,141 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
             raise ValueError("resolver must be an instance of ArticleResolver")
         self._resolver = resolver
 
-    def _maybe_open_tag(self, in_root: bool) -> str:
+        # Links to articles which might not exist are rendered as placeholders,
+        # which are replaced once it is known whether the articles exist.
+        self._link_holders = LinkHolders(resolver) if red_links else None
+
+        # Calculated on demand, see _get_config_key().
+        self._config_key = None  # type: Optional[Hashable]
+
+        # The state each render starts with.
+        self._initial_context = context or {}
+        self._initial_open_templates = frozenset(open_templates or ())
+
+        # The state of the current render, see reset().
+
+        # Track the currently open tags (and the lists waiting to be opened).
+        self._stack = TagStack()
+
+        # Track current templates to avoid a loop.
+        self._open_templates = open_templates or set()
+
+        self._context = self._initial_context
+
+        # Whether the render includes things that are not cacheable (e.g. the
+        # current time).
+        self._volatile = False
+        # The names of templates which were transcluded.
+        self._transcluded = set()  # type: Set[str]
+        # The articles the render depends on.
+        self._dependencies = Dependencies()
+        # The revisions of the articles which were transcluded.
+        self._revisions = {}  # type: Dict[CanonicalTitle, Optional[Hashable]]
+
+        # The state of the parent articles of templates being rendered.
+        self._frames = []  # type: List[_Frame]
+
+        # The link trail of the link about to be visited, see _fix_nodes().
+        self._link_trail = None  # type: Optional[str]
+
+        # Templates expanded during the current render, if they're deduplicated.
+        self._render_cache = (
+            {} if dedupe_templates else None
+        )  # type: Optional[Dict[Hashable, TemplateExpansion]]
+
+    def register_handler(self, node_type: type, handler: NodeHandler) -> None:
+        super().register_handler(node_type, handler)
+        self._config_key = None
+
+    def reset(self) -> None:
+        """
+        Reset the state of the current render.
+
+        This is called at the start of each render, but can be used to drop
+        references to a finished render.
+        """
+        self._stack = TagStack()
+        self._open_templates = set(self._initial_open_templates)
+        self._context = self._initial_context
+        self._volatile = False
+        self._transcluded = set()
+        self._dependencies = Dependencies()
+        self._revisions = {}
+        self._render_cache = {} if self._dedupe_templates else None
+        self._frames = []
+        self._link_trail = None
+
+    @property
+    def dependencies(self) -> Dependencies:
+        """
+        The articles the current (or last) render depended on: the templates
+        it transcluded, the articles it checked the existence of and the
+        articles it linked to. See :class:`DependencyIndex`.
+        """
+        return self._dependencies
+
+    def _maybe_open_tag(self, in_root: bool, out: OutputBuffer) -> None:
         """
         Handle the logic for whether this node gets wrapped in a list or a paragraph.
         """
         # If the node is not currently in the "root" Wikicode, nothing is done.
         if not in_root:
-            return ""
+            return
+
+        stack = self._stack
 
         # Handle whether there's any lists to open.
-        if self._pending_lists:
+        pending = stack.pending
+        if pending:
             # The overall algorithm for deciding which tags to open and which to
             # close is nuanced:
             #
             # 1. Calculate the portion of lists and list items that are identical.
             # 2. Close the end of what doesn't match.
             # 3. Open the new tags.
-            result = ""
-
-            # The currently open lists.
-            stack_lists = [
-                list_tag for list_tag in self._stack if list_tag in LIST_TAGS
-            ]
-
-            # Don't consider the latest list item to open in the comparison, it
-            # always needs to be opened.
-            shortest = min([len(stack_lists), len(self._pending_lists) - 1])
-            # Find the index of the last matching item.
-            for i in range(shortest):
-                if stack_lists[i] != self._pending_lists[i]:
-                    break
-            else:
-                i = shortest
+            #
+            # The stack keeps track of the identical portion as the pending
+            # lists are added.
+            i = stack.pending_prefix()
 
-            # Close anything past the matching items.
-            for stack_node in reversed(stack_lists[i:]):
-                result += self._close_stack(stack_node)
+            # Close anything past the matching items, from the innermost list
+            # (closing tags modifies the open lists).
+            stack_lists = stack.lists
+            while len(stack_lists) > i:
+                self._close_stack(stack_lists[-1], out)
 
             # Open any items that are left from the pending list.
-            for tag in self._pending_lists[i:]:
-                self._stack.append(tag)
-                result += f"<{tag}>"
+            for i in range(i, len(pending)):
+                tag = pending[i]
+                stack.push(tag)
+                out.append(_OPEN_TAGS[tag])
 
             # Reset the pending list.
-            self._pending_lists = []
-            return result
+            stack.clear_pending()
+            return
 
         # Paragraphs do not go inside of other elements.
-        if not self._stack:
-            self._stack.append("p")
-            return "<p>"
+        if not stack:
+            stack.push("p")
+            out.append("<p>")
 
-        # Otherwise, do nothing.
-        return ""
-
-    def _close_stack(self, tag: str) -> str:
+    def _close_stack(self, tag: str, out: OutputBuffer) -> None:
         """Close tags that are on the stack. It closes all tags until ``tag`` is found."""
         # For the given tag, close all tags behind it (in reverse order).
-        result = ""
-        while len(self._stack):
-            current_tag = self._stack.pop()
-            result += f"</{current_tag}>"
+        stack = self._stack
+        while stack:
+            current_tag = stack.pop()
+            try:
+                out.append(_CLOSE_TAGS[current_tag])
+            except KeyError:
+                out.append(f"</{current_tag}>")
 
             if current_tag == tag:
                 break
 
-        return result
-
     def _get_last_table(self) -> int:
         """Return the index in the stack of the most recently opened table."""
-        # Find the part of the stack since the last table was opened.
-        last_table = -1
-        for it, stack_tag in enumerate(self._stack):
-            if stack_tag == "table":
-                last_table = it
+        last_table = self._stack.last_index("table")
 
         # A table should always be found.
         assert last_table != -1
@@ -244,8 +654,8 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
 
     def _fix_nodes(
         self,
-        nodes_iterator: Iterator[StringMixIn],
-    ) -> Generator[StringMixIn, None, None]:
+        nodes_iterator: Iterable[nodes.Node],
+    ) -> Iterator[Tuple[nodes.Node, Optional[str]]]:
         """
         Iterate through nodes making some fixes:
 
@@ -254,39 +664,54 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         * Handle link trails.
         * Add proper spacing between table nodes.
 
+        Each node is yielded with the link trail for it (if it is a link).
         """
+        # The previous node (if it is not text) and its link trail.
         prev_node = None
+        prev_trail = None  # type: Optional[str]
+        # The previous text node and its value (after removing a link trail)
+        # and, if there are multiple adjacent text nodes, the combined text.
+        text_node = None  # type: Optional[nodes.Text]
+        text_value = ""
+        text = None  # type: Optional[_TextRun]
+
         for node in nodes_iterator:
             # Skip comment nodes.
             if isinstance(node, nodes.Comment):
                 continue
 
-            # Convert Wikilinks to the mwcomposerfromhell subclass.
-            if isinstance(node, nodes.Wikilink):
-                node = Wikilink(node.title, node.text)
-
-            # Two adjacent (after removing comment nodes) text nodes are combined.
-            if isinstance(prev_node, nodes.Text) and isinstance(node, nodes.Text):
-                # A removed comment strips any spaces on the line it was on,
-                # plus a single newline. In order to get all whitespace, look at
-                # both text nodes.
-                prev = LINE_BREAK_SPACES_PATTERN.sub("", prev_node.value, count=1)
-                current = SPACES_LINE_BREAK_PATTERN.sub("\n", node.value, count=1)
-
-                prev_node = nodes.Text(value=prev + current)
+            if isinstance(node, nodes.Text):
+                # Two adjacent (after removing comment nodes) text nodes are
+                # combined.
+                if text_node is not None:
+                    if text is None:
+                        text = _TextRun(text_node, text_value)
+                    text.append(node)
+                    continue
+
+                # The start of the text from a text node can be added to a link
+                # occurring before it.
+                value = node.value
+                if isinstance(prev_node, nodes.Wikilink):
+                    # Try to find a link trail and apply it to the previous link.
+                    # TODO This should NOT apply if the previous link was to an image.
+                    match = LINK_TRAIL_PATTERN.match(value)
+                    if match:
+                        # The link gets the link trail added to the text.
+                        prev_trail = match[1]
+                        # The text gets the link trailed removed from it.
+                        value = value[len(prev_trail) :]
+
+                if prev_node is not None:
+                    yield prev_node, prev_trail
+                    prev_node = prev_trail = None
+                text_node = node
+                text_value = value
                 continue
 
-            # The start of the text from a text node can be added to a link
-            # occurring before it.
-            elif isinstance(prev_node, Wikilink) and isinstance(node, nodes.Text):
-                # Try to find a link trail and apply it to the previous link.
-                # TODO This should NOT apply if the previous link was to an image.
-                match = LINK_TRAIL_PATTERN.match(node.value)
-                if match:
-                    # The link gets the link trail added to the text.
-                    prev_node = Wikilink(prev_node.title, prev_node.text, match[1])
-                    # The text gets the link trailed removed from it.
-                    node = nodes.Text(value=node.value[len(match[1]) :])
+            if text_node is not None:
+                yield _combined_text(text_node, text_value, text), None
+                text_node = text = None
 
             # Adjacent table header or data nodes have a blank line between them.
             elif isinstance(prev_node, nodes.Tag) and isinstance(node, nodes.Tag):
@@ -294,184 +719,336 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
                     prev_node.wiki_markup in TABLE_CELLS
                     and node.wiki_markup in TABLE_CELLS
                 ):
-                    yield prev_node
-                    prev_node = nodes.Text(value="\n")
+                    yield prev_node, None
+                    prev_node = _CELL_SEPARATOR
 
             # Otherwise, yield the previous node and store the current one.
-            if prev_node:
-                yield prev_node
+            if prev_node is not None:
+                yield prev_node, prev_trail
+                prev_trail = None
             prev_node = node
 
         # Yield the last node.
-        if prev_node:
-            yield prev_node
+        if text_node is not None:
+            yield _combined_text(text_node, text_value, text), None
+        elif prev_node is not None:
+            yield prev_node, prev_trail
+
+    def _has_default_text_handler(self) -> bool:
+        """Whether text is rendered by the default handler."""
+        handler = self._handlers.get(nodes.Text) or self._find_handler(nodes.Text)
+        return handler is WikicodeToHtmlComposer.visit_Text
+
+    def _get_revision(self, canonical_title: CanonicalTitle) -> Optional[Hashable]:
+        """Get the revision of an article, at most once per render."""
+        try:
+            return self._revisions[canonical_title]
+        except KeyError:
+            revision = self._revisions[canonical_title] = self._resolver.get_revision(
+                canonical_title.full_title
+            )
+            return revision
+
+    def _get_tag_name(self, tag: wikicode.Wikicode) -> Optional[str]:
+        """
+        Get the normalized name of a tag without rendering it, if possible.
+
+        The name of a tag is almost always plain text, which (unless a custom
+        handler is used for text) renders to the escaped text.
+        """
+        tag_nodes = tag.nodes
+        if len(tag_nodes) != 1:
+            return None
+
+        tag_node = tag_nodes[0]
+        if (
+            type(tag_node) is nodes.Text
+            and self._handlers.get(nodes.Text) is WikicodeToHtmlComposer.visit_Text
+            and "\n" not in tag_node.value
+        ):
+            return _normalize_tag_name(tag_node.value)
+
+        return None
+
+    def _get_link_tag(self, canonical_title: CanonicalTitle, exists: bool) -> str:
+        """
+        Generate the opening tag of a link to an article, or to the article's
+        edit page if it does not exist.
+        """
+        if exists:
+            url = self._resolver.get_article_url(canonical_title)
+            return f'<a href="{url}" title="{canonical_title.title}">'
 
-    def _get_edit_link(self, canonical_title: CanonicalTitle, text: str) -> str:
-        """Generate a link to an article's edit page."""
         url = self._resolver.get_edit_url(canonical_title)
         title = canonical_title.full_title + " (page does not exist)"
-        return f'<a href="{url}" class="new" title="{title}">' + text + "</a>"
+        return f'<a href="{url}" class="new" title="{title}">'
+
+    def _get_edit_link(self, canonical_title: CanonicalTitle, text: str) -> str:
+        """Generate a link to an article's edit page."""
+        return self._get_link_tag(canonical_title, False) + text + "</a>"
 
     def visit_Wikicode(
         self,
         node: wikicode.Wikicode,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
-        return "".join(
-            map(
-                lambda n: self.visit(n, in_root, ignore_whitespace),
-                self._fix_nodes(node.nodes),
+    ) -> Visits:
+        # The Wikicode of templates might be compiled into a plan.
+        render_plans = self._resolver.render_plans
+        if render_plans is not None and self._open_templates:
+            plan = render_plans.get(node)
+            if plan is None:
+                fixed_nodes = list(self._fix_nodes(node.nodes))
+                plan = RenderPlan(
+                    [child for child, _ in fixed_nodes],
+                    [trail for _, trail in fixed_nodes],
+                )
+                render_plans.add(node, plan)
+
+            yield from self._visit_plan(plan, out, in_root, ignore_whitespace)
+            return
+
+        default_text = self._has_default_text_handler()
+        for child, trail in self._fix_nodes(node.nodes):
+            if child is _CELL_SEPARATOR and default_text:
+                out.append("\n")
+                continue
+            self._link_trail = trail
+            yield child, out, in_root, ignore_whitespace
+
+    def _visit_plan(
+        self,
+        plan: RenderPlan,
+        out: OutputBuffer,
+        in_root: bool,
+        ignore_whitespace: bool,
+    ) -> Visits:
+        """Render the nodes of a plan, re-using the output of static nodes."""
+        config_key = self._get_config_key()
+        default_text = self._has_default_text_handler()
+
+        for child, trail, outputs in zip(plan.nodes, plan.trails, plan.outputs):
+            if child is _CELL_SEPARATOR and default_text:
+                out.append("\n")
+                continue
+            self._link_trail = trail
+
+            # Dynamic nodes are always rendered.
+            if outputs is None:
+                yield child, out, in_root, ignore_whitespace
+                continue
+
+            # Otherwise, the output only depends on the state of the composer.
+            state = (
+                in_root,
+                ignore_whitespace,
+                self._stack.snapshot(),
+                tuple(self._stack.pending),
+                config_key,
             )
-        )
+            try:
+                html_result, stack, pending_lists, dependencies = outputs[state]
+            except KeyError:
+                # Record the articles the node linked to or checked the
+                # existence of.
+                parent_dependencies = self._dependencies
+                self._dependencies = Dependencies()
+                node_out = []  # type: OutputBuffer
+                yield child, node_out, in_root, ignore_whitespace
+                html_result = "".join(node_out)
+                dependencies = self._dependencies
+                self._dependencies = parent_dependencies
+                if dependencies.linked or dependencies.checked:
+                    parent_dependencies.update(dependencies)
+                else:
+                    dependencies = None
+
+                if len(outputs) < MAX_RECORDED_STATES:
+                    outputs[state] = (
+                        html_result,
+                        self._stack.snapshot(),
+                        tuple(self._stack.pending),
+                        dependencies,
+                    )
+            else:
+                self._stack.restore(stack, pending_lists)
+                if dependencies is not None:
+                    self._dependencies.update(dependencies)
+
+            out.append(html_result)
 
     def visit_Tag(
         self,
         node: nodes.Tag,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
-        result = ""
+    ) -> Optional[Visits]:
+        wiki_markup = node.wiki_markup
 
         # List tags require a parent tag to be opened first, but get grouped
-        # together if one is already open.
-        if node.wiki_markup in MARKUP_TO_LIST:
-            list_tag, item_tag = MARKUP_TO_LIST[node.wiki_markup]
-            # Mark that this tag needs to be opened.
-            self._pending_lists.extend((list_tag, item_tag))
+        # together if one is already open. They're opened once the contents of
+        # the list item are found, see _maybe_open_tag().
+        #
+        # Each list item consists of a (self-closing) tag for each level of the
+        # list, the markup is handled directly since this is very common.
+        if wiki_markup in MARKUP_TO_LIST:
+            stack = self._stack
+            # Mark that the list and list item need to be opened.
+            stack.add_pending(MARKUP_TO_LIST[wiki_markup])
 
             # ul and ol cannot be inside of a dl and a dl cannot be in a ul or
             # ol.
-            if node.wiki_markup in ("*", "#"):
-                if "dl" in self._stack:
-                    result += self._close_stack("dl")
+            if wiki_markup in ("*", "#"):
+                if "dl" in stack:
+                    self._close_stack("dl", out)
             else:
-                if "ol" in self._stack:
-                    result += self._close_stack("ol")
-                if "ul" in self._stack:
-                    result += self._close_stack("ul")
+                if "ol" in stack:
+                    self._close_stack("ol", out)
+                if "ul" in stack:
+                    self._close_stack("ul", out)
+            return None
 
-        else:
-            tag = self.visit(node.tag).lower()
-
-            # nowiki tags do not end up in the resulting content, their contents
-            # should appears as if this tag does not exist.
-            if tag == "nowiki":
-                if node.contents:
-                    return self.visit(node.contents, in_root)
-                return ""
-
-            # noinclude and includeonly tags do not end up in the resulting
-            # content. Whether or not their contents should appear depends on
-            # whether we are currently being being transcluded.
-            #
-            # See https://www.mediawiki.org/wiki/Transclusion
-            if tag == "noinclude":
-                if not self._open_templates and node.contents:
-                    return self.visit(node.contents)
-                return ""
-            if tag == "includeonly":
-                if self._open_templates and node.contents:
-                    return self.visit(node.contents)
-                return ""
-
-            # Maybe wrap the tag in a paragraph. This applies to inline tags,
-            # such as bold and italics, and line breaks.
-            if tag not in _NO_P_TAGS:
-                result += self._maybe_open_tag(in_root)
-
-            # If we're opening a table header or data element, ensure that a row
-            # is already open.
-            if node.wiki_markup in TABLE_CELLS:
-                # Open a new row if not currently in a row.
-                try:
-                    self._stack.index("tr", self._get_last_table())
-                except ValueError:
-                    self._stack.append("tr")
-                    result += "<tr>\n"
-
-            # Because we sometimes open a new row without the contents directly
-            # tied to it (see above), we need to ensure that old rows are closed
-            # before opening a new one.
-            elif node.wiki_markup in TABLE_ROWS:
-                # If a row is currently open, close it.
-                try:
-                    self._stack.index("tr", self._get_last_table())
-                    result += self._close_stack("tr") + "\n"
-                except ValueError:
-                    pass
+        return self._visit_tag(node, out, in_root, ignore_whitespace)
 
-            # Certain tags are blacklisted from being parsed and get escaped instead.
-            valid_tag = tag not in {"a"}
-
-            # Create an HTML tag.
-            stack_open = "<" + tag
-            for attr in node.attributes:
-                # Extensions attributes should not be expanded. Replace the
-                # value with a Text node (instead of Wikicode).
-                #
-                # TODO It would be better to handle this in visit_Attribute, but
-                # that doens't have enough context to do so currently.
-                if tag == "pre":
-                    attr = extras.Attribute(
-                        name=attr.name,
-                        value=nodes.Text(value=str(attr.value)),
-                        quotes=attr.quotes,
-                        pad_first=attr.pad_first,
-                        pad_before_eq=attr.pad_before_eq,
-                        pad_after_eq=attr.pad_after_eq,
-                    )
+    def _visit_tag(
+        self,
+        node: nodes.Tag,
+        out: OutputBuffer,
+        in_root: bool,
+        ignore_whitespace: bool,
+    ) -> Visits:
+        """Render an HTML tag (or table markup) and its contents."""
+        wiki_markup = node.wiki_markup
+        self_closing = node.self_closing
+        contents = node.contents
+
+        tag = self._get_tag_name(node.tag)
+        if tag is None:
+            tag_out = []  # type: OutputBuffer
+            yield node.tag, tag_out, False, False
+            tag = self._join_value(tag_out).lower()
+
+        # nowiki tags do not end up in the resulting content, their contents
+        # should appears as if this tag does not exist.
+        if tag == "nowiki":
+            if not _is_empty(node.contents):
+                yield node.contents, out, in_root, False
+            return
+
+        # noinclude and includeonly tags do not end up in the resulting
+        # content. Whether or not their contents should appear depends on
+        # whether we are currently being being transcluded.
+        #
+        # See https://www.mediawiki.org/wiki/Transclusion
+        if tag == "noinclude":
+            if not self._open_templates and not _is_empty(node.contents):
+                yield node.contents, out, False, False
+            return
+        if tag == "includeonly":
+            if self._open_templates and not _is_empty(node.contents):
+                yield node.contents, out, False, False
+            return
+
+        # Maybe wrap the tag in a paragraph. This applies to inline tags,
+        # such as bold and italics, and line breaks.
+        if tag not in _NO_P_TAGS:
+            self._maybe_open_tag(in_root, out)
+
+        # If we're opening a table header or data element, ensure that a row
+        # is already open.
+        if wiki_markup in TABLE_CELLS:
+            # Open a new row if not currently in a row.
+            if self._stack.last_index("tr") < self._get_last_table():
+                self._stack.push("tr")
+                out.append("<tr>\n")
+
+        # Because we sometimes open a new row without the contents directly
+        # tied to it (see above), we need to ensure that old rows are closed
+        # before opening a new one.
+        elif wiki_markup in TABLE_ROWS:
+            # If a row is currently open, close it.
+            if self._stack.last_index("tr") > self._get_last_table():
+                self._close_stack("tr", out)
+                out.append("\n")
+
+        # Certain tags are blacklisted from being parsed and get escaped instead.
+        valid_tag = tag not in INVALID_TAGS
+
+        # Create an HTML tag. Invalid tags are generated separately so that
+        # they can be escaped.
+        stack_open = out if valid_tag else []
+        stack_open.append("<" + tag)
+        for attr in node.attributes:
+            # Extensions attributes should not be expanded. Replace the
+            # value with a Text node (instead of Wikicode).
+            #
+            # TODO It would be better to handle this in visit_Attribute, but
+            # that doens't have enough context to do so currently.
+            if tag == "pre":
+                attr = extras.Attribute(
+                    name=attr.name,
+                    value=nodes.Text(value=str(attr.value)),
+                    quotes=attr.quotes,
+                    pad_first=attr.pad_first,
+                    pad_before_eq=attr.pad_before_eq,
+                    pad_after_eq=attr.pad_after_eq,
+                )
 
-                stack_open += self.visit(attr)
-            if node.self_closing:
-                stack_open += " /"
-            stack_open += ">"
-            if not valid_tag:
-                stack_open = html.escape(stack_open)
-            result += stack_open
+            yield attr, stack_open, False, False
+        if self_closing:
+            stack_open.append(" /")
+        stack_open.append(">")
+        if not valid_tag:
+            out.append(html.escape("".join(stack_open)))
 
-            # The documentation says padding is BEFORE the final >, but for
-            # table nodes it seems to be the padding after it
-            if node.wiki_markup in {"{|"} | TABLE_ROWS:
-                result += node.padding
+        # The documentation says padding is BEFORE the final >, but for
+        # table nodes it seems to be the padding after it
+        if wiki_markup in PADDED_MARKUP:
+            out.append(node.padding)
 
-            # If this is not a self-closing tag, add it to the stack.
-            if not node.self_closing:
-                self._stack.append(tag)
+        # If this is not a self-closing tag, add it to the stack.
+        if not self_closing:
+            self._stack.push(tag)
 
         # Handle anything inside of the tag.
-        if node.contents:
+        if not _is_empty(contents):
             # Ignore whitespace if it is already being ignored or this is a
             # <pre> tag.
             ignore_whitespace = ignore_whitespace or tag == "pre"
-            result += self.visit(node.contents, ignore_whitespace=ignore_whitespace)
+            yield contents, out, False, ignore_whitespace
 
         # If this is not self-closing, close this tag and any other open tags
         # after it.
-        # TODO This only happens to work because lists are not self-closing.
-        if not node.self_closing:
-            stack_end = self._close_stack(tag)
-            if not valid_tag:
-                stack_end = html.escape(stack_end)
-            result += stack_end
-
-        return result
+        if not self_closing:
+            if valid_tag:
+                self._close_stack(tag, out)
+            else:
+                stack_end = []  # type: OutputBuffer
+                self._close_stack(tag, stack_end)
+                out.append(html.escape("".join(stack_end)))
 
     def visit_Attribute(
         self,
         node: extras.Attribute,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> Visits:
         # Render the name of the attribute.
-        name = self.visit(node.name).lower()
+        name_out = []  # type: OutputBuffer
+        yield node.name, name_out, False, False
+        name = self._join_value(name_out).lower()
 
         if node.value is not None:
             # Render the value, and then sanitize it a bit:
             # * Remove white space prefix / suffix.
             # * Replace new lines with spaces.
             # * Undo the HTML entity conversion for ampersands.
-            value = self.visit(node.value)
+            value_out = []  # type: OutputBuffer
+            yield node.value, value_out, False, False
+            value = self._join_value(value_out)
             value = value.strip().replace("\n", " ").replace("&amp;", "&")
 
         else:
@@ -482,62 +1059,65 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
             if name and name[-1] == "/":
                 name = name[:-1]
 
-        # Return the attribute.
-        return f'{node.pad_first}{name}="{value}"'
+        # Output the attribute.
+        out.append(f'{node.pad_first}{name}="{value}"')
 
     def visit_Heading(
         self,
         node: nodes.Heading,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
-        return f"<h{node.level}>" + self.visit(node.title) + f"</h{node.level}>"
+    ) -> Visits:
+        out.append(f"<h{node.level}>")
+        yield node.title, out, False, False
+        out.append(f"</h{node.level}>")
 
     def visit_Wikilink(
         self,
-        node: Wikilink,
+        node: nodes.Wikilink,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
-        result = self._maybe_open_tag(in_root)
+    ) -> Visits:
+        # The link trail is found when the nodes are fixed, but might also be
+        # part of the node.
+        trail = self._link_trail or getattr(node, "trail", None)
+        self._link_trail = None
+
+        self._maybe_open_tag(in_root, out)
 
         # Get the rendered title.
-        title = self.visit(node.title)
+        title_out = []  # type: OutputBuffer
+        yield node.title, title_out, False, False
+        title = self._join_value(title_out)
         canonical_title = self._resolver.resolve_article(title, default_namespace="")
-        url = self._resolver.get_article_url(canonical_title)
+        self._dependencies.linked.add(canonical_title)
         # The text is either what was provided or the non-canonicalized title.
         if node.text:
-            text = self.visit(node.text)
+            text_out = []  # type: OutputBuffer
+            yield node.text, text_out, False, False
+            text = "".join(text_out)
         else:
             text = title
-        text += node.trail or ""
+        text += trail or ""
 
-        # Figure out whether the article exists or not.
-        article_exists = True
-        if self._red_links:
-            try:
-                self._resolver.get_article(title, default_namespace="")
-            except ArticleNotFound:
-                article_exists = False
-
-        # Display text can be optionally specified. Fall back to the article
-        # title if it is not given.
-        if article_exists:
-            return (
-                result
-                + f'<a href="{url}" title="{canonical_title.title}">'
-                + text
-                + "</a>"
-            )
+        # If links to articles which do not exist are rendered differently, it
+        # is not yet known which tag to use (see _replace_link_holders).
+        if self._link_holders is not None:
+            out.append(self._link_holders.add(canonical_title))
         else:
-            return result + self._get_edit_link(canonical_title, text)
+            out.append(self._get_link_tag(canonical_title, True))
+        out.append(text)
+        out.append("</a>")
 
     def visit_ExternalLink(
         self,
         node: nodes.ExternalLink,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> Visits:
         """
         Generate the HTML for an external link.
 
@@ -547,42 +1127,39 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         * A bracketed link: [https://en.wikipedia.org/]
         * A link with a title: [https://en.wikipedia.org/ Wikipedia]
         """
-        result = self._maybe_open_tag(in_root)
+        self._maybe_open_tag(in_root, out)
 
         # Display text can be optionally specified. Fall back to the URL if it
         # is not given.
-        text = self.visit(node.title or node.url)
+        text_out = []  # type: OutputBuffer
+        yield node.title or node.url, text_out, False, False
+        text = "".join(text_out)
 
-        extra = ""
-        if not node.brackets:
-            extra = 'rel="nofollow" class="external free" '
-
-        return (
-            result
-            + "<a "
-            + extra
-            + 'href="'
-            + self.visit(node.url)
-            + '">'
-            + text
-            + "</a>"
-        )
+        if node.brackets:
+            out.append('<a href="')
+        else:
+            out.append('<a rel="nofollow" class="external free" href="')
+        yield node.url, out, False, False
+        out.append('">')
+        out.append(text)
+        out.append("</a>")
 
     def visit_Comment(
         self,
         node: nodes.Comment,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> None:
         """HTML comments just get ignored."""
-        return ""
 
     def visit_Text(
         self,
         node: nodes.Text,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> None:
         """
         Handle a text element, including HTML escaping contents.
 
@@ -595,121 +1172,154 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         text_result: str = html.escape(node.value, quote=False)
 
         # Certain tags avoid any special whitespace handling, e.g. <pre> tags
-        # and template keys. Just return the contents after escaping HTML
+        # and template keys. Just output the contents after escaping HTML
         # entities.
         if ignore_whitespace:
-            return text_result
-
-        result = ""
+            out.append(text_result)
+            return
 
-        # Each line of content is handled separately.
-        lines = list(
-            filter(None, text_result.splitlines(keepends=True))
-        )  # type: List[str]
+        # The text is scanned for sections of normal text and preformatted
+        # text. Preformatted text is any lines starting with a space and some
+        # text content. Lines which are purely whitespace are part of whatever
+        # the current section is.
+        #
+        # The first line can only be preformatted if:
+        # * It is in the root Wikicode object.
+        # * The stack is empty.
+        # * There are not any pending lists.
+        first_line_pre = in_root and not self._stack and not self._stack.pending
+        # Checking which pattern can be used is only worth it for long text.
+        if len(text_result) < 1024 or any(
+            boundary in text_result for boundary in OTHER_LINE_BOUNDARIES
+        ):
+            space_line_pattern = SPACE_LINE_PATTERN
+        else:
+            space_line_pattern = NEW_LINE_SPACE_PATTERN
 
-        # This needs to be a new-line and start with a space.
+        # The start of the current section of normal text.
         start = 0
-        in_section_pre = False
-        for it, line in enumerate(lines):
-            # The first line can only be preformatted if:
-            # * It is in the root Wikicode object.
-            # * The stack is empty.
-            # * There are not any pending lists.
-            if it == 0 and (not in_root or self._stack or self._pending_lists):
-                continue
-
-            # If the line is purely whitespace (+ a new-line) then it is part
-            # of whatever the current section is.
-            if len(line) > 1 and not line.strip():
-                continue
-
-            # Calculate when text changes to/from normal text to preformatted
-            # text.
-            #
-            # The first clause describes what is necessary for preformatted
-            # text, a line starting with a space, some text content (followed by
-            # a new-line).
-            #
-            # Note that lines that are purely whitespace are caught above.
-            if (len(line) > 2 and line[0] == " ") != in_section_pre:
-                # If this is the start of a new section, add the previous one.
-                if in_section_pre:
-                    # The first space at the start of each line gets removed.
-                    result += (
-                        "<pre>"
-                        + "".join(map(lambda l: l[1:], lines[start:it]))
-                        + "</pre>"
-                    )
-                else:
-                    result += self._handle_text("".join(lines[start:it]), in_root)
-
-                start = it
-                in_section_pre = not in_section_pre
-
-        # Need to handle the final section.
-        if in_section_pre:
-            # The first space at the start of each line gets removed.
-            result += (
-                "<pre>" + "".join(map(lambda l: l[1:], lines[start:])) + "</pre>\n"
-            )
-        else:
-            result += self._handle_text("".join(lines[start:]), in_root)
+        end = len(text_result)
+        while True:
+            # Find the next line which starts preformatted text.
+            if start == 0 and first_line_pre and text_result.startswith(" "):
+                pre_start = 0
+            else:
+                pre_start = -1
+            search_start = start
+            while True:
+                if pre_start == -1:
+                    match = space_line_pattern.search(text_result, search_start)
+                    if match is None:
+                        break
+                    pre_start = match.start() + 1
+
+                pre_end = _line_end(text_result, pre_start)
+                if (
+                    pre_end - pre_start > 2
+                    and not text_result[pre_start:pre_end].isspace()
+                ):
+                    break
+                # The search must include the end of this line.
+                search_start = pre_end - 1
+                pre_start = -1
+
+            if pre_start == -1:
+                # Need to handle the final section.
+                self._handle_text(text_result, in_root, out, start, end)
+                return
+
+            # Add the normal text before the preformatted text.
+            self._handle_text(text_result, in_root, out, start, pre_start)
+
+            # Find the end of the preformatted text, the first space at the
+            # start of each line gets removed.
+            out.append("<pre>")
+            start = pre_start
+            while start < end:
+                line_end = _line_end(text_result, start)
+                line_length = line_end - start
+                if line_length > 2 and text_result[start] == " ":
+                    pass
+                elif line_length <= 1 or not text_result[start:line_end].isspace():
+                    break
+                out.append(text_result[start + 1 : line_end])
+                start = line_end
 
-        return result
+            if start == end:
+                out.append("</pre>\n")
+                return
+            out.append("</pre>")
 
-    def _handle_text(self, text_result: str, in_root: bool) -> str:
-        """The raw text node handler, this has the logic for opening paragraphs."""
-        result = ""
+    def _handle_text(
+        self, text_result: str, in_root: bool, out: OutputBuffer, start: int, end: int
+    ) -> None:
+        """
+        The raw text node handler, this has the logic for opening paragraphs.
 
+        :param text_result: The (escaped) text.
+        :param start: The start of the text to handle.
+        :param end: The end of the text to handle.
+        """
         # Handle newlines, which modify paragraphs and how elements get closed.
-        # Filter out blank strings after splitting on newlines.
-        chunks = list(filter(None, LINE_BREAK_PATTERN.split(text_result)))
-
-        for it, chunk in enumerate(chunks):
+        stack = self._stack
+        first_chunk = True
+        for match in LINE_BREAK_PATTERN.finditer(text_result, start, end):
             # Each chunk will either be all newlines, or just content.
-            if "\n" in chunk:
-                # Lines which only consist of whitespace get normalized to empty.
-                line_breaks = len(chunk.replace(" ", ""))
-
-                if it > 0 or line_breaks == 1 or line_breaks == 2:
-                    result += "\n"
-
-                # If more than two newlines exist, close previous paragraphs.
-                if line_breaks >= 2:
-                    result += self._close_stack("p")
-
-                # If this node isn't nested inside of anything else it might be
-                # wrapped in a paragraph.
-                if not self._stack and in_root:
-                    # A paragraph with a line break is added for every two
-                    # additional newlines.
-                    additional_p = max((line_breaks - 2) // 2, 0)
-                    result += additional_p * "<p><br />\n</p>"
-
-                    # If there is more content after this set of newlines, or
-                    # this is the last chunk of content and there are 3 line
-                    # breaks.
-                    last_chunk = it == len(chunks) - 1
-                    if not last_chunk or (last_chunk and line_breaks == 3):
-                        result += "<p>"
-                        self._stack.append("p")
-
-                        # An odd number of newlines get a line break inside of
-                        # the paragraph.
-                        if line_breaks > 1 and line_breaks % 2 == 1:
-                            result += "<br />\n"
+            match_start, match_end = match.span()
+            if match_start > start:
+                # Only a list or paragraph might need to be opened.
+                if in_root and (stack.pending or not stack):
+                    self._maybe_open_tag(in_root, out)
+                out.append(text_result[start:match_start])
+                first_chunk = False
+            start = match_end
+
+            # Lines which only consist of whitespace get normalized to empty.
+            if match_end - match_start == 1:
+                line_breaks = 1
             else:
-                result += self._maybe_open_tag(in_root)
-                result += chunk
-
-        return result
+                line_breaks = text_result.count("\n", match_start, match_end)
+
+            if not first_chunk or line_breaks == 1 or line_breaks == 2:
+                out.append("\n")
+            first_chunk = False
+
+            # If more than two newlines exist, close previous paragraphs.
+            if line_breaks >= 2:
+                self._close_stack("p", out)
+
+            # If this node isn't nested inside of anything else it might be
+            # wrapped in a paragraph.
+            if not stack and in_root:
+                # A paragraph with a line break is added for every two
+                # additional newlines.
+                if line_breaks >= 4:
+                    out.append((line_breaks - 2) // 2 * "<p><br />\n</p>")
+
+                # If there is more content after this set of newlines, or
+                # this is the last chunk of content and there are 3 line
+                # breaks.
+                if start != end or line_breaks == 3:
+                    out.append("<p>")
+                    stack.push("p")
+
+                    # An odd number of newlines get a line break inside of
+                    # the paragraph.
+                    if line_breaks > 1 and line_breaks % 2 == 1:
+                        out.append("<br />\n")
+
+        if start < end:
+            if in_root and (stack.pending or not stack):
+                self._maybe_open_tag(in_root, out)
+            out.append(text_result[start:end])
 
     def visit_Template(
         self,
         node: nodes.Template,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> Visits:
         """
         Handle a transclusion. This can be one of several things (in order):
 
@@ -721,16 +1331,22 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         """
         # Render the key into a string. This handles weird nested cases, e.g.
         # {{f{{text|oo}}bar}}.
-        template_name = self.visit(node.name).strip()
+        name_out = []  # type: OutputBuffer
+        yield node.name, name_out, False, False
+        template_name = self._join_value(name_out).strip()
 
         # Because each parameter's name and value might include other templates,
         # etc. these need to be rendered in the context of the template call.
-        context = []  # type: List[Tuple[str, str, bool]]
+        context = []  # type: Context
         for param in node.params:
             # See https://meta.wikimedia.org/wiki/Help:Template#Parameters
             # for information about stripping whitespace around parameters.
-            param_name = self.visit(param.name, ignore_whitespace=True).strip()
-            param_value = self.visit(param.value)
+            param_name_out = []  # type: OutputBuffer
+            yield param.name, param_name_out, False, True
+            param_name = self._join_value(param_name_out).strip()
+            param_value_out = []  # type: OutputBuffer
+            yield param.value, param_value_out, False, False
+            param_value = "".join(param_value_out)
 
             # Only named parameters strip whitespace around the value.
             if param.showkey:
@@ -745,7 +1361,8 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         if start.strip() in ("subst", "safesubst"):
             template_name = more
             if self._expand_templates:
-                return str(node)
+                out.append(str(node))
+                return
 
         # Check if a variable is being used.
         #
@@ -755,7 +1372,10 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         except MagicWordNotFound:
             pass
         else:
-            return self._maybe_open_tag(in_root) + function()
+            self._volatile = True
+            self._maybe_open_tag(in_root, out)
+            out.append(function())
+            return
 
         # if the name starts with a # it is a parser function.
         if template_name and template_name[0] == "#":
@@ -765,13 +1385,26 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
             except ParserFunctionNotFound:
                 # If the parser function isn't found for whatever reason the
                 # raw text gets used.
-                return str(node)
+                out.append(str(node))
             else:
                 # Call the function with the current template call (and any
                 # parent template call information).
-                return self._maybe_open_tag(in_root) + parser_function(
-                    param, context, self._context
-                )
+                self._volatile = True
+                self._maybe_open_tag(in_root, out)
+                parent_context = self._context
+                # The values might be modified by the function, replace the
+                # placeholders of any links in them first.
+                if self._link_holders is not None:
+                    replace = self._replace_link_holders
+                    context = [
+                        (name, replace(value), showkey)
+                        for name, value, showkey in context
+                    ]
+                    parent_context = {
+                        name: replace(value) for name, value in parent_context.items()
+                    }
+                out.append(parser_function(param, context, parent_context))
+            return
 
         # Otherwise, this is a normal template.
 
@@ -779,64 +1412,185 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
         # TODO This should check the canonical template name.
         if template_name in self._open_templates:
             raise TemplateLoop(template_name)
+
+        template_in_root = in_root and self._expand_templates
+
+        canonical_title = self._resolver.resolve_article(template_name, "Template")
+
+        # Check if this template call was previously expanded.
+        cache_key = None
+        if self._render_cache is not None or self._resolver.template_cache is not None:
+            cache_key = self._get_cache_key(canonical_title, context, template_in_root)
+            expansion = self._get_cached_expansion(cache_key)
+            if expansion is not None:
+                out.append(expansion.html)
+                self._transcluded |= expansion.transcluded
+                if expansion.dependencies is not None:
+                    self._dependencies.update(expansion.dependencies)
+                return
+
         self._open_templates.add(template_name)
 
+        # The revision is found before the article, so that a change in between
+        # is noticed later.
+        revision = self._get_revision(canonical_title)
         try:
             template = self._resolver.get_article(template_name, "Template")
-        except ArticleNotFound as e:
+        except ArticleNotFound:
             # Template was not found.
-            result = self._maybe_open_tag(in_root)
+            self._dependencies.transcluded[canonical_title] = None
+            self._maybe_open_tag(in_root, out)
+
+            # Remove it from the open templates.
+            self._open_templates.remove(template_name)
 
             # When transcluding a non-template
             if self._red_links:
                 # Render an edit link.
-                canonical_title = e.args[0]
-
-                # Remove it from the open templates.
-                self._open_templates.remove(template_name)
-
-                return result + self._get_edit_link(canonical_title, template_name)
+                out.append(self._get_edit_link(canonical_title, template_name))
             else:
-                # Remove it from the open templates.
-                self._open_templates.remove(template_name)
-
                 # Otherwise, simply output the template call.
-                return result + self._maybe_open_tag(in_root) + str(node)
+                out.append(str(node))
         else:
+            render_start = time.perf_counter()
+
             # Render the template in only the context of its parameters. Note
             # that parameters might shadow each other, but that's OK.
-            template_context = {c[0]: c[1] for c in context}
-
-            composer = WikicodeToHtmlComposer(
-                resolver=self._resolver,
-                red_links=self._red_links,
-                expand_templates=self._expand_templates,
-                context=template_context,
-                open_templates=self._open_templates,
+            self._push_frame({c[0]: c[1] for c in context})
+            try:
+                # If the result will be cached it must be rendered separately.
+                template_out = out if cache_key is None else []
+                yield template, template_out, template_in_root, False
+                # Ensure the stack is closed at the end.
+                self._close_all(template_out)
+            finally:
+                volatile, transcluded, dependencies = self._pop_frame()
+
+                # Remove it from the open templates.
+                self._open_templates.remove(template_name)
+
+            transcluded.add(template_name)
+            self._transcluded |= transcluded
+            self._volatile |= volatile
+            dependencies.transcluded[canonical_title] = revision
+            self._dependencies.update(dependencies)
+
+            if cache_key is not None:
+                template_html = "".join(template_out)
+                out.append(template_html)
+
+                if not volatile:
+                    self._set_cached_expansion(
+                        cache_key,
+                        TemplateExpansion(
+                            template_html, frozenset(transcluded), dependencies
+                        ),
+                        time.perf_counter() - render_start,
+                    )
+
+    def _push_frame(self, context: ParentContext) -> None:
+        """Start rendering a template, saving the state of the current article."""
+        self._frames.append(
+            _Frame(
+                self._context,
+                self._stack,
+                self._volatile,
+                self._transcluded,
+                self._dependencies,
             )
-            result = composer.visit(template, in_root and self._expand_templates)
-            # Ensure the stack is closed at the end.
-            result += composer.close_all()
+        )
 
-            # Remove it from the open templates.
-            self._open_templates.remove(template_name)
+        self._context = context
+        self._stack = TagStack()
+        self._volatile = False
+        self._transcluded = set()
+        self._dependencies = Dependencies()
+
+    def _pop_frame(self) -> Tuple[bool, Set[str], Dependencies]:
+        """
+        Finish rendering a template, restoring the state of the parent article.
+
+        :return: Whether the template was volatile, the templates it
+            transcluded and the articles it depended on.
+        """
+        result = (self._volatile, self._transcluded, self._dependencies)
+
+        frame = self._frames.pop()
+        self._context = frame.context
+        self._stack = frame.stack
+        self._volatile = frame.volatile
+        self._transcluded = frame.transcluded
+        self._dependencies = frame.dependencies
 
-            return result
+        return result
+
+    def _get_config_key(self) -> Hashable:
+        """The configuration of the composer which affects the generated HTML."""
+        if self._config_key is None:
+            self._config_key = (
+                type(self),
+                self._red_links,
+                self._expand_templates,
+                frozenset(self._registered_handlers.items()),
+            )
+        return self._config_key
+
+    def _get_cache_key(
+        self, canonical_title: CanonicalTitle, context: Context, in_root: bool
+    ) -> Hashable:
+        """Generate the key to cache the expansion of a template call with."""
+        return (
+            canonical_title.interwiki,
+            canonical_title.namespace,
+            canonical_title.title,
+            tuple(context),
+            in_root,
+            self._get_config_key(),
+        )
+
+    def _get_cached_expansion(self, cache_key: Hashable) -> Optional[TemplateExpansion]:
+        """Find a cached template expansion."""
+        expansion = None
+        if self._render_cache is not None:
+            expansion = self._render_cache.get(cache_key)
+        if expansion is None and self._resolver.template_cache is not None:
+            expansion = self._resolver.template_cache.get(cache_key)
+            if expansion is not None and self._render_cache is not None:
+                self._render_cache[cache_key] = expansion
+
+        # The expansion cannot be used if it would have caused a template loop,
+        # the template is rendered again in order to raise the error.
+        if expansion is not None and expansion.transcluded & self._open_templates:
+            return None
+
+        return expansion
+
+    def _set_cached_expansion(
+        self, cache_key: Hashable, expansion: TemplateExpansion, cost: float
+    ) -> None:
+        """Cache a template expansion."""
+        if self._render_cache is not None:
+            self._render_cache[cache_key] = expansion
+        if self._resolver.template_cache is not None:
+            self._resolver.template_cache.put(cache_key, expansion, cost)
 
     def visit_Argument(
         self,
         node: nodes.Argument,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> Visits:
         # There's no provided values, so just render the string.
         # Templates have special handling for Arguments.
-        param_name = self.visit(node.name).strip()
+        name_out = []  # type: OutputBuffer
+        yield node.name, name_out, False, False
+        param_name = self._join_value(name_out).strip()
 
         # Get the parameter's value from the context (the call to the
         # template we're rendering).
         try:
-            return self._context[param_name]
+            out.append(self._context[param_name])
         except KeyError:
             # No parameter with this name was given.
 
@@ -844,36 +1598,146 @@ class WikicodeToHtmlComposer(WikiNodeVisitor):
             # parameter as a string.
             if node.default is not None:
                 # Render the default value.
-                return self.visit(node.default)
+                yield node.default, out, False, False
 
             else:
-                return str(node)
+                out.append(str(node))
 
     def visit_HTMLEntity(
         self,
         node: nodes.HTMLEntity,
+        out: OutputBuffer,
         in_root: bool = False,
         ignore_whitespace: bool = False,
-    ) -> str:
+    ) -> None:
         # Write the original HTML entity.
-        return self._maybe_open_tag(in_root) + str(node)
+        self._maybe_open_tag(in_root, out)
+        out.append(str(node))
+
+    def _iter_chunks(self, node: StringMixIn) -> Iterator[str]:
+        """
+        Convert Wikicode or Node objects to HTML, one top-level node at a time.
+
+        Large nodes (e.g. tables) are split into multiple chunks. Any tags which
+        are still open are closed in a final chunk.
+        """
+        self.reset()
+
+        out = []  # type: OutputBuffer
+        if isinstance(node, wikicode.Wikicode):
+            for child, trail in self._fix_nodes(node.nodes):
+                self._link_trail = trail
+                yield from self._iter_node_chunks(child, out)
+                # Link holders are replaced once per chunk, avoid many small
+                # chunks.
+                if self._link_holders is None or len(out) >= STREAM_BUFFER_LENGTH:
+                    yield "".join(out)
+                    out.clear()
+        else:
+            yield from self._iter_node_chunks(node, out)
+
+        self._close_all(out)
+        yield "".join(out)
+
+    def _iter_node_chunks(self, node: StringMixIn, out: OutputBuffer) -> Iterator[str]:
+        """
+        Handle a top-level node, yielding chunks of the output whenever enough
+        of it is buffered.
+
+        The nodes are visited iteratively (regardless of the iterative option)
+        to be able to stop part way through a node.
+        """
+        try:
+            handler = self._handlers[type(node)]
+        except KeyError:
+            handler = self._find_handler(type(node))
+
+        visits = handler(self, node, out, True, False)
+        if visits is None:
+            return
+
+        for _ in self._iter_visits(visits):
+            if len(out) >= STREAM_BUFFER_LENGTH:
+                yield "".join(out)
+                out.clear()
+
+    def _replace_link_holders(self, html: str) -> str:
+        """Replace the placeholders of links, see :class:`LinkHolders`."""
+        if self._link_holders is None:
+            return html
+        return self._link_holders.replace(
+            html, self._get_link_tag, self._dependencies.checked
+        )
+
+    def _join_value(self, out: OutputBuffer) -> str:
+        """
+        Join rendered HTML which is interpreted or modified (e.g. the name of a
+        template or tag) instead of being output as is.
+
+        Any placeholders of links are replaced first, as they might otherwise be
+        modified.
+        """
+        return self._replace_link_holders("".join(out))
+
+    def _template_loop_error(self, template_name: str) -> str:
+        """Generate the error shown when a template loop is detected."""
+        # TODO Should this create an ExternalLink and use that?
+        canonical_title = self._resolver.resolve_article(template_name, "Template")
+        url = self._resolver.get_article_url(canonical_title)
+        return (
+            '<p><span class="error">Template loop detected: '
+            + '<a href="{url}" title="{template_name}">{template_name}</a>'
+            + "</span>\n</p>"
+        ).format(url=url, template_name=canonical_title.full_title)
 
     def compose(self, node: StringMixIn) -> str:
         """Converts Wikicode or Node objects to HTML."""
+        self.reset()
+
+        out = []  # type: OutputBuffer
         try:
-            return self.visit(node, True) + self.close_all()
+            self.visit(node, out, True)
+            self._close_all(out)
         except TemplateLoop as e:
             # The template name is the first argument.
-            template_name = e.args[0]
-            # TODO Should this create an ExternalLink and use that?
-            canonical_title = self._resolver.resolve_article(template_name, "Template")
-            url = self._resolver.get_article_url(canonical_title)
-            return (
-                '<p><span class="error">Template loop detected: '
-                + '<a href="{url}" title="{template_name}">{template_name}</a>'
-                + "</span>\n</p>"
-            ).format(url=url, template_name=canonical_title.full_title)
+            return self._template_loop_error(e.args[0])
+
+        return self._replace_link_holders("".join(out))
+
+    def compose_iter(self, node: StringMixIn) -> Iterator[str]:
+        """
+        Converts Wikicode or Node objects to HTML, yielding chunks of HTML as
+        each top-level node is finished (or periodically while rendering a
+        large node, e.g. a table with many rows).
+
+        Joining the chunks gives the same result as :meth:`compose`, except
+        when a template loop is detected: the chunks which were already
+        yielded cannot be taken back, so the error is yielded after them.
+        """
+        try:
+            for chunk in self._iter_chunks(node):
+                # Avoid handing empty writes to the consumer.
+                if chunk:
+                    yield self._replace_link_holders(chunk)
+        except TemplateLoop as e:
+            yield self._template_loop_error(e.args[0])
+
+    def compose_to(self, node: StringMixIn, sink: TextIO) -> None:
+        """
+        Converts Wikicode or Node objects to HTML, writing it to a file-like
+        object as it is generated.
+
+        See :meth:`compose_iter` for the caveats.
+        """
+        for chunk in self.compose_iter(node):
+            sink.write(chunk)
+
+    def _close_all(self, out: OutputBuffer) -> None:
+        """Close all items on the stack."""
+        out.extend(f"</{current_tag}>" for current_tag in reversed(self._stack))
 
     def close_all(self) -> str:
         """Close all items on the stack."""
-        return "".join(f"</{current_tag}>" for current_tag in reversed(self._stack))
+        out = []  # type: OutputBuffer
+        self._close_all(out)
+        return "".join(out)
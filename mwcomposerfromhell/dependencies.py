@@ -0,0 +1,210 @@
+from typing import (
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:
+    from mwcomposerfromhell.namespace import ArticleResolver, CanonicalTitle
+
+# The full titles of the articles a page transcluded, checked the existence of
+# and linked to.
+_PageDependencies = Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]
+
+
+class Dependencies:
+    """
+    The articles which a render depended on, see
+    ``WikicodeToHtmlComposer.dependencies``.
+
+    Templates which are transcluded include any templates transcluded by them.
+    The revision of each transcluded article (see
+    ``ArticleResolver.get_revision``) and whether each checked article existed
+    are recorded as they are rendered.
+    """
+
+    __slots__ = ("transcluded", "checked", "linked")
+
+    def __init__(self) -> None:
+        # The templates (or other articles) which were transcluded, including
+        # those which do not exist, and the revision which was rendered.
+        self.transcluded = {}  # type: Dict[CanonicalTitle, Optional[Hashable]]
+        # The articles which were checked for existence (e.g. for red links),
+        # and whether they existed.
+        self.checked = {}  # type: Dict[CanonicalTitle, bool]
+        # The articles which were linked to.
+        self.linked = set()  # type: Set[CanonicalTitle]
+
+    def update(self, other: "Dependencies") -> None:
+        """Add the dependencies of another render."""
+        if other.transcluded:
+            self.transcluded.update(other.transcluded)
+        if other.checked:
+            self.checked.update(other.checked)
+        if other.linked:
+            self.linked |= other.linked
+
+    def full_titles(self) -> Set[str]:
+        """The full titles of all local articles (i.e. not interwiki links)."""
+        return {
+            canonical_title.full_title
+            for titles in (self.transcluded, self.checked, self.linked)
+            for canonical_title in titles
+            if not canonical_title.interwiki
+        }
+
+
+class DependencyIndex:
+    """
+    An index of the articles each page depends on, to find the pages which
+    must be rendered again when articles change.
+
+    Pages and articles are identified by their full titles, e.g.
+    ``Template:Foo``. The revision of each transcluded article which was
+    rendered is recorded with each page which depends on it. For articles
+    whose existence was checked (e.g. for red links) only whether they existed
+    is recorded. Articles which were only linked to do not affect the page, but
+    are kept to find the pages linking to an article.
+    """
+
+    def __init__(self) -> None:
+        # The articles each page transcluded, checked and linked to.
+        self._dependencies = {}  # type: Dict[str, _PageDependencies]
+        # The pages which transcluded each article (and the revision of the
+        # article they were rendered with).
+        self._transcluders = {}  # type: Dict[str, Dict[str, Optional[Hashable]]]
+        # The pages which checked whether each article exists (and whether it
+        # existed when they were rendered).
+        self._checkers = {}  # type: Dict[str, Dict[str, bool]]
+        # The pages which linked to each article.
+        self._linkers = {}  # type: Dict[str, Set[str]]
+
+    def __len__(self) -> int:
+        return len(self._dependencies)
+
+    def __contains__(self, page: object) -> bool:
+        return page in self._dependencies
+
+    def add(self, page: str, dependencies: Dependencies) -> None:
+        """
+        Record the dependencies of a page, replacing any previous ones.
+
+        :param page: The full title of the page.
+        :param dependencies: The dependencies of the render of the page.
+        """
+        self.remove(page)
+
+        transcluded = set()
+        for canonical_title, revision in dependencies.transcluded.items():
+            if not canonical_title.interwiki:
+                title = canonical_title.full_title
+                transcluded.add(title)
+                self._transcluders.setdefault(title, {})[page] = revision
+        checked = set()
+        for canonical_title, exists in dependencies.checked.items():
+            if not canonical_title.interwiki:
+                title = canonical_title.full_title
+                checked.add(title)
+                self._checkers.setdefault(title, {})[page] = exists
+        linked = set()
+        for canonical_title in dependencies.linked:
+            if not canonical_title.interwiki:
+                title = canonical_title.full_title
+                linked.add(title)
+                self._linkers.setdefault(title, set()).add(page)
+
+        self._dependencies[page] = (
+            frozenset(transcluded),
+            frozenset(checked),
+            frozenset(linked),
+        )
+
+    def remove(self, page: str) -> None:
+        """Forget the dependencies of a page."""
+        try:
+            transcluded, checked, linked = self._dependencies.pop(page)
+        except KeyError:
+            return
+
+        for title in transcluded:
+            transcluders = self._transcluders[title]
+            del transcluders[page]
+            if not transcluders:
+                del self._transcluders[title]
+        for title in checked:
+            checkers = self._checkers[title]
+            del checkers[page]
+            if not checkers:
+                del self._checkers[title]
+        for title in linked:
+            linkers = self._linkers[title]
+            linkers.discard(page)
+            if not linkers:
+                del self._linkers[title]
+
+    def dependencies(self, page: str) -> Set[str]:
+        """
+        The full titles of the articles a page depends on, i.e. which it
+        transcluded or checked the existence of.
+        """
+        try:
+            transcluded, checked, _ = self._dependencies[page]
+        except KeyError:
+            return set()
+        return set(transcluded | checked)
+
+    def dependents(self, title: str) -> Set[str]:
+        """The pages which depend on an article (or on whether it exists)."""
+        return set(self._transcluders.get(title, ())) | set(
+            self._checkers.get(title, ())
+        )
+
+    def linked_from(self, title: str) -> Set[str]:
+        """The pages which link to an article."""
+        return set(self._linkers.get(title, ()))
+
+    def affected(self, titles: Iterable[str], existence: bool = False) -> Set[str]:
+        """
+        The pages which depend on any of the articles.
+
+        :param titles: The full titles of the articles which changed.
+        :param existence: Whether the articles were created or removed, in which
+            case the pages which checked whether they exist are included.
+        """
+        pages = set()  # type: Set[str]
+        for title in titles:
+            pages.update(self._transcluders.get(title, ()))
+            if existence:
+                pages.update(self._checkers.get(title, ()))
+        return pages
+
+    def stale(self, resolver: "ArticleResolver") -> Set[str]:
+        """
+        The pages which transcluded articles which changed (or were created or
+        removed), or which checked the existence of articles which were created
+        or removed, since the pages were rendered.
+        """
+        pages = set()  # type: Set[str]
+        revisions = {}  # type: Dict[str, Optional[Hashable]]
+        for title, transcluders in self._transcluders.items():
+            revision = revisions[title] = resolver.get_revision(title)
+            pages.update(
+                page
+                for page, page_revision in transcluders.items()
+                if page_revision != revision
+            )
+        for title, checkers in self._checkers.items():
+            try:
+                revision = revisions[title]
+            except KeyError:
+                revision = resolver.get_revision(title)
+            exists = revision is not None
+            pages.update(
+                page for page, page_exists in checkers.items() if page_exists != exists
+            )
+        return pages
@@ -0,0 +1,244 @@
+import abc
+import hashlib
+import os
+from typing import Dict, Hashable, Iterable, Optional, Set
+import zlib
+
+import mwparserfromhell
+from mwparserfromhell.wikicode import Wikicode
+
+from mwcomposerfromhell.cache import LRUCache, ParseCache
+from mwcomposerfromhell.namespace import (
+    _normalize_title,
+    _REVISIONS,
+    FrozenError,
+    Namespace,
+)
+
+# The approximate memory used by parsed wikicode: for each character of the
+# source and for each node.
+_BYTES_PER_CHAR = 2
+_BYTES_PER_NODE = 400
+
+
+class LazyNamespace(Namespace, abc.ABC):
+    """
+    A Namespace which parses articles when they are first used.
+
+    Sub-classes find the source of articles by implementing :meth:`_load` (and
+    optionally :meth:`_exists`). Parsed articles are kept in a bounded cache.
+    Articles which are explicitly set are kept in memory.
+
+    :param cache_size: The maximum number of parsed articles to keep.
+    :param parse_cache: An optional cache of parsed articles stored on disk.
+    """
+
+    def __init__(
+        self, cache_size: int = 1024, parse_cache: Optional[ParseCache] = None
+    ):
+        super().__init__()
+        self.cache = LRUCache(cache_size)
+        self.parse_cache = parse_cache
+        # The number of articles which were parsed.
+        self.parses = 0
+
+    @abc.abstractmethod
+    def _load(self, key: str) -> str:
+        """
+        Return the source of an article.
+
+        :param key: The normalized name of the article.
+        :raises KeyError: If the article does not exist.
+        """
+
+    def _exists(self, key: str) -> bool:
+        """Whether an article exists (given its normalized name)."""
+        try:
+            self._load(key)
+        except KeyError:
+            return False
+        return True
+
+    def _size(self, text: str, article: Wikicode) -> int:
+        """The size of a parsed article in the cache."""
+        return 1
+
+    def _parse(self, text: str) -> Wikicode:
+        """Parse the source of an article."""
+        if self.parse_cache is not None:
+            return self.parse_cache.parse(text)
+        return mwparserfromhell.parse(text)
+
+    def __getitem__(self, key: str) -> Wikicode:
+        key = _normalize_title(key)
+        try:
+            return self._articles[key]
+        except KeyError:
+            pass
+
+        article = self.cache.get(key)  # type: Optional[Wikicode]
+        if article is None:
+            text = self._load(key)
+            article = self._parse(text)
+            self.parses += 1
+            self.cache.put(key, article, self._size(text, article))
+        return article
+
+    def exists_many(self, keys: Iterable[str]) -> Set[str]:
+        existing = set()
+        for key in keys:
+            normalized = _normalize_title(key)
+            if normalized in self._articles or self._exists(normalized):
+                existing.add(key)
+        return existing
+
+    def _get_revision(self, key: str) -> Optional[Hashable]:
+        """
+        Get the revision of an article (given its normalized name) which was
+        not explicitly set. By default this is a hash of the source.
+        """
+        try:
+            text = self._load(key)
+        except KeyError:
+            return None
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get_revision(self, key: str) -> Optional[Hashable]:
+        key = _normalize_title(key)
+        try:
+            return self._revisions[key]
+        except KeyError:
+            return self._get_revision(key)
+
+
+class DirectoryNamespace(LazyNamespace):
+    """
+    A Namespace backed by a directory of files containing wikitext.
+
+    The name of each file is the normalized name of the article (with spaces
+    replaced by underscores) and an extension. The names of sub-pages
+    (e.g. ``Foo/doc``) refer to sub-directories.
+
+    :param root: The directory containing the files.
+    :param extension: The extension of the files.
+    :param cache_size: The maximum number of parsed articles to keep.
+    :param encoding: The encoding of the files.
+    :param parse_cache: An optional cache of parsed articles stored on disk.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        extension: str = ".wiki",
+        cache_size: int = 1024,
+        encoding: str = "utf-8",
+        parse_cache: Optional[ParseCache] = None,
+    ):
+        super().__init__(cache_size, parse_cache)
+        self._root = root
+        self._extension = extension
+        self._encoding = encoding
+
+    def path(self, key: str) -> Optional[str]:
+        """
+        The path of the file for an article, or None if the name of the
+        article cannot be used as a path (e.g. it refers to a parent directory).
+        """
+        parts = _normalize_title(key).replace(" ", "_").split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            return None
+        return os.path.join(self._root, *parts) + self._extension
+
+    def _load(self, key: str) -> str:
+        path = self.path(key)
+        if path is None:
+            raise KeyError(key)
+
+        try:
+            with open(path, encoding=self._encoding) as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise KeyError(key)
+
+    def _exists(self, key: str) -> bool:
+        path = self.path(key)
+        return path is not None and os.path.isfile(path)
+
+    def _get_revision(self, key: str) -> Optional[Hashable]:
+        # Avoid reading the file.
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class CompressedNamespace(LazyNamespace):
+    """
+    A Namespace which keeps the source of articles compressed in memory.
+
+    Articles are parsed when first used and kept until the (approximate)
+    memory used by parsed articles exceeds the budget.
+
+    :param articles: The source of articles, keyed by name.
+    :param memory_budget: The approximate memory (in bytes) to use for parsed
+        articles.
+    :param level: The compression level, see ``zlib.compress``.
+    :param parse_cache: An optional cache of parsed articles stored on disk.
+    """
+
+    def __init__(
+        self,
+        articles: Optional[Dict[str, str]] = None,
+        memory_budget: int = 64 * 1024 * 1024,
+        level: int = 6,
+        parse_cache: Optional[ParseCache] = None,
+    ):
+        super().__init__(memory_budget, parse_cache)
+        self._level = level
+        self._sources = {}  # type: Dict[str, bytes]
+        # The total size of the compressed sources.
+        self.compressed_size = 0
+
+        if articles:
+            for name, text in articles.items():
+                self.add_source(name, text)
+
+    def add_source(self, key: str, text: str) -> None:
+        """Add (or replace) the source of an article."""
+        if self.frozen:
+            raise FrozenError("The namespace is frozen")
+        key = _normalize_title(key)
+        data = zlib.compress(text.encode("utf-8"), self._level)
+        self.compressed_size += len(data) - len(self._sources.get(key, b""))
+        self._sources[key] = data
+        self._revisions[key] = next(_REVISIONS)
+        # Drop the parsed version of the previous source.
+        self.cache.discard(key)
+
+    @property
+    def resident_size(self) -> int:
+        """The approximate memory (in bytes) used by parsed articles."""
+        return self.cache.size
+
+    @property
+    def miss_rate(self) -> float:
+        """
+        The fraction of lookups (of articles which exist) which had to parse an
+        article.
+        """
+        lookups = self.cache.hits + self.parses
+        return self.parses / lookups if lookups else 0.0
+
+    def _load(self, key: str) -> str:
+        return zlib.decompress(self._sources[key]).decode("utf-8")
+
+    def _exists(self, key: str) -> bool:
+        return key in self._sources
+
+    def _size(self, text: str, article: Wikicode) -> int:
+        nodes = sum(1 for _ in article.ifilter(recursive=True))
+        return _BYTES_PER_CHAR * len(text) + _BYTES_PER_NODE * nodes
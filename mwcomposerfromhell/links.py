@@ -0,0 +1,84 @@
+import re
+from typing import Callable, Dict, Optional
+from urllib.parse import quote, unquote
+
+from mwcomposerfromhell.namespace import ArticleResolver, CanonicalTitle
+
+# Generate the opening tag of a link to an article, given whether it exists.
+LinkTag = Callable[[CanonicalTitle, bool], str]
+
+
+class LinkHolders:
+    """
+    Placeholders for links to articles which might not exist, similar to the
+    LinkHolderArray of MediaWiki.
+
+    Checking whether each linked article exists while rendering requires a
+    lookup per link. Instead, the opening tag of each link is rendered as a
+    placeholder (which encodes the title of the article). Once rendered, the
+    existence of all of the linked articles is checked at once and the
+    placeholders are replaced.
+
+    The placeholders include a token of the resolver so that they cannot be
+    forged by the contents of articles. They only depend on the title of the
+    article, so HTML containing them can be cached and re-used.
+
+    :param resolver: The resolver used to check whether articles exist.
+    """
+
+    def __init__(self, resolver: ArticleResolver):
+        self._resolver = resolver
+        self._prefix = f"\x7fLINK-{resolver.link_holder_token}:"
+        self._pattern = re.compile(
+            re.escape(self._prefix) + r"([^:\x7f]*):([^:\x7f]*):([^:\x7f]*)\x7f"
+        )
+
+    def add(self, canonical_title: CanonicalTitle) -> str:
+        """Return the placeholder for the opening tag of a link to an article."""
+        return (
+            self._prefix
+            + quote(canonical_title.namespace, safe="")
+            + ":"
+            + quote(canonical_title.title, safe="")
+            + ":"
+            + quote(canonical_title.interwiki, safe="")
+            + "\x7f"
+        )
+
+    def replace(
+        self,
+        html: str,
+        link_tag: LinkTag,
+        checked: Optional[Dict[CanonicalTitle, bool]] = None,
+    ) -> str:
+        """
+        Replace the placeholders in some HTML.
+
+        :param html: The rendered HTML.
+        :param link_tag: A callable which generates the opening tag of a link
+            from the title of the article and whether it exists.
+        :param checked: If given, the titles of the articles which were checked
+            for existence (and whether they exist) are added to it.
+        """
+        # Find the unique titles which are linked to.
+        titles = {}  # type: Dict[str, CanonicalTitle]
+        for match in self._pattern.finditer(html):
+            placeholder = match[0]
+            if placeholder not in titles:
+                namespace, title, interwiki = match.groups()
+                titles[placeholder] = CanonicalTitle(
+                    unquote(namespace), unquote(title), unquote(interwiki)
+                )
+
+        if not titles:
+            return html
+
+        existing = self._resolver.exists_many(titles.values())
+        if checked is not None:
+            for canonical_title in titles.values():
+                checked[canonical_title] = canonical_title in existing
+        tags = {
+            placeholder: link_tag(canonical_title, canonical_title in existing)
+            for placeholder, canonical_title in titles.items()
+        }
+        return self._pattern.sub(lambda match: tags[match[0]], html)
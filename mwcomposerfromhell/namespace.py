@@ -1,11 +1,32 @@
+import copy
+import gc
 import html
+import importlib
+import itertools
+import pickle
 import re
-from typing import Any, Callable, Dict, List, Optional, Tuple
+import secrets
+import time
+from typing import (
+    Any,
+    Callable,
+    Container,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 from urllib.parse import quote, unquote, urlencode
 
 from mwparserfromhell.wikicode import Wikicode
 
+from mwcomposerfromhell.cache import LRUCache, TemplateCache
 from mwcomposerfromhell.magic_words import MAGIC_WORDS, MagicWord
+from mwcomposerfromhell.plan import RenderPlans
 
 
 # A parser function is a callable which takes two parameters (param and context)
@@ -16,6 +37,14 @@ ParserFunction = Callable[[str, Context, ParentContext], str]
 
 MULTIPLE_SPACES = re.compile(r" +")
 
+# Identifies a snapshot of an ArticleResolver (and the version of the format).
+_SNAPSHOT_MAGIC = b"MWCFSNP1"
+
+# The revisions of articles in namespaces. This starts at the current time so
+# that revisions are unlikely to be re-used by another process (e.g. after
+# loading a snapshot).
+_REVISIONS = itertools.count(time.time_ns())
+
 
 class ArticleNotFound(Exception):
     """The article was not found."""
@@ -29,6 +58,10 @@ class ParserFunctionNotFound(Exception):
     """The parser function does not exist."""
 
 
+class FrozenError(TypeError):
+    """A frozen namespace (or resolver) cannot be modified."""
+
+
 class CanonicalTitle:
     def __init__(self, namespace: str, title: str, interwiki: str):
         self.namespace = namespace
@@ -45,6 +78,9 @@ class CanonicalTitle:
             other.interwiki,
         )
 
+    def __hash__(self) -> int:
+        return hash((self.namespace, self.title, self.interwiki))
+
     @property
     def full_title(self) -> str:
         if self.namespace:
@@ -92,6 +128,9 @@ class Namespace:
     Note that each article is expected to already have the namespace name removed.
     """
 
+    # Whether the namespace can no longer be modified, see freeze().
+    frozen = False
+
     def __init__(self, articles: Optional[Dict[str, Wikicode]] = None):
         if articles is None:
             self._articles = {}
@@ -100,25 +139,198 @@ class Namespace:
             self._articles = {
                 _normalize_title(name): article for name, article in articles.items()
             }
+        # The revision of each article, see get_revision().
+        self._revisions = dict.fromkeys(
+            self._articles, next(_REVISIONS)
+        )  # type: Dict[str, Hashable]
 
     def __getitem__(self, key: str) -> Wikicode:
         return self._articles[_normalize_title(key)]
 
     def __setitem__(self, key: str, value: Wikicode) -> Wikicode:
-        self._articles[_normalize_title(key)] = value
+        if self.frozen:
+            raise FrozenError("The namespace is frozen")
+        key = _normalize_title(key)
+        self._articles[key] = value
+        self._revisions[key] = next(_REVISIONS)
         return value
 
+    def get_revision(self, key: str) -> Optional[Hashable]:
+        """
+        Get a value which changes whenever an article changes, or None if the
+        article does not exist.
+
+        The revisions of articles which are set are only meaningful within a
+        process, sub-classes which load articles from elsewhere should use a
+        revision from the source of the article (e.g. a hash of it).
+        """
+        return self._revisions.get(_normalize_title(key))
+
+    def freeze(self) -> None:
+        """Prevent any further modifications to the namespace."""
+        self.frozen = True
+
+    def exists_many(self, keys: Iterable[str]) -> Set[str]:
+        """
+        Check whether many articles exist at once.
+
+        Sub-classes which fetch articles from elsewhere should override this to
+        avoid fetching each article.
+
+        :param keys: The names of the articles to check.
+        :return: The names of the articles which exist.
+        """
+        existing = set()  # type: Set[str]
+        for key in keys:
+            try:
+                self[key]
+            except KeyError:
+                continue
+            existing.add(key)
+        return existing
+
+
+class OverlayNamespace(Namespace):
+    """
+    A Namespace which layers articles over other namespaces (the bases),
+    without modifying or copying them.
+
+    Articles are looked up in the overlay first and then in each base, in
+    order. Articles which are set are only added to the overlay.
+
+    :param bases: The namespaces to look up articles in.
+    :param articles: The articles of the overlay.
+    """
+
+    def __init__(
+        self,
+        bases: Sequence[Namespace],
+        articles: Optional[Dict[str, Wikicode]] = None,
+    ):
+        super().__init__(articles)
+        self.bases = bases
+
+    def __getitem__(self, key: str) -> Wikicode:
+        key = _normalize_title(key)
+        try:
+            return self._articles[key]
+        except KeyError:
+            pass
+
+        for base in self.bases:
+            try:
+                return base[key]
+            except KeyError:
+                continue
+        raise KeyError(key)
+
+    def exists_many(self, keys: Iterable[str]) -> Set[str]:
+        existing = set()  # type: Set[str]
+        remaining = set()  # type: Set[str]
+        for key in keys:
+            if _normalize_title(key) in self._articles:
+                existing.add(key)
+            else:
+                remaining.add(key)
+
+        for base in self.bases:
+            if not remaining:
+                break
+            found = base.exists_many(remaining)
+            existing.update(found)
+            remaining.difference_update(found)
+        return existing
+
+    def get_revision(self, key: str) -> Optional[Hashable]:
+        revision = super().get_revision(key)
+        if revision is not None:
+            return revision
+
+        for base in self.bases:
+            revision = base.get_revision(key)
+            if revision is not None:
+                return revision
+        return None
+
+
+class _OverlayIndex:
+    """An existence index which also contains the titles of an overlay."""
+
+    def __init__(self, titles: Set[str], base: Container[str]):
+        self._titles = titles
+        self._base = base
+
+    def __contains__(self, title: object) -> bool:
+        return title in self._titles or title in self._base
+
+
+def _import_path(function: Callable[..., Any]) -> str:
+    """The path to import a function from, see :func:`_import_function`."""
+    module = getattr(function, "__module__", None)
+    qualname = getattr(function, "__qualname__", "")
+    if not module or not qualname or "<" in qualname:
+        raise ValueError(f"{function!r} is not a module-level function")
+    return f"{module}:{qualname}"
+
+
+def _import_function(path: str) -> Any:
+    """Import a function given a path from :func:`_import_path`."""
+    module, qualname = path.split(":", 1)
+    function = importlib.import_module(module)  # type: Any
+    for name in qualname.split("."):
+        function = getattr(function, name)
+    return function
+
 
 class ArticleResolver:
     """
     Holds the configuration of things that can be referenced from articles.
+
+    :param base_url: The URL that articles sit in.
+    :param edit_url: The URL used to edit articles.
+    :param template_cache: An optional cache of expanded templates shared by
+        all renders using this resolver. It must be cleared if any of the
+        articles are modified.
+    :param compile_templates: Whether to compile templates into render plans
+        when they're first used, which makes future uses of them cheaper. The
+        plans must be cleared if any of the articles are modified.
+    :param title_cache_size: The maximum number of canonicalized titles (and,
+        separately, of URLs generated for them) to cache. The hit rates are
+        available via ``title_cache.hit_rate`` and ``url_cache.hit_rate``.
+    :param existence_index: An optional (probabilistic) set of the full
+        canonical titles of all articles, e.g. a
+        :class:`mwcomposerfromhell.bloom.BloomFilter`. Articles which are not
+        in it are treated as missing without looking them up in the namespace.
+        It must be updated if any articles are added.
     """
 
-    def __init__(self, base_url: str = "/wiki/", edit_url: str = "/index.php"):
+    def __init__(
+        self,
+        base_url: str = "/wiki/",
+        edit_url: str = "/index.php",
+        template_cache: Optional[TemplateCache] = None,
+        compile_templates: bool = False,
+        title_cache_size: int = 4096,
+        existence_index: Optional[Container[str]] = None,
+    ):
         # The base URL should be the root that articles sit in.
         self._base_url = base_url.rstrip("/")
         self._edit_url = edit_url
 
+        self.template_cache = template_cache
+        self.render_plans = RenderPlans() if compile_templates else None
+
+        # Identifies placeholders for links rendered using this resolver, see
+        # mwcomposerfromhell.links.LinkHolders.
+        self.link_holder_token = secrets.token_hex(8)
+
+        # The same titles are canonicalized (and linked to) repeatedly. These
+        # are cleared when namespaces are added.
+        self.title_cache = LRUCache(title_cache_size)
+        self.url_cache = LRUCache(title_cache_size)
+
+        self.existence_index = existence_index
+
         # A map of namespace names to Namespace objects. Used to find articles.
         self._namespaces = {}  # type: Dict[str, Namespace]
         # A map of the "canonical" namespace to the "human" capitalization.
@@ -130,25 +342,131 @@ class ArticleResolver:
         # A map of parser functions to callable.
         self._parser_functions = {}  # type: Dict[str, ParserFunction]
 
+        # Whether the resolver can no longer be modified, see freeze().
+        self.frozen = False
+        # Whether the caches belong to another resolver, see overlay().
+        self._shares_caches = False
+
+    def freeze(self, gc_freeze: bool = True) -> None:
+        """
+        Prevent any further modifications to the resolver and its namespaces,
+        e.g. before forking worker processes which share it.
+
+        The composer does not modify articles, but CPython's garbage collector
+        writes to every object it tracks, which causes the memory holding the
+        articles to be copied into each worker. By default, the garbage
+        collector is told to ignore all current objects (see ``gc.freeze``).
+
+        Render plans are created when templates are first used and they should
+        be created before freezing (e.g. by rendering some articles).
+
+        :param gc_freeze: Whether to call ``gc.freeze``.
+        """
+        for namespace in self._namespaces.values():
+            namespace.freeze()
+        self.frozen = True
+
+        if gc_freeze:
+            # Free any garbage so that its memory is not shared.
+            gc.collect()
+            gc.freeze()
+
+    def _check_frozen(self) -> None:
+        if self.frozen:
+            raise FrozenError("The resolver is frozen")
+
     def add_namespace(self, name: str, namespace: Namespace) -> None:
+        self._check_frozen()
         self._namespaces[_normalize_namespace(name)] = namespace
         self._canonical_namespaces[_normalize_namespace(name)] = name
 
+        # Any cached titles and templates might now be stale.
+        if self._shares_caches:
+            # The caches of the other resolver are still valid for it.
+            self.title_cache = LRUCache(self.title_cache.max_size)
+            self.url_cache = LRUCache(self.url_cache.max_size)
+            if self.render_plans is not None:
+                self.render_plans = RenderPlans()
+            self._shares_caches = False
+        else:
+            self.title_cache.clear()
+            self.url_cache.clear()
+            if self.template_cache is not None:
+                self.template_cache.clear()
+            if self.render_plans is not None:
+                self.render_plans.clear()
+
+    def overlay(
+        self, articles: Optional[Dict[str, Wikicode]] = None
+    ) -> "ArticleResolver":
+        """
+        Create a resolver which layers articles over the articles of this
+        resolver, e.g. to preview changes to an article or a template.
+
+        This resolver is not modified (and nothing is copied from its
+        namespaces). The caches of titles, URLs and render plans are shared,
+        but expanded templates are not cached by the new resolver since they
+        might depend on the changed articles.
+
+        :param articles: The articles to add, keyed by their full title (e.g.
+            ``Template:Foo``).
+        """
+        resolver = copy.copy(self)
+        resolver._namespaces = self._namespaces.copy()
+        resolver._canonical_namespaces = self._canonical_namespaces.copy()
+        resolver._magic_words = self._magic_words.copy()
+        resolver._parser_functions = self._parser_functions.copy()
+        resolver.template_cache = None
+        resolver.frozen = False
+        resolver._shares_caches = True
+
+        # The overlay of each namespace with any articles.
+        overlays = {}  # type: Dict[str, OverlayNamespace]
+        titles = set()  # type: Set[str]
+        for name, article in (articles or {}).items():
+            canonical_title = self.canonicalize_title(name)
+            namespace_name = canonical_title.namespace
+            overlay = overlays.get(namespace_name)
+            if overlay is None:
+                base = self._namespaces.get(namespace_name)
+                overlay = OverlayNamespace([base] if base is not None else [])
+                overlays[namespace_name] = overlay
+                resolver._namespaces[namespace_name] = overlay
+            overlay[canonical_title.title] = article
+            titles.add(canonical_title.full_title)
+
+        if titles and self.existence_index is not None:
+            resolver.existence_index = _OverlayIndex(titles, self.existence_index)
+
+        return resolver
+
     def get_article_url(self, canonical_title: CanonicalTitle) -> str:
         """Given a canonical title, return a URL suitable for linking."""
-        # TODO Handle interwiki links.
-        title = quote(canonical_title.link, safe="/:~")
-        return f"{self._base_url}/{title}"
+        key = ("view", canonical_title)
+        url = self.url_cache.get(key)  # type: Optional[str]
+        if url is None:
+            # TODO Handle interwiki links.
+            title = quote(canonical_title.link, safe="/:~")
+            url = f"{self._base_url}/{title}"
+            self.url_cache.put(key, url)
+        return url
 
     def get_edit_url(self, canonical_title: CanonicalTitle) -> str:
         """Given a page title, return a URL suitable for editing that page."""
-        params = (
-            ("title", canonical_title.link),
-            ("action", "edit"),
-            ("redlink", "1"),
-        )
-        # MediaWiki generates an escaped URL.
-        return "{}?{}".format(self._edit_url, html.escape(urlencode(params, safe=":")))
+        key = ("edit", canonical_title)
+        url = self.url_cache.get(key)  # type: Optional[str]
+        if url is None:
+            params = (
+                ("title", canonical_title.link),
+                ("action", "edit"),
+                ("redlink", "1"),
+            )
+            # MediaWiki generates an escaped URL.
+            url = "{}?{}".format(
+                self._edit_url, html.escape(urlencode(params, safe=":"))
+            )
+            self.url_cache.put(key, url)
+        return url
 
     def resolve_article(self, name: str, default_namespace: str) -> CanonicalTitle:
         """
@@ -168,11 +486,73 @@ class ArticleResolver:
         """
         canonical_title = self.resolve_article(name, default_namespace)
 
+        # Avoid looking up articles which definitely do not exist.
+        if (
+            self.existence_index is not None
+            and canonical_title.full_title not in self.existence_index
+        ):
+            raise ArticleNotFound(canonical_title)
+
         try:
             return self._namespaces[canonical_title.namespace][canonical_title.title]
         except KeyError:
             raise ArticleNotFound(canonical_title)
 
+    def get_revision(self, title: str) -> Optional[Hashable]:
+        """
+        Get a value which changes whenever an article changes, or None if the
+        article does not exist, see :meth:`Namespace.get_revision`.
+
+        :param title: The full title of the article.
+        """
+        canonical_title = self.resolve_article(title, default_namespace="")
+        try:
+            namespace = self._namespaces[canonical_title.namespace]
+        except KeyError:
+            return None
+        return namespace.get_revision(canonical_title.title)
+
+    def exists_many(self, titles: Iterable[CanonicalTitle]) -> Set[CanonicalTitle]:
+        """
+        Check whether many articles exist at once.
+
+        Each namespace is asked about all of its articles at once, see
+        :meth:`Namespace.exists_many`.
+
+        :param titles: The canonical titles of the articles to check.
+        :return: The canonical titles of the articles which exist.
+        """
+        # Group the titles by namespace, skipping articles which definitely do
+        # not exist.
+        existence_index = self.existence_index
+        by_namespace = {}  # type: Dict[str, List[CanonicalTitle]]
+        for canonical_title in titles:
+            if (
+                existence_index is not None
+                and canonical_title.full_title not in existence_index
+            ):
+                continue
+            by_namespace.setdefault(canonical_title.namespace, []).append(
+                canonical_title
+            )
+
+        existing = set()  # type: Set[CanonicalTitle]
+        for namespace_name, namespace_titles in by_namespace.items():
+            try:
+                namespace = self._namespaces[namespace_name]
+            except KeyError:
+                continue
+
+            found = namespace.exists_many(
+                {canonical_title.title for canonical_title in namespace_titles}
+            )
+            existing.update(
+                canonical_title
+                for canonical_title in namespace_titles
+                if canonical_title.title in found
+            )
+        return existing
+
     def canonicalize_title(
         self, title: str, default_namespace: str = ""
     ) -> CanonicalTitle:
@@ -183,9 +563,19 @@ class ArticleResolver:
 
         TODO Handle anonymous user pages.
         """
+        key = (title, default_namespace)
+        canonical_title = self.title_cache.get(key)  # type: Optional[CanonicalTitle]
+        if canonical_title is None:
+            canonical_title = self._canonicalize_title(title, default_namespace)
+            self.title_cache.put(key, canonical_title)
+        return canonical_title
+
+    def _canonicalize_title(self, title: str, default_namespace: str) -> CanonicalTitle:
+        """Generate the canonical form of a title, see :meth:`canonicalize_title`."""
         # HTML entities and percent encoded characters get converted to their raw
         # character.
-        title = html.unescape(unquote(title))
+        if "&" in title or "%" in title:
+            title = html.unescape(unquote(title))
 
         # Convert spaces to underscores.
         title = title.replace("_", " ")
@@ -252,6 +642,7 @@ class ArticleResolver:
 
     def add_magic_word(self, magic_word: str, function: MagicWord) -> None:
         """Add an additional magic word."""
+        self._check_frozen()
         self._magic_words[magic_word] = function
 
     def get_parser_function(self, parser_function: str) -> ParserFunction:
@@ -263,5 +654,84 @@ class ArticleResolver:
     def add_parser_function(
         self, parser_function: str, function: ParserFunction
     ) -> None:
-        """Add an additional magic word."""
+        """Add an additional parser function."""
+        self._check_frozen()
         self._parser_functions[parser_function] = function
+
+    def save(self, path: str, include_caches: bool = False) -> None:
+        """
+        Write a snapshot of the resolver (including its namespaces) to a file,
+        see :meth:`load`.
+
+        Magic words and parser functions are stored by the path to import them
+        from, they must be module-level functions. Render plans are not stored.
+
+        :param path: The path of the snapshot.
+        :param include_caches: Whether to store the cached titles, URLs and
+            expanded templates (otherwise the caches are empty once loaded).
+        """
+        template_cache = self.template_cache
+        if template_cache is not None and not include_caches:
+            template_cache = TemplateCache(template_cache.max_size)
+
+        state = {
+            "base_url": self._base_url,
+            "edit_url": self._edit_url,
+            "template_cache": template_cache,
+            "compile_templates": self.render_plans is not None,
+            "title_cache_size": self.title_cache.max_size,
+            "existence_index": self.existence_index,
+            # Placeholders for links might be in the cached templates.
+            "link_holder_token": self.link_holder_token,
+            "title_cache": self.title_cache if include_caches else None,
+            "url_cache": self.url_cache if include_caches else None,
+            "namespaces": self._namespaces,
+            "canonical_namespaces": self._canonical_namespaces,
+            # The default magic words are not stored.
+            "magic_words": {
+                name: _import_path(function)
+                for name, function in self._magic_words.items()
+                if MAGIC_WORDS.get(name) is not function
+            },
+            "parser_functions": {
+                name: _import_path(function)
+                for name, function in self._parser_functions.items()
+            },
+        }
+
+        with open(path, "wb") as f:
+            f.write(_SNAPSHOT_MAGIC)
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "ArticleResolver":
+        """
+        Read a resolver which was written by :meth:`save`.
+
+        The snapshot is pickled, it must only be loaded from a trusted source.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} does not contain a snapshot")
+            state = pickle.load(f)
+
+        resolver = cls(
+            base_url=state["base_url"],
+            edit_url=state["edit_url"],
+            template_cache=state["template_cache"],
+            compile_templates=state["compile_templates"],
+            title_cache_size=state["title_cache_size"],
+            existence_index=state["existence_index"],
+        )
+        resolver.link_holder_token = state["link_holder_token"]
+        if state["title_cache"] is not None:
+            resolver.title_cache = state["title_cache"]
+            resolver.url_cache = state["url_cache"]
+
+        resolver._namespaces = state["namespaces"]
+        resolver._canonical_namespaces = state["canonical_namespaces"]
+        for name, function_path in state["magic_words"].items():
+            resolver._magic_words[name] = _import_function(function_path)
+        for name, function_path in state["parser_functions"].items():
+            resolver._parser_functions[name] = _import_function(function_path)
+        return resolver
@@ -0,0 +1,104 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple, TYPE_CHECKING
+import weakref
+
+from mwparserfromhell import nodes
+from mwparserfromhell.wikicode import Wikicode
+
+if TYPE_CHECKING:
+    from mwcomposerfromhell.dependencies import Dependencies
+
+# The HTML generated by a node, the open tags and pending lists afterwards, and
+# the articles it linked to or checked the existence of (if any).
+RecordedOutput = Tuple[str, Tuple[str, ...], Tuple[str, ...], Optional["Dependencies"]]
+
+# Nodes whose output depends on the parameters of the template call (or other
+# articles, the current time, etc.).
+_DYNAMIC_NODES = (nodes.Argument, nodes.Template)
+
+# The maximum number of different composer states to record the output of a
+# node for.
+MAX_RECORDED_STATES = 8
+
+
+def is_static(node: nodes.Node) -> bool:
+    """
+    Whether the output of a node only depends on the state of the composer.
+
+    This is true unless the node (or any node inside of it) is an argument or a
+    template.
+    """
+    if isinstance(node, _DYNAMIC_NODES):
+        return False
+
+    return all(is_static(child) for code in node.__children__() for child in code.nodes)
+
+
+class RenderPlan:
+    """
+    A pre-processed Wikicode object, ready to be rendered repeatedly.
+
+    This holds the nodes of the Wikicode (after they've been normalized) and,
+    for each static node, the output it generated for each composer state it
+    was rendered in. Rendering a static node in a state it was already rendered
+    in only needs to replay that output.
+
+    :param wikicode_nodes: The normalized nodes.
+    :param trails: The link trail of each node, if it is a link.
+    """
+
+    __slots__ = ("nodes", "trails", "outputs")
+
+    def __init__(
+        self,
+        wikicode_nodes: List[nodes.Node],
+        trails: Optional[List[Optional[str]]] = None,
+    ):
+        self.nodes = wikicode_nodes
+        self.trails = trails or [None] * len(wikicode_nodes)
+        # A map of composer state to recorded output for each node, or None if
+        # the node is not static.
+        self.outputs = [
+            {} if is_static(node) else None for node in wikicode_nodes
+        ]  # type: List[Optional[Dict[Hashable, RecordedOutput]]]
+
+
+class RenderPlans:
+    """
+    The render plans of Wikicode objects.
+
+    The plans are kept until the Wikicode they were created from is garbage
+    collected (or the plans are cleared).
+    """
+
+    def __init__(self) -> None:
+        self._plans = {}  # type: Dict[int, Tuple[weakref.ref[Wikicode], RenderPlan]]
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def get(self, wikicode: Wikicode) -> Optional[RenderPlan]:
+        """Get the plan for a Wikicode object, if one exists."""
+        try:
+            ref, plan = self._plans[id(wikicode)]
+        except KeyError:
+            return None
+
+        # The id might have been re-used by another object.
+        if ref() is not wikicode:
+            return None
+        return plan
+
+    def add(self, wikicode: Wikicode, plan: RenderPlan) -> None:
+        """Store the plan for a Wikicode object."""
+        key = id(wikicode)
+
+        def remove(ref: Any) -> None:
+            # Only remove the plan if it wasn't since replaced.
+            if key in self._plans and self._plans[key][0] is ref:
+                del self._plans[key]
+
+        self._plans[key] = (weakref.ref(wikicode, remove), plan)
+
+    def clear(self) -> None:
+        """Remove all plans, e.g. after the articles have changed."""
+        self._plans.clear()
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+import threading
+from typing import Callable, Iterator, List
+
+from mwparserfromhell.wikicode import Wikicode
+
+from mwcomposerfromhell.composer import WikicodeToHtmlComposer
+
+
+class ComposerPool:
+    """
+    A pool of re-usable composers which can be shared between threads.
+
+    Each composer is only used by one thread at a time. Composers are created
+    on demand and up to ``max_size`` idle composers are kept for re-use.
+
+    :param factory: A callable which creates a new composer, e.g. to configure
+        the resolver to use.
+    :param max_size: The maximum number of idle composers to keep.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], WikicodeToHtmlComposer] = WikicodeToHtmlComposer,
+        max_size: int = 8,
+    ):
+        self._factory = factory
+        self._max_size = max_size
+
+        # The composers which are not currently checked out.
+        self._idle = []  # type: List[WikicodeToHtmlComposer]
+        self._lock = threading.Lock()
+
+    def acquire(self) -> WikicodeToHtmlComposer:
+        """Check out a composer, creating a new one if none are idle."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._factory()
+
+    def release(self, composer: WikicodeToHtmlComposer) -> None:
+        """Check a composer back in to the pool."""
+        # Drop any references to the previous render.
+        composer.reset()
+
+        with self._lock:
+            if len(self._idle) < self._max_size:
+                self._idle.append(composer)
+
+    @contextmanager
+    def composer(self) -> Iterator[WikicodeToHtmlComposer]:
+        """Check out a composer for the duration of a with-block."""
+        composer = self.acquire()
+        try:
+            yield composer
+        finally:
+            self.release(composer)
+
+    def compose(self, wikicode: Wikicode) -> str:
+        """Convert Wikicode to HTML using a composer from the pool."""
+        with self.composer() as composer:
+            return composer.compose(wikicode)
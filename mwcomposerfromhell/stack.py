@@ -0,0 +1,140 @@
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Tags that represent a list or list items.
+LIST_TAGS = {"ul", "ol", "li", "dl", "dt", "dd"}
+
+
+class TagStack:
+    """
+    The currently open HTML tags, from the outermost to the innermost.
+
+    Besides the order of the tags, the positions of each tag in the stack are
+    tracked (making it cheap to check whether a tag is open or to find the
+    innermost one) as well as the open list tags.
+
+    List tags from wiki markup are not opened immediately, instead they are
+    pending until the content of the list item is found. The length of the
+    common prefix of the pending list tags and the open list tags is kept
+    up-to-date as tags are added, opened and closed. This avoids comparing the
+    pending and open lists in full for each list item.
+
+    :param tags: The initially open tags.
+    :param pending: The initially pending list tags.
+    """
+
+    __slots__ = ("_tags", "_positions", "lists", "pending", "_matched")
+
+    def __init__(self, tags: Iterable[str] = (), pending: Iterable[str] = ()):
+        self._tags = []  # type: List[str]
+        # The positions of each tag in the stack, from outermost to innermost.
+        self._positions = {}  # type: Dict[str, List[int]]
+        # The open lists and list items, from outermost to innermost. This must
+        # not be modified.
+        self.lists = []  # type: List[str]
+        # The list tags waiting to be opened, from outermost to innermost. This
+        # must not be modified.
+        self.pending = []  # type: List[str]
+        # The number of pending list tags which match the open list tags.
+        self._matched = 0
+
+        for tag in tags:
+            self.push(tag)
+        self.add_pending(tuple(pending))
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tags)
+
+    def __reversed__(self) -> Iterator[str]:
+        return reversed(self._tags)
+
+    def __contains__(self, tag: str) -> bool:
+        return bool(self._positions.get(tag))
+
+    def __repr__(self) -> str:
+        return f"TagStack({self._tags!r})"
+
+    def push(self, tag: str) -> None:
+        """Open a tag."""
+        try:
+            self._positions[tag].append(len(self._tags))
+        except KeyError:
+            self._positions[tag] = [len(self._tags)]
+        self._tags.append(tag)
+
+        if tag in LIST_TAGS:
+            lists = self.lists
+            matched = self._matched
+            if (
+                matched == len(lists)
+                and matched < len(self.pending)
+                and self.pending[matched] == tag
+            ):
+                self._matched = matched + 1
+            lists.append(tag)
+
+    def pop(self) -> str:
+        """Close the innermost tag and return it."""
+        tag = self._tags.pop()
+        self._positions[tag].pop()
+
+        if tag in LIST_TAGS:
+            lists = self.lists
+            lists.pop()
+            if self._matched > len(lists):
+                self._matched = len(lists)
+
+        return tag
+
+    def last_index(self, tag: str) -> int:
+        """Return the position of the innermost occurrence of a tag, or -1 if it is not open."""
+        positions = self._positions.get(tag)
+        return positions[-1] if positions else -1
+
+    def add_pending(self, tags: Sequence[str]) -> None:
+        """Add list tags to be opened later."""
+        pending = self.pending
+        matched = self._matched
+
+        # The common prefix can only grow if all of the pending tags match.
+        if matched == len(pending):
+            lists = self.lists
+            open_lists = len(lists)
+            for tag in tags:
+                if matched < open_lists and lists[matched] == tag:
+                    matched += 1
+                else:
+                    break
+            self._matched = matched
+
+        pending.extend(tags)
+
+    def pending_prefix(self) -> int:
+        """
+        The number of open list tags which are kept when opening the pending
+        list tags.
+
+        The innermost pending list tag is always opened, even if it matches.
+        """
+        return min(self._matched, len(self.pending) - 1)
+
+    def clear_pending(self) -> None:
+        """Forget the pending list tags (e.g. after opening them)."""
+        self.pending.clear()
+        self._matched = 0
+
+    def snapshot(self) -> Tuple[str, ...]:
+        """The open tags, see :meth:`restore`."""
+        return tuple(self._tags)
+
+    def restore(self, tags: Iterable[str], pending: Iterable[str] = ()) -> None:
+        """Replace the open tags and pending list tags (e.g. with a snapshot)."""
+        self._tags.clear()
+        self._positions.clear()
+        self.lists.clear()
+        self.clear_pending()
+        for tag in tags:
+            self.push(tag)
+        self.add_pending(tuple(pending))
@@ -0,0 +1,126 @@
+import pickle
+
+import mwparserfromhell
+import pytest
+
+from mwcomposerfromhell import ArticleResolver, WikicodeToHtmlComposer
+from mwcomposerfromhell.archive import (
+    ArchiveNamespace,
+    build_archive,
+    iter_directory,
+    iter_dump,
+)
+from mwcomposerfromhell.namespace import FrozenError
+
+DUMP = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+  <siteinfo>
+    <namespaces>
+      <namespace key="0" case="first-letter" />
+      <namespace key="10" case="first-letter">Template</namespace>
+    </namespaces>
+  </siteinfo>
+  <page>
+    <title>Foo</title>
+    <ns>0</ns>
+    <revision><text>An article</text></revision>
+  </page>
+  <page>
+    <title>Template:Echo</title>
+    <ns>10</ns>
+    <revision><text>Old</text></revision>
+    <revision><text>{{{1}}}!</text></revision>
+  </page>
+  <page>
+    <title>Template:Empty</title>
+    <ns>10</ns>
+    <revision><text /></revision>
+  </page>
+</mediawiki>
+"""
+
+
+def test_archive(tmp_path):
+    """Articles are found in an archive."""
+    path = str(tmp_path / "articles.archive")
+    articles = [("foo", "''Foo''"), ("Bär", "Bär"), ("Foo/doc", "Docs"), ("B", "")]
+    assert build_archive(path, articles + [("Foo", "Foo!")]) == 4
+
+    namespace = ArchiveNamespace(path)
+    assert len(namespace) == 4
+    assert list(namespace.titles()) == ["B", "Bär", "Foo", "Foo/doc"]
+    assert namespace.text("foo") == "Foo!"
+    assert namespace.text("Bär") == "Bär"
+    assert namespace.text("B") == ""
+    assert str(namespace["Foo/doc"]) == "Docs"
+    assert namespace["Foo"] is namespace["Foo"]
+
+    for key in ("A", "Bar", "Foo/", "Zzz"):
+        with pytest.raises(KeyError):
+            namespace[key]
+    assert namespace.exists_many(["foo", "bär", "Bar"]) == {"foo", "bär"}
+
+    # The archive is read-only.
+    with pytest.raises(FrozenError):
+        namespace["Bar"] = mwparserfromhell.parse("Bar")
+    namespace.close()
+
+
+def test_archive_pickle(tmp_path):
+    """The archive is opened again when un-pickled."""
+    path = str(tmp_path / "articles.archive")
+    build_archive(path, [("Foo", "Foo!")])
+    namespace = pickle.loads(pickle.dumps(ArchiveNamespace(path)))
+    assert namespace.text("Foo") == "Foo!"
+
+
+def test_archive_empty(tmp_path):
+    """An archive may not contain any articles."""
+    path = str(tmp_path / "articles.archive")
+    assert build_archive(path, []) == 0
+    namespace = ArchiveNamespace(path)
+    assert len(namespace) == 0
+    with pytest.raises(KeyError):
+        namespace["Foo"]
+
+
+def test_archive_invalid(tmp_path):
+    """Files which are not archives are rejected."""
+    path = tmp_path / "articles.archive"
+    path.write_bytes(b"Not an archive")
+    with pytest.raises(ValueError):
+        ArchiveNamespace(str(path))
+
+    build_archive(str(path), [("Foo", "Foo")])
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        ArchiveNamespace(str(path))
+
+
+def test_iter_directory(tmp_path):
+    """Articles are read from a directory."""
+    (tmp_path / "Foo_bar.wiki").write_text("Foo bar", encoding="utf-8")
+    (tmp_path / "Foo_bar").mkdir()
+    (tmp_path / "Foo_bar" / "doc.wiki").write_text("Docs", encoding="utf-8")
+    (tmp_path / "README.txt").write_text("Ignored", encoding="utf-8")
+    assert sorted(iter_directory(str(tmp_path))) == [
+        ("Foo bar", "Foo bar"),
+        ("Foo bar/doc", "Docs"),
+    ]
+
+
+def test_iter_dump(tmp_path):
+    """Articles in a namespace are read from a dump."""
+    path = tmp_path / "dump.xml"
+    path.write_text(DUMP, encoding="utf-8")
+    assert list(iter_dump(str(path))) == [("Foo", "An article")]
+    assert list(iter_dump(str(path), "template")) == [
+        ("Echo", "{{{1}}}!"),
+        ("Empty", ""),
+    ]
+
+    archive = str(tmp_path / "templates.archive")
+    build_archive(archive, iter_dump(str(path), "Template"))
+    resolver = ArticleResolver()
+    resolver.add_namespace("Template", ArchiveNamespace(archive))
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+    assert composer.compose(mwparserfromhell.parse("{{echo|Hi}}")) == "Hi<p>!</p>"
@@ -0,0 +1,77 @@
+import mwparserfromhell
+import pytest
+
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+from mwcomposerfromhell.bloom import BloomFilter
+from mwcomposerfromhell.namespace import ArticleNotFound
+
+
+def test_bloom_filter():
+    """Added titles are always found, others are usually not found."""
+    titles = [f"Page {it}" for it in range(1000)]
+    bloom_filter = BloomFilter.from_titles(titles, capacity=1000, error_rate=0.01)
+    assert len(bloom_filter) == 1000
+    # About 1.2 bytes per title.
+    assert bloom_filter.size < 1250
+
+    assert all(title in bloom_filter for title in titles)
+    false_positives = sum(f"Other {it}" in bloom_filter for it in range(1000))
+    assert false_positives < 30
+
+
+def test_bloom_filter_file(tmp_path):
+    """A filter can be built from a file and saved to a file."""
+    titles = tmp_path / "titles.txt"
+    titles.write_text("Foo\n\nTemplate:Bar baz\nÜber\n", encoding="utf-8")
+    bloom_filter = BloomFilter.from_file(str(titles))
+    assert len(bloom_filter) == 3
+
+    path = str(tmp_path / "titles.bloom")
+    bloom_filter.save(path)
+    loaded = BloomFilter.load(path)
+    assert len(loaded) == 3
+    assert loaded.size == bloom_filter.size
+    for title in ("Foo", "Template:Bar baz", "Über"):
+        assert title in loaded
+    assert "" not in loaded
+
+    # Other files cannot be loaded.
+    with pytest.raises(ValueError):
+        BloomFilter.load(str(titles))
+
+
+class RecordingNamespace(Namespace):
+    """A namespace which records the articles which are looked up."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = []
+
+    def __getitem__(self, key):
+        self.lookups.append(key)
+        return super().__getitem__(key)
+
+    def exists_many(self, keys):
+        self.lookups.extend(keys)
+        return super().exists_many(keys)
+
+
+def test_existence_index():
+    """Articles which are not in the index are never looked up."""
+    namespace = RecordingNamespace({"Foo": mwparserfromhell.parse("foo")})
+    resolver = ArticleResolver(
+        existence_index=BloomFilter.from_titles(["Foo"], capacity=1)
+    )
+    resolver.add_namespace("", namespace)
+
+    assert resolver.get_article("Foo")
+    with pytest.raises(ArticleNotFound):
+        resolver.get_article("Missing")
+    assert namespace.lookups == ["Foo"]
+
+    namespace.lookups.clear()
+    composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+    html = composer.compose(mwparserfromhell.parse("[[Foo]] [[Missing]]"))
+    assert 'title="Foo"' in html
+    assert 'title="Missing (page does not exist)"' in html
+    assert "Missing" not in namespace.lookups
@@ -0,0 +1,152 @@
+import json
+
+from mwcomposerfromhell.build import build, BuildResult, MANIFEST_NAME
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _wiki(tmp_path):
+    src = tmp_path / "src"
+    _write(src / "Main" / "Foo.wiki", "Say {{echo|Hi}} to [[Bar]] and [[Missing]]")
+    _write(src / "Main" / "Bar.wiki", "Just '''Bar'''")
+    _write(src / "Main" / "Bar" / "doc.wiki", "Say {{shout|Hi}}")
+    _write(
+        src / "Template" / "Echo.wiki",
+        "<!-- Echo -->{{{1}}}!<noinclude>Docs</noinclude>",
+    )
+    _write(src / "Template" / "Shout.wiki", "{{echo|'''{{{1}}}'''}}")
+    return src, tmp_path / "out"
+
+
+def test_build(tmp_path):
+    """Articles of the main namespace are rendered to files."""
+    src, out = _wiki(tmp_path)
+    assert build(str(src), str(out)) == BuildResult(3, 3, 3, 0)
+
+    assert (out / "Foo.html").read_text() == (
+        '<p>Say Hi<p>!</p> to <a href="/wiki/Bar" title="Bar">Bar</a> and '
+        '<a href="/index.php?title=Missing&amp;action=edit&amp;redlink=1" class="new" '
+        'title="Missing (page does not exist)">Missing</a></p>'
+    )
+    assert (out / "Bar" / "doc.html").read_text() == "<p>Say <b>Hi</b><p>!</p></p>"
+
+    manifest = json.loads((out / MANIFEST_NAME).read_text())
+    assert manifest["pages"]["Bar/doc"]["transcluded"] == [
+        "Template:Echo",
+        "Template:Shout",
+    ]
+    assert manifest["pages"]["Foo"]["checked"] == ["Bar", "Missing"]
+
+    # Nothing changed.
+    assert build(str(src), str(out)) == BuildResult(3, 0, 0, 0)
+
+
+def test_build_page(tmp_path):
+    """Only pages which changed are rendered."""
+    src, out = _wiki(tmp_path)
+    build(str(src), str(out))
+
+    _write(src / "Main" / "Bar.wiki", "Just '''Bar''' (edited)")
+    assert build(str(src), str(out)) == BuildResult(3, 1, 1, 0)
+    assert (out / "Bar.html").read_text() == "<p>Just <b>Bar</b> (edited)</p>"
+
+    # Changes which do not change the output are not written.
+    _write(src / "Main" / "Bar.wiki", "Just '''Bar''' (edited)<!-- Comment -->")
+    assert build(str(src), str(out)) == BuildResult(3, 1, 0, 0)
+
+
+def test_build_template(tmp_path):
+    """Pages which transclude a template (indirectly) are rendered when it changes."""
+    src, out = _wiki(tmp_path)
+    build(str(src), str(out))
+
+    _write(
+        src / "Template" / "Echo.wiki",
+        "<!-- Echo -->{{{1}}}?<noinclude>Docs</noinclude>",
+    )
+    assert build(str(src), str(out)) == BuildResult(3, 2, 2, 0)
+    assert (out / "Bar" / "doc.html").read_text() == "<p>Say <b>Hi</b><p>?</p></p>"
+
+    # Changes to what is not transcluded do not affect the pages.
+    _write(
+        src / "Template" / "Echo.wiki",
+        "<!-- Echoes -->{{{1}}}?<noinclude>More docs</noinclude>",
+    )
+    assert build(str(src), str(out)) == BuildResult(3, 0, 0, 0)
+
+
+def test_build_template_comment(tmp_path):
+    """Adding a comment to a template can change the whitespace around it."""
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src / "Template" / "T.wiki", "x\n\ny")
+    _write(src / "Main" / "Page.wiki", "{{T}}")
+    build(str(src), str(out))
+    assert (out / "Page.html").read_text() == "<p>x\n</p><p>y</p>"
+
+    _write(src / "Template" / "T.wiki", "x\n<!--c-->\ny")
+    assert build(str(src), str(out)) == BuildResult(1, 1, 1, 0)
+    assert (out / "Page.html").read_text() == "<p>x\ny</p>"
+
+
+def test_build_existence(tmp_path):
+    """Pages are rendered when articles they depend on are created or removed."""
+    src, out = _wiki(tmp_path)
+    build(str(src), str(out))
+
+    # The red link is now a link.
+    _write(src / "Main" / "Missing.wiki", "Found")
+    assert build(str(src), str(out)) == BuildResult(4, 2, 2, 0)
+    assert "redlink" not in (out / "Foo.html").read_text()
+
+    (src / "Main" / "Missing.wiki").unlink()
+    (src / "Template" / "Shout.wiki").unlink()
+    assert build(str(src), str(out)) == BuildResult(3, 2, 2, 1)
+    assert not (out / "Missing.html").exists()
+    assert "redlink" in (out / "Foo.html").read_text()
+    assert "Template:Shout" in (out / "Bar" / "doc.html").read_text()
+
+
+def test_build_titles(tmp_path):
+    """Pages are found by their file, even if the name contains a colon."""
+    src, out = _wiki(tmp_path)
+    _write(src / "Main" / "Foo:_bar.wiki", "Colon")
+    # A page which cannot be rendered does not stop the build.
+    (src / "Main" / "Invalid.wiki").write_bytes(b"\xff")
+
+    result = build(str(src), str(out))
+    assert result[:4] == (5, 4, 4, 0)
+    ((full_title, error),) = result.failed
+    assert full_title == "Invalid"
+    assert error.startswith("UnicodeDecodeError: ")
+    assert (out / "Foo:_bar.html").read_text() == "<p>Colon</p>"
+    # It is rendered again by the next build.
+    assert build(str(src), str(out)) == result._replace(rendered=0, written=0)
+
+
+def test_build_file_names(tmp_path):
+    """Pages are read from their file, even if the name is not canonical."""
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src / "Main" / "foo.wiki", "Lower")
+    _write(src / "Main" / "Bar__Baz.wiki", "Doubled")
+
+    assert build(str(src), str(out)) == BuildResult(2, 2, 2, 0)
+    assert (out / "foo.html").read_text() == "<p>Lower</p>"
+    assert (out / "Bar__Baz.html").read_text() == "<p>Doubled</p>"
+
+    _write(src / "Main" / "foo.wiki", "Still lower")
+    assert build(str(src), str(out)) == BuildResult(2, 1, 1, 0)
+    assert (out / "foo.html").read_text() == "<p>Still lower</p>"
+
+
+def test_build_full(tmp_path):
+    """All pages can be rendered, but unchanged files are not written."""
+    src, out = _wiki(tmp_path)
+    build(str(src), str(out))
+
+    assert build(str(src), str(out), full=True) == BuildResult(3, 3, 0, 0)
+    # A different configuration renders everything.
+    assert build(str(src), str(out), base_url="/w/") == BuildResult(3, 3, 1, 0)
+    assert '<a href="/w/Bar"' in (out / "Foo.html").read_text()
@@ -0,0 +1,274 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pickle
+import sys
+
+import mwparserfromhell
+
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+from mwcomposerfromhell.cache import (
+    LRUCache,
+    ParseCache,
+    TemplateCache,
+    TemplateExpansion,
+)
+
+
+def _expansion(html):
+    return TemplateExpansion(html, frozenset())
+
+
+def _get_resolver(templates, template_cache):
+    resolver = ArticleResolver(template_cache=template_cache)
+    resolver.add_namespace(
+        "Template",
+        Namespace(
+            {
+                name: mwparserfromhell.parse(template)
+                for name, template in templates.items()
+            }
+        ),
+    )
+    return resolver
+
+
+def test_cache_eviction():
+    """The entries which are cheapest to re-render (per size) are evicted."""
+    cache = TemplateCache(max_size=10)
+    cache.put("cheap", _expansion("aaaa"), cost=1.0)
+    cache.put("expensive", _expansion("bbbb"), cost=100.0)
+    cache.put("new", _expansion("cccc"), cost=10.0)
+
+    assert cache.get("cheap") is None
+    assert cache.get("expensive") == _expansion("bbbb")
+    assert cache.get("new") == _expansion("cccc")
+    assert cache.size == 8
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_cache_size():
+    """Large entries are evicted before small ones of the same cost."""
+    cache = TemplateCache(max_size=20)
+    cache.put("large", _expansion("a" * 10), cost=1.0)
+    cache.put("small", _expansion("b"), cost=1.0)
+    cache.put("new", _expansion("c" * 10), cost=1.0)
+
+    assert len(cache) == 2
+    assert cache.get("large") is None
+    assert cache.get("small") is not None
+
+
+def test_cache_too_large():
+    """An entry larger than the cache is not stored."""
+    cache = TemplateCache(max_size=1)
+    cache.put("large", _expansion("aa"), cost=1.0)
+    assert len(cache) == 0
+
+
+def test_cache_templates():
+    """Expanded templates are re-used between renders."""
+    cache = TemplateCache()
+    resolver = _get_resolver(
+        {"temp": "This is a {{{1}}} {{inner}}", "inner": "test"}, cache
+    )
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+
+    wikicode = mwparserfromhell.parse("{{temp|foo}} {{temp|bar}} {{temp|foo}}")
+    expected = WikicodeToHtmlComposer(
+        resolver=_get_resolver(
+            {"temp": "This is a {{{1}}} {{inner}}", "inner": "test"}, None
+        )
+    ).compose(wikicode)
+    assert composer.compose(wikicode) == expected
+    # The inner template and the repeated call are re-used.
+    assert cache.hits == 2
+    assert len(cache) == 3
+
+    # All template calls are cached.
+    assert composer.compose(wikicode) == expected
+    assert cache.hits == 5
+
+
+def test_cache_volatile():
+    """Templates which use magic words are not cached."""
+    cache = TemplateCache()
+    resolver = _get_resolver({"temp": "{{CURRENTYEAR}}"}, cache)
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+    composer.compose(mwparserfromhell.parse("{{temp}}"))
+    assert len(cache) == 0
+
+
+def test_cache_template_loop():
+    """A cached template which would cause a loop is not used."""
+    cache = TemplateCache()
+    resolver = _get_resolver({"x": "{{y|stop}}", "y": "{{{1|{{x}}}}}"}, cache)
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+
+    # The template is cached from a call which does not loop.
+    assert composer.compose(mwparserfromhell.parse("{{x}}")) == "stop"
+    # Calling it from the template it transcludes is a loop.
+    assert "Template loop detected" in composer.compose(mwparserfromhell.parse("{{y}}"))
+
+
+def test_cache_invalidated():
+    """Adding a namespace clears the cache."""
+    cache = TemplateCache()
+    resolver = _get_resolver({"temp": "foo"}, cache)
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+    composer.compose(mwparserfromhell.parse("{{temp}}"))
+    assert len(cache) == 1
+
+    resolver.add_namespace("Template", Namespace({"temp": "bar"}))
+    assert len(cache) == 0
+
+
+def test_dedupe_templates():
+    """Identical template calls are only expanded once in a render."""
+    resolver = _get_resolver({"temp": "This is a {{{1}}}"}, None)
+    composer = WikicodeToHtmlComposer(resolver=resolver, dedupe_templates=True)
+
+    wikicode = mwparserfromhell.parse("{{temp|foo}} {{temp|foo}} {{temp|bar}}")
+    expected = WikicodeToHtmlComposer(resolver=resolver).compose(wikicode)
+    assert composer.compose(wikicode) == expected
+    assert len(composer._render_cache) == 2
+
+
+def test_lru_cache():
+    """The least recently used entries are evicted."""
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_rate == 0.75
+
+    # Nothing is cached with a size of 0.
+    cache = LRUCache(max_size=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_lru_cache_sizes():
+    """Entries can have different sizes."""
+    cache = LRUCache(max_size=10)
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    cache.put("c", 3)
+    assert cache.size == 9
+
+    # Replacing an entry updates the size.
+    cache.put("c", 3, 2)
+    assert cache.size == 10
+
+    # Entries are evicted until the new entry fits.
+    cache.put("d", 4, 5)
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.size == 7
+
+    # Entries which are too big are not cached.
+    cache.put("e", 5, 11)
+    assert cache.get("e") is None
+
+    cache.discard("d")
+    cache.discard("d")
+    assert cache.size == 2
+    cache.clear()
+    assert cache.size == 0
+
+
+def _hammer(function):
+    """Call a function from many threads, switching between them often."""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(function, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_lru_cache_threads():
+    """The size of the cache stays consistent when it is shared between threads."""
+    cache = LRUCache(max_size=50)
+
+    def work(thread):
+        for it in range(5000):
+            cache.put(it % 60, it)
+            if it % 10 == thread:
+                cache.get(it % 60)
+                cache.discard((it + 1) % 60)
+
+    _hammer(work)
+    assert cache.size == len(cache)
+
+    # The cache can be pickled (without its lock).
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.size == cache.size
+    copy.put("new", 1)
+    assert copy.get("new") == 1
+
+
+def test_template_cache_threads():
+    """The size of the cache stays consistent when it is shared between threads."""
+    cache = TemplateCache(max_size=100)
+
+    def work(thread):
+        for it in range(2000):
+            key = (it * 7 + thread) % 80
+            cache.put(key, _expansion("x" * (key % 5 + 1)), 1.0)
+            cache.get(key + 1)
+            if it % 10 == 0:
+                cache.discard(key + 2)
+
+    _hammer(work)
+    assert cache.size == sum(entry.size for entry in cache._entries.values())
+    assert cache.size <= 100
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.size == cache.size
+    copy.put("new", _expansion("new"), 1.0)
+    assert copy.get("new") == _expansion("new")
+
+
+def test_parse_cache(tmp_path):
+    """Parsed wikicode is stored on disk and re-used by other caches."""
+    text = "{{foo|bar}} [[baz]] ''qux''"
+    cache = ParseCache(str(tmp_path))
+    assert str(cache.parse(text)) == text
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # A new cache (e.g. in a new process) finds the parsed wikicode.
+    cache = ParseCache(str(tmp_path))
+    wikicode = cache.parse(text)
+    assert str(wikicode) == text
+    assert wikicode.filter_templates()[0].name == "foo"
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    # Different source is parsed.
+    assert str(cache.parse(text + "!")) == text + "!"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_parse_cache_corrupt(tmp_path):
+    """Corrupt files are replaced."""
+    cache = ParseCache(str(tmp_path))
+    cache.parse("foo")
+    (path,) = [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(tmp_path)
+        for name in names
+    ]
+    with open(path, "wb") as f:
+        f.write(b"corrupt")
+
+    assert str(cache.parse("foo")) == "foo"
+    assert str(ParseCache(str(tmp_path)).parse("foo")) == "foo"
+    assert cache.misses == 2
@@ -1,8 +1,21 @@
+from io import StringIO
+import sys
+
 import mwparserfromhell
+from mwparserfromhell import nodes
+from mwparserfromhell.wikicode import Wikicode
 import pytest
 
-from mwcomposerfromhell import compose, WikicodeToHtmlComposer
-from mwcomposerfromhell.composer import UnknownNode
+from mwcomposerfromhell import (
+    ArticleResolver,
+    compose,
+    compose_iter,
+    compose_to,
+    Namespace,
+    WikicodeToHtmlComposer,
+)
+from mwcomposerfromhell.composer import MaxDepthExceeded, UnknownNode
+from mwcomposerfromhell.nodes import Wikilink
 
 
 def test_formatting():
@@ -51,6 +64,29 @@ def test_link_trail_text():
     assert compose(wikicode) == '<p><a href="/wiki/Foo" title="Foo">foobar</a></p>'
 
 
+def test_link_trail_node():
+    """A link trail can also be part of the node."""
+    wikicode = Wikicode([Wikilink("Foo", trail="bar")])
+    assert compose(wikicode) == '<p><a href="/wiki/Foo" title="Foo">Foobar</a></p>'
+
+
+def test_link_trail_comments():
+    """A link trail is found in text which is split by comments."""
+    content = "[[Foo]]ba<!-- comment -->r baz<!-- comment --> qux"
+    wikicode = mwparserfromhell.parse(content)
+    assert (
+        compose(wikicode) == '<p><a href="/wiki/Foo" title="Foo">Fooba</a>r baz qux</p>'
+    )
+    # The nodes are not modified.
+    assert str(wikicode) == content
+
+
+def test_comments():
+    """Text split by many comments is combined."""
+    wikicode = mwparserfromhell.parse("foo <!-- comment --> " * 1000)
+    assert compose(wikicode) == "<p>" + "foo  " * 1000 + "</p>"
+
+
 def test_heading():
     """Test a heading."""
     content = "=== Foobar ==="
@@ -90,6 +126,20 @@ def test_preformatted_complicated():
     )
 
 
+def test_preformatted_whitespace_line():
+    """Lines which are only whitespace continue preformatted text."""
+    content = "foo\n bar\n   \n baz\nqux"
+    wikicode = mwparserfromhell.parse(content)
+    assert compose(wikicode) == "<p>foo\n<pre>bar\n  \nbaz\n</pre>qux</p>"
+
+
+def test_preformatted_line_boundary():
+    """Lines can be separated by other line boundaries than new-lines."""
+    content = "foo\r bar"
+    wikicode = mwparserfromhell.parse(content)
+    assert compose(wikicode) == "<p>foo\r<pre>bar</pre>\n</p>"
+
+
 def test_pre():
     """pre is similar to nowiki"""
     content = """<pre><!--Comment-->
@@ -138,3 +188,139 @@ def test_invalid_resolver():
     """An unknown resolver type should raise an error."""
     with pytest.raises(ValueError):
         WikicodeToHtmlComposer(resolver="")
+
+
+def test_compose_iter():
+    """Chunks are generated for each top-level node."""
+    content = "* Foo\n\nBar ''baz''"
+    wikicode = mwparserfromhell.parse(content)
+    chunks = list(compose_iter(wikicode))
+    assert len(chunks) > 1
+    assert "".join(chunks) == compose(wikicode)
+
+
+def test_compose_to():
+    """The HTML can be written to a file-like object."""
+    content = "{|\n|-\n| Foo || Bar\n|}\n\n''baz''"
+    wikicode = mwparserfromhell.parse(content)
+    sink = StringIO()
+    compose_to(wikicode, sink)
+    assert sink.getvalue() == compose(wikicode)
+
+
+def test_register_handler():
+    """A handler can be registered to override how a node is rendered."""
+
+    def visit_entity(composer, node, out, in_root, ignore_whitespace):
+        out.append(node.normalize())
+
+    composer = WikicodeToHtmlComposer()
+    composer.register_handler(nodes.HTMLEntity, visit_entity)
+    wikicode = mwparserfromhell.parse("&Sigma;")
+    assert composer.compose(wikicode) == "Σ"
+
+
+def test_register_handler_text():
+    """A handler for text also renders the blank lines between table cells."""
+    seen = []
+
+    def visit_text(composer, node, out, in_root, ignore_whitespace):
+        seen.append(node.value)
+        return WikicodeToHtmlComposer.visit_Text(
+            composer, node, out, in_root, ignore_whitespace
+        )
+
+    table = "{|\n| Foo\n| Bar\n|}"
+    for compile_templates in (False, True):
+        resolver = ArticleResolver(compile_templates=compile_templates)
+        resolver.add_namespace(
+            "Template", Namespace({"Table": mwparserfromhell.parse(table)})
+        )
+        composer = WikicodeToHtmlComposer(resolver=resolver)
+        composer.register_handler(nodes.Text, visit_text)
+        for text in (table, "{{table}}"):
+            seen.clear()
+            composer.compose(mwparserfromhell.parse(text))
+            assert "\n" in seen
+
+
+def test_register_handler_new_node():
+    """A handler can be registered for unknown node types."""
+
+    class Custom(nodes.Node):
+        def __str__(self):
+            return "custom"
+
+    def visit_custom(composer, node, out, in_root, ignore_whitespace):
+        out.append("<custom />")
+
+    composer = WikicodeToHtmlComposer()
+    with pytest.raises(UnknownNode):
+        composer.compose(Wikicode([Custom()]))
+
+    composer = WikicodeToHtmlComposer()
+    composer.register_handler(Custom, visit_custom)
+    assert composer.compose(Wikicode([Custom()])) == "<custom />"
+
+
+def test_node_subclass():
+    """A sub-class of a known node uses the handler of the known node."""
+
+    class CustomText(nodes.Text):
+        pass
+
+    assert compose(Wikicode([CustomText("foo")])) == "<p>foo</p>"
+
+
+def test_register_handler_generator():
+    """A handler can request other nodes to be visited by yielding them."""
+
+    def visit_heading(composer, node, out, in_root, ignore_whitespace):
+        out.append("<strong>")
+        yield node.title, out, False, False
+        out.append("</strong>")
+
+    wikicode = mwparserfromhell.parse("== Foo ''bar'' ==")
+    for iterative in (False, True):
+        composer = WikicodeToHtmlComposer(iterative=iterative)
+        composer.register_handler(nodes.Heading, visit_heading)
+        assert composer.compose(wikicode) == "<strong> Foo <i>bar</i> </strong>"
+
+
+def _nested_tags(depth):
+    """Generate a tree of nested tags."""
+    tree = mwparserfromhell.parse("foo")
+    for _ in range(depth):
+        tree = Wikicode([nodes.Tag(mwparserfromhell.parse("div"), contents=tree)])
+    return tree
+
+
+def test_iterative():
+    """Rendering iteratively gives the same result as rendering recursively."""
+    wikicode = mwparserfromhell.parse(
+        "== Heading ==\n* ''Item'' [[Foo|bar]]\n{|\n| cell\n|}\n<div>[http://x.org x]</div>"
+    )
+    composer = WikicodeToHtmlComposer(iterative=True)
+    assert composer.compose(wikicode) == compose(wikicode)
+
+
+def test_iterative_deep():
+    """Rendering iteratively is not limited by the recursion limit."""
+    depth = sys.getrecursionlimit() * 2
+    composer = WikicodeToHtmlComposer(iterative=True, max_depth=depth * 3)
+    result = composer.compose(_nested_tags(depth))
+    assert result == "<div>" * depth + "foo" + "</div>" * depth
+
+    # A recursive composer is unable to render this.
+    with pytest.raises(RecursionError):
+        compose(_nested_tags(depth))
+
+
+def test_max_depth():
+    """Rendering iteratively has a maximum depth."""
+    composer = WikicodeToHtmlComposer(iterative=True, max_depth=20)
+    with pytest.raises(MaxDepthExceeded):
+        composer.compose(_nested_tags(20))
+
+    # The composer can be re-used afterwards.
+    assert composer.compose(_nested_tags(2)) == "<div><div>foo</div></div>"
@@ -0,0 +1,198 @@
+import mwparserfromhell
+import pytest
+
+from mwcomposerfromhell import (
+    ArticleResolver,
+    Namespace,
+    TemplateCache,
+    WikicodeToHtmlComposer,
+)
+from mwcomposerfromhell.dependencies import Dependencies, DependencyIndex
+from mwcomposerfromhell.lazy import CompressedNamespace, DirectoryNamespace
+from mwcomposerfromhell.namespace import OverlayNamespace
+
+
+def _get_resolver(**kwargs):
+    resolver = ArticleResolver(**kwargs)
+    resolver.add_namespace(
+        "Template",
+        Namespace(
+            {
+                "Outer": mwparserfromhell.parse("{{inner|{{{1}}}}} [[Linked]]"),
+                "Inner": mwparserfromhell.parse("''{{{1}}}'' [[Other]]"),
+            }
+        ),
+    )
+    resolver.add_namespace("", Namespace({"Other": mwparserfromhell.parse("")}))
+    return resolver
+
+
+def _titles(dependencies):
+    return tuple(
+        sorted(canonical_title.full_title for canonical_title in titles)
+        for titles in (
+            dependencies.transcluded,
+            dependencies.checked,
+            dependencies.linked,
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "resolver_kwargs,composer_kwargs",
+    [
+        ({}, {}),
+        ({"template_cache": TemplateCache()}, {}),
+        ({"compile_templates": True}, {}),
+        ({}, {"dedupe_templates": True}),
+    ],
+)
+def test_dependencies(resolver_kwargs, composer_kwargs):
+    """The articles each render depends on are recorded."""
+    composer = WikicodeToHtmlComposer(
+        resolver=_get_resolver(**resolver_kwargs), red_links=True, **composer_kwargs
+    )
+    wikicode = mwparserfromhell.parse("{{outer|a}} {{outer|a}} {{missing}} [[Page]]")
+
+    # Cached templates (or plans) are used by the second render.
+    for _ in range(2):
+        composer.compose(wikicode)
+        assert _titles(composer.dependencies) == (
+            ["Template:Inner", "Template:Missing", "Template:Outer"],
+            ["Linked", "Other", "Page"],
+            ["Linked", "Other", "Page"],
+        )
+
+    composer.compose(mwparserfromhell.parse("Text"))
+    assert _titles(composer.dependencies) == ([], [], [])
+
+
+def test_dependencies_recorded():
+    """The dependencies of static nodes are recorded with their output."""
+    resolver = ArticleResolver(compile_templates=True)
+    resolver.add_namespace(
+        "Template",
+        Namespace({"Title": mwparserfromhell.parse('<span title="[[Foo]]">x</span>')}),
+    )
+    composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+    wikicode = mwparserfromhell.parse("Say {{title}} [[Bar]]")
+
+    for _ in range(2):
+        composer.compose(wikicode)
+        assert _titles(composer.dependencies) == (
+            ["Template:Title"],
+            ["Bar", "Foo"],
+            ["Bar", "Foo"],
+        )
+
+
+def test_full_titles():
+    """Interwiki links are not included in the full titles."""
+    composer = WikicodeToHtmlComposer(resolver=_get_resolver())
+    composer.compose(mwparserfromhell.parse("{{inner|a}} [[:en:Foo]]"))
+    assert composer.dependencies.full_titles() == {"Template:Inner", "Other"}
+
+
+def test_dependency_index():
+    """The pages depending on an article are found."""
+    resolver = _get_resolver()
+    composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+    index = DependencyIndex()
+    pages = {"A": "{{outer|a}}", "B": "{{inner|b}}", "C": "Text"}
+
+    def render(page):
+        composer.compose(mwparserfromhell.parse(pages[page]))
+        index.add(page, composer.dependencies)
+
+    for page in pages:
+        render(page)
+    # Without red links, links do not depend on the article.
+    other_composer = WikicodeToHtmlComposer(resolver=resolver)
+    other_composer.compose(mwparserfromhell.parse("See [[Other]]"))
+    index.add("D", other_composer.dependencies)
+
+    assert len(index) == 4
+    assert "A" in index
+    assert index.dependencies("B") == {"Template:Inner", "Other"}
+    assert index.dependencies("D") == set()
+    assert index.dependents("Template:Inner") == {"A", "B"}
+    assert index.dependents("Template:Outer") == {"A"}
+    assert index.dependents("Other") == {"A", "B"}
+    assert index.dependents("Template:Unused") == set()
+    assert index.linked_from("Other") == {"A", "B", "D"}
+    assert index.affected(["Template:Outer", "Other"]) == {"A"}
+    assert index.affected(["Template:Outer", "Other"], existence=True) == {"A", "B"}
+    assert index.stale(resolver) == set()
+
+    # Changing an article makes the pages transcluding it stale.
+    resolver._namespaces["Template"]["Inner"] = mwparserfromhell.parse("Changed")
+    assert index.stale(resolver) == {"A", "B"}
+    for page in ("A", "B"):
+        render(page)
+    assert index.stale(resolver) == set()
+    # But not the pages which only link to it.
+    resolver._namespaces[""]["Other"] = mwparserfromhell.parse("Changed")
+    assert index.stale(resolver) == set()
+    # Creating an article makes the pages which checked its existence stale.
+    resolver._namespaces[""]["Linked"] = mwparserfromhell.parse("New")
+    assert index.stale(resolver) == {"A"}
+
+    # Re-adding a page replaces its dependencies.
+    index.add("B", Dependencies())
+    assert index.dependents("Template:Inner") == {"A"}
+    index.remove("A")
+    index.remove("A")
+    assert index.dependents("Template:Inner") == set()
+    assert index.linked_from("Other") == {"D"}
+    assert len(index) == 3
+
+
+def test_dependency_index_rendered():
+    """The revisions which were rendered are recorded, not the current ones."""
+    resolver = _get_resolver()
+    composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+    composer.compose(mwparserfromhell.parse("{{inner|a}} [[New]]"))
+
+    # The articles change before the dependencies are added.
+    resolver._namespaces["Template"]["Inner"] = mwparserfromhell.parse("Changed")
+    resolver._namespaces[""]["New"] = mwparserfromhell.parse("New")
+    index = DependencyIndex()
+    index.add("A", composer.dependencies)
+    assert index.stale(resolver) == {"A"}
+
+    assert composer.dependencies.checked == {
+        resolver.resolve_article("New", ""): False,
+        resolver.resolve_article("Other", ""): True,
+    }
+
+
+def test_revisions(tmp_path):
+    """The revisions of articles change when they change."""
+    namespace = Namespace({"Foo": mwparserfromhell.parse("Foo")})
+    revision = namespace.get_revision("foo")
+    assert revision is not None
+    assert namespace.get_revision("Bar") is None
+    namespace["Foo"] = mwparserfromhell.parse("Foo")
+    assert namespace.get_revision("Foo") != revision
+
+    overlay = OverlayNamespace([namespace])
+    assert overlay.get_revision("Foo") == namespace.get_revision("Foo")
+    overlay["Foo"] = mwparserfromhell.parse("Foo")
+    assert overlay.get_revision("Foo") != namespace.get_revision("Foo")
+    assert overlay.get_revision("Bar") is None
+
+    compressed = CompressedNamespace({"Foo": "Foo"})
+    revision = compressed.get_revision("Foo")
+    assert revision is not None
+    compressed.add_source("Foo", "Bar")
+    assert compressed.get_revision("Foo") != revision
+    assert compressed.get_revision("Bar") is None
+
+    path = tmp_path / "Foo.wiki"
+    path.write_text("Foo", encoding="utf-8")
+    directory = DirectoryNamespace(str(tmp_path))
+    revision = directory.get_revision("Foo")
+    assert revision is not None
+    path.write_text("Foo bar", encoding="utf-8")
+    assert directory.get_revision("Foo") != revision
+    assert directory.get_revision("Bar") is None
@@ -0,0 +1,132 @@
+import mwparserfromhell
+import pytest
+
+from mwcomposerfromhell import ArticleResolver, ParseCache, WikicodeToHtmlComposer
+from mwcomposerfromhell.lazy import (
+    CompressedNamespace,
+    DirectoryNamespace,
+    LazyNamespace,
+)
+from mwcomposerfromhell.namespace import FrozenError
+
+
+def test_directory(tmp_path):
+    """Articles are parsed from files when they are first used."""
+    (tmp_path / "Foo_bar.wiki").write_text("''Foo'' bar", encoding="utf-8")
+    (tmp_path / "Foo_bar").mkdir()
+    (tmp_path / "Foo_bar" / "doc.wiki").write_text("Docs", encoding="utf-8")
+    namespace = DirectoryNamespace(str(tmp_path), cache_size=2)
+
+    article = namespace["foo bar"]
+    assert str(article) == "''Foo'' bar"
+    assert namespace["Foo_bar"] is article
+    assert str(namespace["Foo bar/doc"]) == "Docs"
+
+    for key in ("Missing", "Foo bar/", "../Foo bar", "/Foo bar", "Foo bar/."):
+        with pytest.raises(KeyError):
+            namespace[key]
+
+    assert namespace.exists_many(["foo bar", "Foo bar/doc", "Missing", ".."]) == {
+        "foo bar",
+        "Foo bar/doc",
+    }
+
+
+def test_directory_cache(tmp_path):
+    """A bounded number of parsed articles are kept."""
+    for name in ("A", "B", "C"):
+        (tmp_path / f"{name}.wiki").write_text(name, encoding="utf-8")
+    namespace = DirectoryNamespace(str(tmp_path), cache_size=2)
+
+    a = namespace["A"]
+    namespace["B"]
+    namespace["C"]
+    assert len(namespace.cache) == 2
+    # A was evicted and gets parsed again.
+    assert namespace["A"] is not a
+    assert namespace["C"] is namespace["C"]
+
+    # Articles which are set are kept in memory.
+    d = mwparserfromhell.parse("D")
+    namespace["D"] = d
+    assert namespace["D"] is d
+
+
+def test_lazy_abstract():
+    """Sub-classes must implement _load."""
+
+    class Incomplete(LazyNamespace):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_directory_resolver(tmp_path):
+    """Templates are transcluded from files."""
+    (tmp_path / "Echo.wiki").write_text("{{{1}}}!", encoding="utf-8")
+    resolver = ArticleResolver()
+    resolver.add_namespace("Template", DirectoryNamespace(str(tmp_path)))
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+    assert composer.compose(mwparserfromhell.parse("{{echo|Hi}}")) == "Hi<p>!</p>"
+
+
+def test_directory_parse_cache(tmp_path):
+    """Articles can be parsed via a cache on disk."""
+    (tmp_path / "articles").mkdir()
+    (tmp_path / "articles" / "Foo.wiki").write_text("''Foo''", encoding="utf-8")
+    parse_cache = ParseCache(str(tmp_path / "cache"))
+
+    for _ in range(2):
+        namespace = DirectoryNamespace(
+            str(tmp_path / "articles"), parse_cache=parse_cache
+        )
+        assert str(namespace["Foo"]) == "''Foo''"
+    assert (parse_cache.hits, parse_cache.misses) == (1, 1)
+
+
+def test_compressed():
+    """Articles are stored compressed and parsed when used."""
+    namespace = CompressedNamespace({"foo": "''Foo'' " * 100})
+    assert namespace.compressed_size < len("''Foo'' " * 100)
+    assert namespace.resident_size == 0
+
+    article = namespace["Foo"]
+    assert str(article) == "''Foo'' " * 100
+    assert namespace["Foo"] is article
+    assert namespace.resident_size > 0
+    assert namespace.miss_rate == 0.5
+
+    with pytest.raises(KeyError):
+        namespace["Bar"]
+    with pytest.raises(KeyError):
+        namespace["Baz"]
+    # Articles which do not exist are not counted.
+    assert namespace.miss_rate == 0.5
+    assert namespace.parses == 1
+    assert namespace.exists_many(["foo", "Bar"]) == {"foo"}
+
+    # Replacing the source drops the parsed article.
+    namespace.add_source("Foo", "Bar")
+    assert str(namespace["Foo"]) == "Bar"
+
+    namespace.freeze()
+    with pytest.raises(FrozenError):
+        namespace.add_source("Foo", "Baz")
+
+
+def test_compressed_budget():
+    """Parsed articles are evicted once they exceed the memory budget."""
+    namespace = CompressedNamespace(
+        {name: f"[[{name}]] " * 10 for name in "ABC"}, memory_budget=20000
+    )
+    for name in "ABC":
+        namespace[name]
+    assert 0 < namespace.resident_size <= 20000
+    assert len(namespace.cache) < 3
+
+    # Nothing fits in a budget of 0.
+    namespace = CompressedNamespace({"A": "a"}, memory_budget=0)
+    assert namespace["A"] is not namespace["A"]
+    assert namespace.resident_size == 0
+    assert namespace.miss_rate == 1.0
@@ -0,0 +1,74 @@
+from io import StringIO
+
+import mwparserfromhell
+
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+
+
+class CountingNamespace(Namespace):
+    """A namespace which counts how often it is asked whether articles exist."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = 0
+
+    def __getitem__(self, key):
+        raise AssertionError("Articles should not be fetched")
+
+    def exists_many(self, keys):
+        self.lookups += 1
+        return {key for key in keys if key in self._articles}
+
+
+def _composer():
+    namespace = CountingNamespace({"Foo": mwparserfromhell.parse("")})
+    resolver = ArticleResolver()
+    resolver.add_namespace("", namespace)
+    return namespace, WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+
+
+def test_red_links():
+    """Links to articles which do not exist are links to the edit page."""
+    _, composer = _composer()
+    wikicode = mwparserfromhell.parse("[[Foo]] [[Bar|bar]]s")
+    assert composer.compose(wikicode) == (
+        '<p><a href="/wiki/Foo" title="Foo">Foo</a> '
+        '<a href="/index.php?title=Bar&amp;action=edit&amp;redlink=1" class="new" '
+        'title="Bar (page does not exist)">bars</a></p>'
+    )
+
+
+def test_single_lookup():
+    """Whether the linked articles exist is checked once."""
+    namespace, composer = _composer()
+    wikicode = mwparserfromhell.parse(
+        "\n\n".join(f"[[Foo]] and [[Page {it}]]" for it in range(400))
+    )
+    html = composer.compose(wikicode)
+    assert namespace.lookups == 1
+    assert html.count('title="Foo"') == 400
+    assert html.count("(page does not exist)") == 400
+
+    # Streaming checks once per chunk.
+    namespace.lookups = 0
+    sink = StringIO()
+    composer.compose_to(wikicode, sink)
+    assert sink.getvalue() == html
+    assert namespace.lookups == 1
+
+
+def test_modified_values():
+    """Links in values which get modified are replaced before modifying them."""
+    _, composer = _composer()
+    wikicode = mwparserfromhell.parse('<span title="[[Foo]] & bar" [[foo]]>x</span>')
+    assert composer.compose(wikicode) == (
+        '<p><span title="<a href="/wiki/Foo" title="Foo">Foo</a> & bar" '
+        '<a href="/wiki/foo" title="foo">foo</a>="">x</span></p>'
+    )
+
+
+def test_forged_placeholder():
+    """Placeholders cannot be included in articles."""
+    _, composer = _composer()
+    wikicode = mwparserfromhell.parse("\x7fLINK-0123456789abcdef::Foo:\x7f")
+    assert composer.compose(wikicode) == "<p>\x7fLINK-0123456789abcdef::Foo:\x7f</p>"
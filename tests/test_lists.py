@@ -118,3 +118,15 @@ def test_html():
     content = """<ul><li>foo</li><li>bar</li></ul>"""
     wikicode = mwparserfromhell.parse(content)
     assert compose(wikicode) == content
+
+
+def test_deep_list():
+    """Deeply nested list items only re-open the innermost lists which differ."""
+    content = "*" * 10 + " a\n" + "*" * 10 + " b\n" + "*" * 9 + "# c"
+    wikicode = mwparserfromhell.parse(content)
+    assert (
+        compose(wikicode)
+        == "<ul><li>" * 10
+        + " a\n</li><li> b\n</li></ul><ol><li> c</li></ol>"
+        + "</li></ul>" * 9
+    )
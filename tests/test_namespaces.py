@@ -1,13 +1,18 @@
+import gc
+import pickle
 from typing import Union
 
 import mwparserfromhell
 import pytest
 
+from mwcomposerfromhell import BloomFilter, TemplateCache, WikicodeToHtmlComposer
 from mwcomposerfromhell.namespace import (
     ArticleNotFound,
     ArticleResolver,
     CanonicalTitle,
+    FrozenError,
     Namespace,
+    OverlayNamespace,
 )
 
 
@@ -241,3 +246,212 @@ def test_canonicalize_with_default_namespace(target, expected_interwiki, resolve
         "Main page",
         expected_interwiki,
     )
+
+
+def test_exists_many(resolver):
+    """Check whether many articles exist at once."""
+    titles = [
+        resolver.canonicalize_title(title)
+        for title in ("Main", "main", "Blah", "Template:Echo", "Fuzz:Bar")
+    ]
+    assert resolver.exists_many(titles) == {
+        CanonicalTitle("", "Main", ""),
+        CanonicalTitle("Template", "Echo", ""),
+    }
+
+
+def test_canonicalize_cached(resolver):
+    """Canonical titles and URLs are cached until namespaces are added."""
+    canonical_title = resolver.canonicalize_title("template:foo_bar")
+    assert resolver.canonicalize_title("template:foo_bar") is canonical_title
+    assert resolver.title_cache.hit_rate == 0.5
+
+    url = resolver.get_article_url(canonical_title)
+    assert url == "/wiki/Template:Foo_bar"
+    assert resolver.get_article_url(canonical_title) is url
+    assert resolver.get_edit_url(canonical_title) == (
+        "/index.php?title=Template:Foo_bar&amp;action=edit&amp;redlink=1"
+    )
+
+    # Adding a namespace can change the canonical title.
+    resolver.add_namespace("TEMPLATE", Namespace())
+    assert resolver.canonicalize_title("template:foo_bar") == CanonicalTitle(
+        "TEMPLATE", "Foo bar", ""
+    )
+
+
+def test_canonicalize_escaped(resolver):
+    """Entities and percent encoded characters are decoded."""
+    assert resolver.canonicalize_title("Foo%20&amp;_bar") == CanonicalTitle(
+        "", "Foo & bar", ""
+    )
+
+
+def _shout(param, context, parent_context):
+    return param.upper()
+
+
+def _hello():
+    return "Hello"
+
+
+def test_snapshot(tmp_path, resolver):
+    """A resolver can be saved and loaded."""
+    path = str(tmp_path / "resolver.snapshot")
+    resolver.add_parser_function("#shout", _shout)
+    resolver.add_magic_word("HELLO", _hello)
+    resolver.canonicalize_title("echo", "Template")
+    resolver.save(path)
+
+    loaded = ArticleResolver.load(path)
+    assert len(loaded.title_cache) == 0
+    assert str(loaded.get_article("Echo", "Template")) == "{{{1}}}"
+    assert str(loaded.get_article("Main")) == "Blah"
+    assert loaded.get_parser_function("#shout") is _shout
+    assert loaded.get_magic_word("HELLO") is _hello
+    assert loaded.get_magic_word("CURRENTYEAR") is resolver.get_magic_word(
+        "CURRENTYEAR"
+    )
+    assert loaded.link_holder_token == resolver.link_holder_token
+
+    composer = WikicodeToHtmlComposer(resolver=loaded)
+    assert (
+        composer.compose(mwparserfromhell.parse("{{#shout:hi}} {{HELLO}} {{echo|x}}"))
+        == "<p>HI Hello x</p>"
+    )
+
+
+def test_snapshot_caches(tmp_path):
+    """The caches can be included in a snapshot."""
+    path = str(tmp_path / "resolver.snapshot")
+    resolver = ArticleResolver(template_cache=TemplateCache(), title_cache_size=10)
+    resolver.add_namespace(
+        "Template", Namespace({"Echo": mwparserfromhell.parse("{{{1}}}")})
+    )
+    composer = WikicodeToHtmlComposer(resolver=resolver)
+    composer.compose(mwparserfromhell.parse("{{echo|x}}"))
+    assert len(resolver.template_cache) == 1
+
+    resolver.save(path)
+    loaded = ArticleResolver.load(path)
+    assert loaded.template_cache is not None
+    assert len(loaded.template_cache) == 0
+    assert loaded.template_cache.max_size == resolver.template_cache.max_size
+    assert loaded.title_cache.max_size == 10
+
+    resolver.save(path, include_caches=True)
+    loaded = ArticleResolver.load(path)
+    assert loaded.template_cache is not None
+    assert len(loaded.template_cache) == 1
+    assert len(loaded.title_cache) == len(resolver.title_cache) > 0
+
+
+def test_snapshot_invalid(tmp_path, resolver):
+    """Functions which cannot be imported are rejected."""
+    resolver.add_parser_function("shout", lambda param, *args: param.upper())
+    with pytest.raises(ValueError):
+        resolver.save(str(tmp_path / "resolver.snapshot"))
+
+    path = tmp_path / "other"
+    path.write_bytes(b"Not a snapshot")
+    with pytest.raises(ValueError):
+        ArticleResolver.load(str(path))
+
+
+def _dump_articles(resolver):
+    """Serialize the articles of each namespace."""
+    return pickle.dumps([ns._articles for ns in resolver._namespaces.values()])
+
+
+def test_freeze(resolver):
+    """A frozen resolver cannot be modified and rendering does not modify it."""
+    resolver.add_namespace(
+        "Template",
+        Namespace(
+            {
+                "Table": mwparserfromhell.parse(
+                    "{|\n|-\n| [[{{{1}}}]]s ''cell'' <!-- -->\n| cell\n|}"
+                ),
+                "Pre": mwparserfromhell.parse('<pre class="{{{1}}}">{{{1}}}</pre>'),
+            }
+        ),
+    )
+    before = _dump_articles(resolver)
+
+    resolver.freeze()
+    try:
+        assert gc.get_freeze_count() > 0
+        composer = WikicodeToHtmlComposer(resolver=resolver)
+        composer.compose(mwparserfromhell.parse("{{table|Foo}}\n* {{pre|bar}}"))
+        assert _dump_articles(resolver) == before
+
+        with pytest.raises(FrozenError):
+            resolver.add_namespace("Other", Namespace())
+        with pytest.raises(FrozenError):
+            resolver.add_parser_function("#shout", _shout)
+        with pytest.raises(FrozenError):
+            resolver.add_magic_word("HELLO", _hello)
+        with pytest.raises(FrozenError):
+            resolver._namespaces["Template"]["Foo"] = mwparserfromhell.parse("")
+    finally:
+        gc.unfreeze()
+
+
+def test_overlay_namespace():
+    """Articles are looked up in the overlay and then in each base."""
+    first = Namespace({"Foo": mwparserfromhell.parse("First foo")})
+    second = Namespace(
+        {
+            "Foo": mwparserfromhell.parse("Second foo"),
+            "Bar": mwparserfromhell.parse("Second bar"),
+        }
+    )
+    overlay = OverlayNamespace([first, second])
+    assert str(overlay["foo"]) == "First foo"
+    assert str(overlay["Bar"]) == "Second bar"
+    with pytest.raises(KeyError):
+        overlay["Baz"]
+
+    overlay["bar"] = mwparserfromhell.parse("Overlay bar")
+    overlay["Baz"] = mwparserfromhell.parse("Overlay baz")
+    assert str(overlay["Bar"]) == "Overlay bar"
+    assert str(second["Bar"]) == "Second bar"
+    assert overlay.exists_many(["foo", "bar", "Baz", "Qux"]) == {"foo", "bar", "Baz"}
+
+
+def test_overlay_resolver(resolver):
+    """An overlay resolver does not modify the resolver it was created from."""
+    resolver.existence_index = BloomFilter.from_titles(
+        ["Foo", "Main", "Template:Echo", "Template:Foo"], 10
+    )
+    preview = resolver.overlay(
+        {
+            "Template:Echo": mwparserfromhell.parse("{{{1}}}{{{1}}}"),
+            "New": mwparserfromhell.parse("New"),
+        }
+    )
+
+    wikicode = mwparserfromhell.parse("Say {{echo|Hi}} [[New]]")
+    composer = WikicodeToHtmlComposer(resolver=preview, red_links=True)
+    assert (
+        composer.compose(wikicode)
+        == '<p>Say HiHi <a href="/wiki/New" title="New">New</a></p>'
+    )
+    composer = WikicodeToHtmlComposer(resolver=resolver, red_links=True)
+    assert composer.compose(wikicode) == (
+        '<p>Say Hi <a href="/index.php?title=New&amp;action=edit&amp;redlink=1" '
+        'class="new" title="New (page does not exist)">New</a></p>'
+    )
+
+    # Articles which were not replaced come from the resolver.
+    assert str(preview.get_article("Main")) == "Blah"
+    assert str(preview.get_article("Foo", "Template")) == "This is a template"
+
+    # Adding a namespace to the overlay does not affect the resolver.
+    assert preview.title_cache is resolver.title_cache
+    cached = len(resolver.title_cache)
+    preview.add_namespace("Other", Namespace())
+    assert len(resolver.title_cache) == cached > 0
+    assert preview.title_cache is not resolver.title_cache
+    with pytest.raises(ArticleNotFound):
+        resolver.get_article("Other:Foo")
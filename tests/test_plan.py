@@ -0,0 +1,75 @@
+import mwparserfromhell
+
+from mwcomposerfromhell import ArticleResolver, Namespace, WikicodeToHtmlComposer
+from mwcomposerfromhell.plan import is_static, RenderPlan
+
+INFOBOX = """{| class="infobox"
+|-
+! Name
+| {{{name}}}
+|-
+! Description
+| ''A'' '''static''' [[link]] and
+* a
+* list
+|}
+"""
+
+
+def _get_composer(templates, compile_templates):
+    resolver = ArticleResolver(compile_templates=compile_templates)
+    resolver.add_namespace(
+        "Template",
+        Namespace(
+            {
+                name: mwparserfromhell.parse(template)
+                for name, template in templates.items()
+            }
+        ),
+    )
+    return WikicodeToHtmlComposer(resolver=resolver)
+
+
+def test_is_static():
+    """Nodes containing arguments or templates are not static."""
+    wikicode = mwparserfromhell.parse("''foo'' ''{{{1}}}'' [[{{bar}}]]")
+    assert [is_static(node) for node in wikicode.nodes] == [
+        True,
+        True,
+        False,
+        True,
+        False,
+    ]
+
+
+def test_plan():
+    """A plan records which nodes are static."""
+    plan = RenderPlan(mwparserfromhell.parse("foo {{{1}}} bar").nodes)
+    assert [outputs is not None for outputs in plan.outputs] == [True, False, True]
+
+
+def test_compile_templates():
+    """Compiled templates render the same as ones which are not."""
+    templates = {"infobox": INFOBOX, "wrapper": "<div>{{infobox|name={{{1}}}}}</div>"}
+    compiled = _get_composer(templates, True)
+    uncompiled = _get_composer(templates, False)
+
+    for content in ("{{infobox|name=Foo}}", "{{wrapper|Bar}}\n\n{{infobox|name=Baz}}"):
+        wikicode = mwparserfromhell.parse(content)
+        expected = uncompiled.compose(wikicode)
+        # The first render creates the plans, the second one uses them.
+        assert compiled.compose(wikicode) == expected
+        assert compiled.compose(wikicode) == expected
+
+    # Plans were created for the templates (and their nested Wikicode).
+    assert len(compiled._resolver.render_plans) > 2
+
+
+def test_compile_templates_invalidated():
+    """Adding a namespace clears the plans."""
+    composer = _get_composer({"temp": "foo"}, True)
+    composer.compose(mwparserfromhell.parse("{{temp}}"))
+    assert len(composer._resolver.render_plans) == 1
+
+    composer._resolver.add_namespace("Template", Namespace())
+    assert len(composer._resolver.render_plans) == 0
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import mwparserfromhell
+
+from mwcomposerfromhell import compose, ComposerPool, WikicodeToHtmlComposer
+
+
+def test_reuse():
+    """A composer gives the same result when used multiple times."""
+    wikicode = mwparserfromhell.parse("* Foo\n** Bar\n{|\n| Baz\n")
+    composer = WikicodeToHtmlComposer()
+    first = composer.compose(wikicode)
+    assert first == compose(wikicode)
+    assert composer.compose(wikicode) == first
+
+
+def test_pool():
+    """Composers are re-used after being checked back in."""
+    pool = ComposerPool()
+    with pool.composer() as composer:
+        assert composer.compose(mwparserfromhell.parse("''foo''")) == (
+            "<p><i>foo</i></p>"
+        )
+    with pool.composer() as other:
+        assert other is composer
+
+
+def test_pool_max_size():
+    """Only a limited number of idle composers are kept."""
+    pool = ComposerPool(max_size=1)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire() is first
+    assert pool.acquire() is not second
+
+
+def test_pool_threads():
+    """A pool can be shared between threads."""
+    created = []
+
+    def factory():
+        composer = WikicodeToHtmlComposer()
+        created.append(composer)
+        return composer
+
+    pool = ComposerPool(factory, max_size=4)
+    wikicode = mwparserfromhell.parse("* Foo\n* Bar")
+    expected = compose(wikicode)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: pool.compose(wikicode), range(100)))
+
+    assert results == [expected] * 100
+    # Composers are re-used.
+    assert len(created) <= 4
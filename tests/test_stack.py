@@ -0,0 +1,84 @@
+import mwparserfromhell
+from mwparserfromhell import nodes
+from mwparserfromhell.wikicode import Wikicode
+
+from mwcomposerfromhell import compose
+from mwcomposerfromhell.stack import TagStack
+
+
+def test_stack():
+    """The positions of tags are tracked as they're opened and closed."""
+    stack = TagStack(["table", "tr", "td", "table"])
+    assert list(stack) == ["table", "tr", "td", "table"]
+    assert stack.last_index("table") == 3
+    assert stack.last_index("tr") == 1
+    assert stack.last_index("p") == -1
+    assert "td" in stack
+    assert "p" not in stack
+
+    assert stack.pop() == "table"
+    assert stack.last_index("table") == 0
+    stack.push("p")
+    assert list(reversed(stack)) == ["p", "td", "tr", "table"]
+    assert len(stack) == 4
+
+
+def test_stack_lists():
+    """The open lists are tracked."""
+    stack = TagStack(["ul", "li", "div", "ol", "li"])
+    assert stack.lists == ["ul", "li", "ol", "li"]
+
+    stack.pop()
+    stack.pop()
+    assert stack.lists == ["ul", "li"]
+
+    stack.restore(("dl", "dd"))
+    assert stack.snapshot() == ("dl", "dd")
+    assert stack.lists == ["dl", "dd"]
+
+
+def test_nested_table():
+    """Tables nested deeply inside of other tags."""
+    table = mwparserfromhell.parse("{|\n|-\n| a || b\n|-\n| c\n|}")
+    expected = compose(table)
+
+    wikicode = table
+    for _ in range(20):
+        wikicode = Wikicode(
+            [nodes.Tag(mwparserfromhell.parse("div"), contents=wikicode)]
+        )
+    assert compose(wikicode) == "<div>" * 20 + expected + "</div>" * 20
+
+
+def test_stack_pending():
+    """The pending lists are compared to the open lists as they change."""
+    stack = TagStack(["ul", "li", "div", "ol", "li"])
+    stack.add_pending(("ul", "li"))
+    stack.add_pending(("ol", "li"))
+    assert stack.pending == ["ul", "li", "ol", "li"]
+    # The innermost list item is always re-opened.
+    assert stack.pending_prefix() == 3
+
+    # Closing tags reduces the matching prefix.
+    stack.pop()
+    stack.pop()
+    assert stack.pending_prefix() == 2
+
+    # Opening a different list does not match.
+    stack.push("dl")
+    assert stack.pending_prefix() == 2
+    stack.pop()
+
+    # But the same list does.
+    stack.push("ol")
+    assert stack.pending_prefix() == 3
+
+    # Once the pending lists differ, they never match.
+    stack.clear_pending()
+    stack.add_pending(("dl", "dd"))
+    stack.add_pending(("ul", "li"))
+    assert stack.pending_prefix() == 0
+
+    stack.restore(("ul", "li"), ("ul", "li", "ul", "li"))
+    assert stack.pending == ["ul", "li", "ul", "li"]
+    assert stack.pending_prefix() == 2
@@ -1,6 +1,6 @@
 import mwparserfromhell
 
-from mwcomposerfromhell import compose
+from mwcomposerfromhell import compose, compose_iter
 
 
 def test_table():
@@ -77,3 +77,23 @@ def test_preformatted_table():
 </pre>
 </td></tr></table>"""
     )
+
+
+def test_adjacent_cells():
+    """Adjacent cells on separate lines have a new-line between them."""
+    content = "{|\n| a\n| b\n|}"
+    wikicode = mwparserfromhell.parse(content)
+    assert (
+        compose(wikicode)
+        == "<table>\n<tr>\n<td> a\n</td>\n<td> b\n</td></tr></table>"
+    )
+
+
+def test_stream_rows():
+    """The rows of a large table are streamed."""
+    content = "{|\n" + "|-\n| a || ''b''\n" * 1000 + "|}"
+    wikicode = mwparserfromhell.parse(content)
+    chunks = list(compose_iter(wikicode))
+    # The table is split into multiple chunks.
+    assert len(chunks) > 1
+    assert "".join(chunks) == compose(wikicode)
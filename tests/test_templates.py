@@ -252,3 +252,20 @@ def test_unknown_duplicate():
 
     # Render the result.
     assert compose(wikicode) == "<p>" + content + "</p>"
+
+
+def test_reuse_after_loop():
+    """A composer can be re-used after a template loop was detected."""
+    templates = {
+        "loop": mwparserfromhell.parse("{{loop}}"),
+        "temp": mwparserfromhell.parse("This is a test"),
+    }
+    composer = _get_composer(templates)
+
+    assert "Template loop detected" in composer.compose(
+        mwparserfromhell.parse("{{loop}}")
+    )
+    # The state from the previous render does not leak into the next one.
+    assert composer.compose(mwparserfromhell.parse("{{temp}}")) == (
+        "<p>This is a test</p>"
+    )